@@ -5,12 +5,9 @@ Provides endpoints for products, authentication, orders, and rental management.
 
 from flask import Flask, jsonify, render_template, request
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
 import mysql.connector
 from mysql.connector import Error
-import json
 import os
-from datetime import timedelta
 
 # Import blueprints
 import sys
@@ -20,10 +17,26 @@ from backend.admin.routes import admin_bp
 from backend.auth import auth_bp
 from backend.orders import orders_bp
 from backend.utils.db import get_db_connection
+from backend.utils.catalog import (
+    build_product_filters, normalize_filters, filter_signature, compute_facets,
+    load_product_details, product_detail_cache_key,
+    PRODUCT_LIST_COLUMNS, PRODUCT_SORTS, PRODUCT_SORT_KEYS
+)
+from backend.utils.pagination import (
+    decode_cursor, keyset_condition, add_condition, paginate_rows, cached_count,
+    InvalidCursorError
+)
+from backend.utils.cache import (
+    cache_fetch, catalog_tag, product_tag, CATALOG_FACETS_TTL, PRODUCT_DETAILS_TTL
+)
+from backend.utils.serialization import FastJSONProvider
 
 # Initialize Flask app
 app = Flask(__name__, template_folder='templates')
 
+# Serialize responses with the same encoder as cache payloads (orjson when installed)
+app.json = FastJSONProvider(app)
+
 # Configure CORS with stricter settings
 cors_allowed_origins = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:3000,https://giggatek.com').split(',')
 cors_allowed_methods = ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']
@@ -37,12 +50,6 @@ CORS(app,
      supports_credentials=True,
      max_age=cors_max_age)
 
-# Configure JWT
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'giggatek-dev-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
-jwt = JWTManager(app)
-
 # Register Blueprints
 app.register_blueprint(admin_bp)
 app.register_blueprint(auth_bp)
@@ -88,6 +95,13 @@ def get_products():
     page = request.args.get('page', 1, type=int)
     limit = request.args.get('limit', 24, type=int)
     sort_by = request.args.get('sort', 'featured')
+    if sort_by not in PRODUCT_SORT_KEYS:
+        sort_by = 'featured'
+
+    # Passing `cursor` (empty for the first page) switches to keyset pagination;
+    # the total is then only computed when asked for
+    cursor_token = request.args.get('cursor')
+    include_total = cursor_token is None or request.args.get('include_total', 'false').lower() == 'true'
 
     # Calculate offset for pagination
     offset = (page - 1) * limit
@@ -99,85 +113,79 @@ def get_products():
     price_min = request.args.get('price_min', 0, type=float)
     price_max = request.args.get('price_max', 10000, type=float)
 
+    sort_keys = PRODUCT_SORT_KEYS[sort_by]
+    try:
+        after = decode_cursor(cursor_token, sort_by, len(sort_keys)) if cursor_token else None
+    except InvalidCursorError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     try:
         conn = get_db_connection()
         if conn and conn.is_connected():
             cursor = conn.cursor(dictionary=True)
 
-            # Build the base query
-            query = """SELECT product_id, name, category, purchase_price, rental_price_12m,
-                      condition_rating as condition, image_urls
-                      FROM products WHERE stock_quantity > 0"""
-
-            # Add filter conditions
-            params = []
-
-            # Category filter
-            if categories:
-                placeholders = ', '.join(['%s'] * len(categories))
-                query += f" AND category IN ({placeholders})"
-                params.extend(categories)
-
-            # Brand filter (assuming brand is part of specifications JSON)
-            if brands:
-                # This is a simplified approach - in a real implementation, you'd need to parse the JSON
-                # For now, we'll use a LIKE query which is not optimal but works for demonstration
-                brand_conditions = []
-                for brand in brands:
-                    brand_conditions.append("specifications LIKE %s")
-                    params.append(f'%"{brand}"%')
-
-                if brand_conditions:
-                    query += " AND (" + " OR ".join(brand_conditions) + ")"
-
-            # Condition filter
-            if conditions:
-                placeholders = ', '.join(['%s'] * len(conditions))
-                query += f" AND condition_rating IN ({placeholders})"
-                params.extend(conditions)
-
-            # Price range filter
-            query += " AND purchase_price BETWEEN %s AND %s"
-            params.extend([price_min, price_max])
-
-            # Add sorting
-            if sort_by == 'price-low':
-                query += " ORDER BY purchase_price ASC"
-            elif sort_by == 'price-high':
-                query += " ORDER BY purchase_price DESC"
-            elif sort_by == 'newest':
-                query += " ORDER BY created_at DESC"
-            else:  # Default to 'featured'
-                query += " ORDER BY is_featured DESC, product_id ASC"
-
-            # Get total count for pagination
-            count_query = query.replace("SELECT product_id, name, category, purchase_price, rental_price_12m, \
-                      condition_rating as condition, image_urls", "SELECT COUNT(*) as total")
-
-            cursor.execute(count_query, params)
-            result = cursor.fetchone()
-            total_products = result['total'] if result else 0
-
-            # Add pagination
-            query += " LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
-
-            # Execute the final query
-            cursor.execute(query, params)
-            products = cursor.fetchall()
-
-            # Process image URLs
-            for product in products:
-                if product.get('image_urls'):
-                    try:
-                        # Assuming image_urls is stored as a JSON array string
-                        image_list = json.loads(product['image_urls'])
-                        # Use the first image as the primary image for the list view
-                        product['primary_image'] = image_list[0] if image_list else None
-                    except json.JSONDecodeError:
-                        product['primary_image'] = None # Handle potential malformed JSON
-                else:
-                    product['primary_image'] = None
+            # Every filter maps to an indexed column (brand is generated from specifications)
+            where_sql, params = build_product_filters(
+                categories=categories,
+                brands=brands,
+                conditions=conditions,
+                price_min=price_min,
+                price_max=price_max
+            )
+            order_sql = PRODUCT_SORTS[sort_by]
+
+            # Totals are cached per filter set since COUNT(*) scans every match
+            total_products = None
+            if include_total:
+                def count_products():
+                    cursor.execute(f"SELECT COUNT(*) as total FROM products {where_sql}", params)
+                    result = cursor.fetchone()
+                    return result['total'] if result else 0
+
+                total_products = cached_count("count:products", where_sql, params,
+                                              count_products, tags=[catalog_tag()])
+
+            if cursor_token is not None:
+                # Keyset page: seek past the last row of the previous page
+                page_where, page_params = where_sql, list(params)
+                if after is not None:
+                    condition, condition_params = keyset_condition(sort_keys, after)
+                    page_where = add_condition(page_where, condition)
+                    page_params.extend(condition_params)
+
+                # Sort columns not in the list payload are selected for the cursor only
+                extra_columns = [column for column, _ in sort_keys
+                                 if column not in ('product_id', 'purchase_price')]
+                select_sql = ", ".join([PRODUCT_LIST_COLUMNS] + extra_columns)
+                cursor.execute(
+                    f"SELECT {select_sql} FROM products {page_where} "
+                    f"ORDER BY {order_sql} LIMIT %s",
+                    page_params + [limit + 1]
+                )
+                products, next_cursor = paginate_rows(cursor.fetchall(), sort_keys, limit, sort_by)
+                for product in products:
+                    for column in extra_columns:
+                        product.pop(column, None)
+            else:
+                cursor.execute(
+                    f"SELECT {PRODUCT_LIST_COLUMNS} FROM products {where_sql} "
+                    f"ORDER BY {order_sql} LIMIT %s OFFSET %s",
+                    params + [limit, offset]
+                )
+                products = cursor.fetchall()
+
+            # primary_image is a generated column, so rows are returned as fetched
+
+            if cursor_token is not None:
+                response = {
+                    'products': products,
+                    'limit': limit,
+                    'next_cursor': next_cursor,
+                    'has_more': next_cursor is not None
+                }
+                if include_total:
+                    response['total'] = total_products
+                return jsonify(response)
 
             # Return products with pagination info
             return jsonify({
@@ -200,55 +208,71 @@ def get_products():
         if conn and conn.is_connected():
             conn.close()
 
+@app.route('/api/products/facets')
+def get_product_facets():
+    """API endpoint to get facet counts for the product filters."""
+    filters = normalize_filters(
+        categories=request.args.getlist('category'),
+        brands=request.args.getlist('brand'),
+        conditions=request.args.getlist('condition'),
+        price_min=request.args.get('price_min', 0, type=float),
+        price_max=request.args.get('price_max', 10000, type=float)
+    )
+
+    def load_facets():
+        conn = get_db_connection()
+        if not conn:
+            raise Error(msg="Could not connect to the database.")
+        cursor = conn.cursor(dictionary=True)
+        try:
+            return compute_facets(cursor, filters)
+        finally:
+            cursor.close()
+            conn.close()
+
+    try:
+        # Equivalent filter sets share one entry; any product change clears them all
+        facets = cache_fetch(
+            f"catalog:facets:{filter_signature(filters)}",
+            load_facets,
+            CATALOG_FACETS_TTL,
+            tags=[catalog_tag()]
+        )
+        return jsonify(facets)
+    except Error as e:
+        print(f"Error fetching product facets: {e}")
+        return jsonify({"status": "error", "message": "Error fetching product facets."}), 500
+
 @app.route('/api/products/<int:product_id>')
 def get_product(product_id):
     """API endpoint to get a product by ID."""
-    conn = None
-    cursor = None
-    try:
+    def load_product():
         conn = get_db_connection()
-        if conn and conn.is_connected():
-            cursor = conn.cursor(dictionary=True)
-            # Fetch all details for a specific product
-            cursor.execute("""
-                SELECT product_id, name, description, category, specifications,
-                condition_rating, purchase_price, rental_price_3m, rental_price_6m,
-                rental_price_12m, stock_quantity, image_urls
-                FROM products
-                WHERE product_id = %s
-            """, (product_id,))
-
-            product = cursor.fetchone()
-
-            if not product:
-                return jsonify({"status": "error", "message": "Product not found"}), 404
-
-            # Process JSON fields
-            for field in ['specifications', 'image_urls']:
-                if product.get(field) and isinstance(product[field], str):
-                    try:
-                        product[field] = json.loads(product[field])
-                    except json.JSONDecodeError:
-                        product[field] = None
-
-            # Set primary_image from image_urls if available
-            if product.get('image_urls') and isinstance(product['image_urls'], list) and len(product['image_urls']) > 0:
-                product['primary_image'] = product['image_urls'][0]
-            else:
-                product['primary_image'] = None
+        if not conn:
+            raise Error(msg="Could not connect to the database.")
+        cursor = conn.cursor(dictionary=True)
+        try:
+            return load_product_details(cursor, [product_id]).get(product_id)
+        finally:
+            cursor.close()
+            conn.close()
 
-            return jsonify(product)
-        else:
-            print("Database connection failed.")
-            return jsonify({"status": "error", "message": "Could not connect to the database."}), 500
+    try:
+        # JSON fields are parsed once per product change, not once per request
+        product = cache_fetch(
+            product_detail_cache_key(product_id),
+            load_product,
+            PRODUCT_DETAILS_TTL,
+            tags=[product_tag(product_id)]
+        )
+
+        if not product:
+            return jsonify({"status": "error", "message": "Product not found"}), 404
+
+        return jsonify(product)
     except Error as e:
         print(f"Error fetching product: {e}")
         return jsonify({"status": "error", "message": "Error fetching product data."}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn and conn.is_connected():
-            conn.close()
 
 # Add security headers middleware
 @app.after_request
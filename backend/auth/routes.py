@@ -1,69 +1,33 @@
 from flask import Blueprint, request, jsonify
 import jwt
 import datetime
-import bcrypt
 import json
-from functools import wraps
 import re
-from ..utils.db import get_db_connection
+from ..utils.db import get_db_connection, db_cursor
 from ..utils.validators import validate_email, validate_password
 from ..utils.security import rate_limit, auth_rate_limit, check_ip_blacklist
-from ..utils.encryption import encrypt_pii_fields, decrypt_pii_fields, encrypt_data, decrypt_data
+from ..utils.encryption import (
+    encrypt_pii_fields, decrypt_pii_fields, encrypt_data, decrypt_data, blind_index_columns
+)
+from ..utils.auth import (
+    generate_token, token_required, admin_required, bearer_token, revoke_token, JWT_SECRET_KEY
+)
+from ..utils.passwords import (
+    hash_password, verify_password, needs_rehash, PasswordHasherBusy, PASSWORD_HASH_RETRY_AFTER
+)
 
 auth_bp = Blueprint('auth', __name__)
 
-# Secret key for JWT token generation and verification
-SECRET_KEY = "giggatek_secure_jwt_key_change_in_production"
-
-# Token expiration time (in minutes)
-TOKEN_EXPIRATION = 60
-
-# Helper function to generate JWT token
-def generate_token(user_id, is_admin=False):
-    payload = {
-        'user_id': user_id,
-        'is_admin': is_admin,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=TOKEN_EXPIRATION)
-    }
-    return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
-
-# Decorator for protected routes
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        
-        # Extract token from the Authorization header
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        
-        try:
-            # Verify and decode the token
-            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            request.user_id = payload['user_id']
-            request.is_admin = payload.get('is_admin', False)
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        
-        return f(*args, **kwargs)
-    
-    return decorated
-
-# Admin role check decorator
-def admin_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if not request.is_admin:
-            return jsonify({'error': 'Admin privileges required'}), 403
-        return f(*args, **kwargs)
-    
-    return decorated
+@auth_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    # Too many logins at once: fail fast rather than queue behind bcrypt
+    response = jsonify({
+        'error': 'Service is busy, please try again shortly',
+        'retry_after': PASSWORD_HASH_RETRY_AFTER
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(PASSWORD_HASH_RETRY_AFTER)
+    return response
 
 @auth_bp.route('/register', methods=['POST'])
 @rate_limit(10, 3600)  # 10 registrations per hour per IP
@@ -92,6 +56,9 @@ def register():
             'error': 'Password must be at least 8 characters and contain uppercase, lowercase, number, and special character'
         }), 400
     
+    # Hash the password (before taking a database connection)
+    hashed_password = hash_password(password)
+    
     # Check if user already exists
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
@@ -103,14 +70,15 @@ def register():
         conn.close()
         return jsonify({'error': 'User with this email already exists'}), 409
     
-    # Hash the password
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    
     # Create the user
     try:
+        indexes = blind_index_columns({'first_name': first_name, 'last_name': last_name},
+                                      ['first_name', 'last_name'])
         cursor.execute(
-            "INSERT INTO users (email, password_hash, first_name, last_name) VALUES (%s, %s, %s, %s)",
-            (email, hashed_password, first_name, last_name)
+            """INSERT INTO users (email, password_hash, first_name, last_name, first_name_bidx, last_name_bidx)
+               VALUES (%s, %s, %s, %s, %s, %s)""",
+            (email, hashed_password, first_name, last_name,
+             indexes['first_name_bidx'], indexes['last_name_bidx'])
         )
         user_id = cursor.lastrowid
         conn.commit()
@@ -156,24 +124,33 @@ def login():
     cursor = conn.cursor(dictionary=True)
     cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
     user = cursor.fetchone()
+    cursor.close()
+    conn.close()
     
     if not user:
-        cursor.close()
-        conn.close()
         return jsonify({'error': 'Invalid email or password'}), 401
     
     # Verify password
-    if not bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-        cursor.close()
-        conn.close()
+    if not verify_password(password, user['password_hash']):
         return jsonify({'error': 'Invalid email or password'}), 401
     
+    # Upgrade hashes made with a different cost factor while we have the password
+    if needs_rehash(user['password_hash']):
+        try:
+            # Hash before taking a database connection
+            new_hash = hash_password(password)
+        except PasswordHasherBusy:
+            new_hash = None  # Upgraded on a later login
+        if new_hash is not None:
+            with db_cursor(commit=True) as cursor:
+                cursor.execute(
+                    "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                    (new_hash, user['id'], user['password_hash'])
+                )
+    
     # Generate JWT token
     token = generate_token(user['id'], is_admin=user.get('is_admin', False))
     
-    cursor.close()
-    conn.close()
-    
     return jsonify({
         'message': 'Login successful',
         'token': token,
@@ -198,6 +175,14 @@ def refresh_token():
         'token': new_token
     }), 200
 
+@auth_bp.route('/logout', methods=['POST'])
+@token_required
+def logout():
+    # Revoke the token until it expires, on every worker
+    revoke_token(bearer_token())
+
+    return jsonify({'message': 'Logged out successfully'}), 200
+
 @auth_bp.route('/me', methods=['GET'])
 @token_required
 def get_current_user():
@@ -245,7 +230,7 @@ def password_reset_request():
         'user_id': user['id'],
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
     }
-    reset_token = jwt.encode(reset_payload, SECRET_KEY, algorithm='HS256')
+    reset_token = jwt.encode(reset_payload, JWT_SECRET_KEY, algorithm='HS256')
     
     # Store reset token in the database
     try:
@@ -293,13 +278,16 @@ def password_reset():
     
     try:
         # Verify and decode the token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
         user_id = payload['user_id']
     except jwt.ExpiredSignatureError:
         return jsonify({'error': 'Reset token has expired'}), 401
     except jwt.InvalidTokenError:
         return jsonify({'error': 'Invalid reset token'}), 401
     
+    # Hash the new password (before taking a database connection)
+    hashed_password = hash_password(new_password)
+    
     # Verify token in the database
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
@@ -311,9 +299,6 @@ def password_reset():
         conn.close()
         return jsonify({'error': 'Invalid reset token'}), 401
     
-    # Hash the new password
-    hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-    
     # Update the password and clear the reset token
     try:
         cursor.execute(
@@ -358,8 +343,11 @@ def update_profile():
             # Store original value in regular column for backward compatibility
             encrypted_fields[f"{field}_encrypted"] = encrypt_data(update_data[field])
     
-    # Combine regular and encrypted fields
-    combined_data = {**update_data, **encrypted_fields}
+    # Blind indexes so the encrypted fields can be looked up by value
+    index_fields = blind_index_columns(update_data, pii_fields)
+    
+    # Combine regular, encrypted and index fields
+    combined_data = {**update_data, **encrypted_fields, **index_fields}
     
     # Construct the SQL query dynamically
     set_clause = ', '.join([f"{field} = %s" for field in combined_data.keys()])
@@ -431,22 +419,22 @@ def change_password():
     cursor = conn.cursor(dictionary=True)
     cursor.execute("SELECT password_hash FROM users WHERE id = %s", (request.user_id,))
     user = cursor.fetchone()
+    cursor.close()
+    conn.close()
     
     if not user:
-        cursor.close()
-        conn.close()
         return jsonify({'error': 'User not found'}), 404
     
     # Verify current password
-    if not bcrypt.checkpw(current_password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-        cursor.close()
-        conn.close()
+    if not verify_password(current_password, user['password_hash']):
         return jsonify({'error': 'Current password is incorrect'}), 401
     
     # Hash the new password
-    hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = hash_password(new_password)
     
     # Update the password
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
     try:
         cursor.execute(
             "UPDATE users SET password_hash = %s WHERE id = %s",
@@ -37,6 +37,8 @@ CREATE TABLE IF NOT EXISTS `order_items` (
 -- Add index for order queries
 CREATE INDEX idx_orders_user_id ON `orders` (`user_id`);
 CREATE INDEX idx_orders_status ON `orders` (`status`);
+CREATE INDEX idx_orders_user_date ON `orders` (`user_id`, `order_date`);
+CREATE INDEX idx_orders_user_status_date ON `orders` (`user_id`, `status`, `order_date`);
 CREATE INDEX idx_order_items_order_id ON `order_items` (`order_id`);
 CREATE INDEX idx_order_items_product_id ON `order_items` (`product_id`);
 
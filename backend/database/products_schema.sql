@@ -16,6 +16,12 @@ CREATE TABLE IF NOT EXISTS `products` (
   `stock_quantity` int NOT NULL DEFAULT 0,
   `is_featured` boolean DEFAULT FALSE,
   `image_urls` json,
+  -- Brand extracted from specifications for indexed catalog filtering
+  `brand` varchar(100) GENERATED ALWAYS AS (
+    LOWER(TRIM(COALESCE(`specifications`->>'$.Brand', `specifications`->>'$.brand')))
+  ) STORED,
+  -- First image for list views
+  `primary_image` varchar(500) GENERATED ALWAYS AS (`image_urls`->>'$[0]') STORED,
   `created_at` timestamp DEFAULT CURRENT_TIMESTAMP,
   `updated_at` timestamp DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
@@ -24,6 +30,12 @@ CREATE TABLE IF NOT EXISTS `products` (
 CREATE INDEX idx_products_category ON `products` (`category`);
 CREATE INDEX idx_products_condition ON `products` (`condition_rating`);
 CREATE INDEX idx_products_featured ON `products` (`is_featured`);
+CREATE INDEX idx_products_brand_price ON `products` (`brand`, `purchase_price`);
+CREATE INDEX idx_products_category_price ON `products` (`category`, `purchase_price`);
+CREATE INDEX idx_products_condition_price ON `products` (`condition_rating`, `purchase_price`);
+CREATE INDEX idx_products_price ON `products` (`purchase_price`);
+CREATE INDEX idx_products_featured_id ON `products` (`is_featured`, `product_id`);
+CREATE INDEX idx_products_created ON `products` (`created_at`);
 
 -- Add some sample products for development
 INSERT INTO `products` (name, description, category, specifications, condition_rating, purchase_price, rental_price_3m, rental_price_6m, rental_price_12m, stock_quantity, is_featured, image_urls)
@@ -81,6 +81,8 @@ CREATE TABLE IF NOT EXISTS `rental_notifications` (
 CREATE INDEX idx_rentals_user_id ON `rentals` (`user_id`);
 CREATE INDEX idx_rentals_product_id ON `rentals` (`product_id`);
 CREATE INDEX idx_rentals_status ON `rentals` (`status`);
+CREATE INDEX idx_rentals_user_created ON `rentals` (`user_id`, `created_at`);
+CREATE INDEX idx_rentals_user_status_created ON `rentals` (`user_id`, `status`, `created_at`);
 CREATE INDEX idx_rental_payments_rental_id ON `rental_payments` (`rental_id`);
 CREATE INDEX idx_rental_payments_due_date ON `rental_payments` (`due_date`);
 CREATE INDEX idx_rental_payments_status ON `rental_payments` (`status`);
@@ -0,0 +1,8 @@
+-- Indexes for keyset (cursor) pagination of the order and rental lists
+-- InnoDB appends the primary key to every secondary index, so (user_id, date)
+-- also covers the id tiebreaker of the sort and the cursor seek.
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_date ON orders (user_id, order_date);
+CREATE INDEX IF NOT EXISTS idx_orders_user_status_date ON orders (user_id, status, order_date);
+CREATE INDEX IF NOT EXISTS idx_rentals_user_created ON rentals (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_rentals_user_status_created ON rentals (user_id, status, created_at);
@@ -0,0 +1,21 @@
+-- Catalog index for /api/products filters
+-- Brand is extracted from the specifications JSON into a stored generated column,
+-- so MySQL keeps it in sync on every product INSERT/UPDATE and brand filters are
+-- served by an index instead of `specifications LIKE '%"brand"%'` full scans.
+
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS brand VARCHAR(100)
+    GENERATED ALWAYS AS (
+        LOWER(TRIM(COALESCE(specifications->>'$.Brand', specifications->>'$.brand')))
+    ) STORED;
+
+-- Filter columns paired with price so range filters and price sorts use the same index
+CREATE INDEX IF NOT EXISTS idx_products_brand_price ON products (brand, purchase_price);
+CREATE INDEX IF NOT EXISTS idx_products_category_price ON products (category, purchase_price);
+CREATE INDEX IF NOT EXISTS idx_products_condition_price ON products (condition_rating, purchase_price);
+CREATE INDEX IF NOT EXISTS idx_products_price ON products (purchase_price);
+CREATE INDEX IF NOT EXISTS idx_products_featured_id ON products (is_featured, product_id);
+CREATE INDEX IF NOT EXISTS idx_products_created ON products (created_at);
+
+-- Refresh index statistics so the optimizer picks the new indexes
+ANALYZE TABLE products;
@@ -0,0 +1,10 @@
+-- Denormalized primary image for product list endpoints
+-- First entry of image_urls as a stored generated column: MySQL computes it for
+-- existing rows when the column is added and keeps it in sync on every write,
+-- so list endpoints no longer parse image_urls per row.
+-- Rows whose image_urls holds a JSON-encoded string instead of an array are
+-- repaired by: python -m backend.tools.backfill_product_fields
+
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS primary_image VARCHAR(500)
+    GENERATED ALWAYS AS (image_urls->>'$[0]') STORED;
@@ -0,0 +1,11 @@
+-- Blind indexes of encrypted user fields (backend/utils/encryption.py):
+-- hex HMAC of the normalized value, so equality lookups are index seeks
+ALTER TABLE users ADD COLUMN IF NOT EXISTS first_name_bidx CHAR(32) DEFAULT NULL;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS last_name_bidx CHAR(32) DEFAULT NULL;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS phone_bidx CHAR(32) DEFAULT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_users_first_name_bidx ON users (first_name_bidx);
+CREATE INDEX IF NOT EXISTS idx_users_last_name_bidx ON users (last_name_bidx);
+CREATE INDEX IF NOT EXISTS idx_users_phone_bidx ON users (phone_bidx);
+
+-- Existing rows are filled in by: python -m backend.tools.backfill_blind_indexes
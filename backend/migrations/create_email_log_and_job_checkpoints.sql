@@ -0,0 +1,28 @@
+-- Log of scheduled emails, used to skip rentals that were already reminded
+CREATE TABLE IF NOT EXISTS email_log (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    email_type VARCHAR(64) NOT NULL,
+    reference_id INT NOT NULL,
+    reference_date DATE DEFAULT NULL,
+    sent_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Existing installations created email_log without reference_date
+ALTER TABLE email_log ADD COLUMN IF NOT EXISTS reference_date DATE DEFAULT NULL;
+
+-- One reminder per rental and due date; re-runs insert with INSERT IGNORE
+CREATE UNIQUE INDEX IF NOT EXISTS uq_email_log_reference ON email_log (email_type, reference_id, reference_date);
+
+-- Progress of resumable batch jobs (backend/utils/checkpoints.py)
+CREATE TABLE IF NOT EXISTS job_checkpoints (
+    job_name VARCHAR(100) NOT NULL,
+    run_key VARCHAR(64) NOT NULL,
+    position VARCHAR(512) DEFAULT NULL,  -- Encoded sort key of the last processed row
+    processed INT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (job_name, run_key)
+);
+
+-- Payment reminder job walks active rentals in (next_payment_date, id) order
+CREATE INDEX IF NOT EXISTS idx_rentals_status_next_payment ON rentals (status, next_payment_date);
@@ -0,0 +1,23 @@
+-- Durable outbox for emails and push notifications
+-- Rows are inserted in the same transaction as the order/rental change that
+-- triggers them and delivered by backend/tools/outbox_dispatcher.py.
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    channel VARCHAR(16) NOT NULL,            -- 'email' or 'push'
+    kind VARCHAR(64) NOT NULL,               -- e.g. 'rental_payment_reminder'
+    dedup_key VARCHAR(191) DEFAULT NULL,     -- Same key is only ever enqueued once
+    payload JSON NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',  -- pending, processing, sent, dead
+    attempts INT NOT NULL DEFAULT 0,
+    available_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    locked_by VARCHAR(64) DEFAULT NULL,
+    locked_until DATETIME(6) DEFAULT NULL,
+    last_error TEXT DEFAULT NULL,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    sent_at DATETIME(6) DEFAULT NULL,
+    UNIQUE KEY uq_notification_outbox_dedup (dedup_key)
+);
+
+-- Dispatcher claims due rows per channel in id order
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox (status, channel, available_at, id);
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_lease ON notification_outbox (status, locked_until);
@@ -0,0 +1,20 @@
+-- Push broadcasts to a segment of users (backend/push/broadcast.py)
+CREATE TABLE IF NOT EXISTS push_broadcasts (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    segment JSON NOT NULL,                   -- e.g. {"type": "wishlist", "product_id": 42}
+    notification JSON NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',  -- queued, running, completed, cancelled
+    created_by INT DEFAULT NULL,
+    chunks INT NOT NULL DEFAULT 0,           -- Chunks delivered so far
+    processed INT NOT NULL DEFAULT 0,        -- Subscriptions attempted
+    sent INT NOT NULL DEFAULT 0,
+    gone INT NOT NULL DEFAULT 0,             -- Expired subscriptions deleted
+    retried INT NOT NULL DEFAULT 0,          -- Handed to single-subscription retries
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME DEFAULT NULL,
+    finished_at DATETIME DEFAULT NULL
+);
+
+-- Segment lookups
+CREATE INDEX IF NOT EXISTS idx_wishlist_items_product_user ON wishlist_items (product_id, user_id);
+CREATE INDEX IF NOT EXISTS idx_rentals_status_user ON rentals (status, user_id);
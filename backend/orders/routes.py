@@ -1,9 +1,15 @@
 from flask import Blueprint, request, jsonify
-from ..utils.db import get_db_connection
-from ..auth.routes import token_required
+from ..utils.db import get_db_connection, attach_batch
+from ..utils.pagination import (
+    decode_cursor, keyset_condition, order_by_sql, paginate_rows, InvalidCursorError
+)
+from ..utils.auth import token_required
 
 orders_bp = Blueprint('orders', __name__)
 
+# Newest first; the id tiebreaker makes the order usable as a keyset cursor
+ORDER_LIST_SORT = [('o.order_date', 'DESC'), ('o.id', 'DESC')]
+
 @orders_bp.route('/', methods=['GET'])
 @token_required
 def get_user_orders():
@@ -15,6 +21,14 @@ def get_user_orders():
     page = int(request.args.get('page', 1))
     per_page = min(int(request.args.get('per_page', 10)), 50)  # Limit to 50 max
     
+    # Passing `cursor` (empty for the first page) switches to keyset pagination
+    cursor_token = request.args.get('cursor')
+    include_total = cursor_token is None or request.args.get('include_total', 'false').lower() == 'true'
+    try:
+        after = decode_cursor(cursor_token, 'orders', len(ORDER_LIST_SORT)) if cursor_token else None
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Calculate offset for pagination
     offset = (page - 1) * per_page
     
@@ -45,8 +59,17 @@ def get_user_orders():
         count_params.append(status)
     
     # Add sorting and pagination
-    query += " ORDER BY o.order_date DESC LIMIT %s OFFSET %s"
-    query_params.extend([per_page, offset])
+    if cursor_token is not None:
+        # Seek past the last order of the previous page instead of skipping rows
+        if after is not None:
+            condition, condition_params = keyset_condition(ORDER_LIST_SORT, after)
+            query += f" AND {condition}"
+            query_params.extend(condition_params)
+        query += f" ORDER BY {order_by_sql(ORDER_LIST_SORT)} LIMIT %s"
+        query_params.append(per_page + 1)
+    else:
+        query += f" ORDER BY {order_by_sql(ORDER_LIST_SORT)} LIMIT %s OFFSET %s"
+        query_params.extend([per_page, offset])
     
     # Execute queries
     conn = get_db_connection()
@@ -54,28 +77,40 @@ def get_user_orders():
     
     try:
         # Get total count
-        cursor.execute(count_query, count_params)
-        total_count = cursor.fetchone()['total']
+        total_count = None
+        if include_total:
+            cursor.execute(count_query, count_params)
+            total_count = cursor.fetchone()['total']
         
         # Get paginated results
         cursor.execute(query, query_params)
         orders = cursor.fetchall()
+        if cursor_token is not None:
+            orders, next_cursor = paginate_rows(orders, ORDER_LIST_SORT, per_page, 'orders')
         
-        # For each order, get the order items
-        for order in orders:
-            cursor.execute("""
-                SELECT 
-                    oi.id, oi.product_id, oi.quantity, oi.price, oi.subtotal,
-                    p.name as product_name, p.image_url
-                FROM order_items oi
-                JOIN products p ON oi.product_id = p.id
-                WHERE oi.order_id = %s
-            """, (order['id'],))
-            order['items'] = cursor.fetchall()
+        # Get the order items for the whole page in one query
+        attach_batch(cursor, orders, 'items', """
+            SELECT 
+                oi.id, oi.order_id, oi.product_id, oi.quantity, oi.price, oi.subtotal,
+                p.name as product_name, p.image_url
+            FROM order_items oi
+            JOIN products p ON oi.product_id = p.id
+            WHERE oi.order_id IN ({placeholders})
+        """, 'order_id')
         
         cursor.close()
         conn.close()
         
+        if cursor_token is not None:
+            pagination = {
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+            if include_total:
+                pagination['total'] = total_count
+            return jsonify({'orders': orders, 'pagination': pagination}), 200
+        
         # Calculate pagination metadata
         total_pages = (total_count + per_page - 1) // per_page  # Ceiling division
         
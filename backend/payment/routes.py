@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify
 import stripe
 import os
 from ..utils.db import get_db_connection
-from ..auth.routes import token_required
+from ..utils.auth import token_required
 
 # Initialize Stripe with secret key
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY', 'sk_test_YOUR_STRIPE_SECRET_KEY')
@@ -0,0 +1,312 @@
+"""
+Push broadcasts to a segment of users.
+
+A broadcast sends one notification to every push subscription of a segment
+(a list of users, everyone who wishlisted a product, active renters). It is
+recorded in `push_broadcasts` and processed by the outbox dispatcher in
+chunks: each chunk streams the next PUSH_BROADCAST_CHUNK_SIZE subscriptions
+in subscription_id order, fans them out, adds its results to the broadcast's
+counters and queues the next chunk in the same transaction. A failed chunk is
+retried on its own.
+
+A chunk is sent in waves of PUSH_BROADCAST_WAVE_ROUNDS requests per fan-out
+worker and stops before a wave that might not finish within its outbox lease
+(less PUSH_BROADCAST_LEASE_MARGIN for writing the results); the next chunk
+then starts after the last subscription sent. Results are only recorded
+while the outbox entry is still held by this dispatcher, so a chunk whose
+lease ran out and was claimed elsewhere is not counted twice.
+"""
+
+import os
+import json
+import time
+import logging
+
+from ..utils.db import db_cursor
+from ..utils.outbox import enqueue, enqueue_many, register_handler, CHANNEL_PUSH, OUTBOX_LEASE_SECONDS
+from .sender import get_fanout, endpoint_hash, FanoutResult, PUSH_REQUEST_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+PUSH_BROADCAST_CHUNK_SIZE = int(os.environ.get('PUSH_BROADCAST_CHUNK_SIZE', 1000))  # Subscriptions per chunk
+PUSH_BROADCAST_MAX_USERS = int(os.environ.get('PUSH_BROADCAST_MAX_USERS', 10000))  # Size limit of 'users' segments
+PUSH_BROADCAST_WAVE_ROUNDS = int(os.environ.get('PUSH_BROADCAST_WAVE_ROUNDS', 4))  # Requests per fan-out worker per wave
+PUSH_BROADCAST_LEASE_MARGIN = float(os.environ.get('PUSH_BROADCAST_LEASE_MARGIN', 30))  # Seconds of the lease kept for recording
+
+# A wave takes at most one request timeout per round; if one cannot fit in
+# the lease, chunks would never make progress
+if PUSH_BROADCAST_WAVE_ROUNDS * PUSH_REQUEST_TIMEOUT + PUSH_BROADCAST_LEASE_MARGIN >= OUTBOX_LEASE_SECONDS:
+    raise RuntimeError(
+        f"PUSH_BROADCAST_WAVE_ROUNDS ({PUSH_BROADCAST_WAVE_ROUNDS}) x PUSH_REQUEST_TIMEOUT "
+        f"({PUSH_REQUEST_TIMEOUT}s) + PUSH_BROADCAST_LEASE_MARGIN ({PUSH_BROADCAST_LEASE_MARGIN}s) "
+        f"must be less than OUTBOX_LEASE_SECONDS ({OUTBOX_LEASE_SECONDS}s)"
+    )
+
+KIND_BROADCAST_CHUNK = 'broadcast_chunk'
+KIND_BROADCAST = 'broadcast'  # Retries of single subscriptions from a broadcast
+
+SEGMENT_USERS = 'users'
+SEGMENT_WISHLIST = 'wishlist'
+SEGMENT_ACTIVE_RENTERS = 'active_renters'
+SEGMENT_TYPES = (SEGMENT_USERS, SEGMENT_WISHLIST, SEGMENT_ACTIVE_RENTERS)
+
+
+class InvalidSegmentError(ValueError):
+    """Raised when a broadcast segment is malformed."""
+
+
+def segment_condition(segment):
+    """
+    SQL condition on push_subscriptions (alias `ps`) selecting a segment.
+
+    Args:
+        segment (dict): {'type': 'users', 'user_ids': [...]},
+            {'type': 'wishlist', 'product_id': ...} or {'type': 'active_renters'}
+
+    Returns:
+        tuple: (condition SQL, parameters)
+
+    Raises:
+        InvalidSegmentError: If the segment type or its arguments are invalid
+    """
+    if not isinstance(segment, dict):
+        raise InvalidSegmentError('Segment must be an object')
+    segment_type = segment.get('type')
+
+    if segment_type == SEGMENT_USERS:
+        user_ids = segment.get('user_ids')
+        if not isinstance(user_ids, list) or not user_ids:
+            raise InvalidSegmentError('user_ids must be a non-empty list')
+        if len(user_ids) > PUSH_BROADCAST_MAX_USERS:
+            raise InvalidSegmentError(f'At most {PUSH_BROADCAST_MAX_USERS} user_ids per broadcast')
+        try:
+            user_ids = sorted({int(user_id) for user_id in user_ids})
+        except (TypeError, ValueError):
+            raise InvalidSegmentError('user_ids must be integers')
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        return f"ps.user_id IN ({placeholders})", user_ids
+
+    if segment_type == SEGMENT_WISHLIST:
+        try:
+            product_id = int(segment.get('product_id'))
+        except (TypeError, ValueError):
+            raise InvalidSegmentError('product_id must be an integer')
+        return """ps.user_id IN (
+            SELECT w.user_id FROM wishlist_items w WHERE w.product_id = %s
+        )""", [product_id]
+
+    if segment_type == SEGMENT_ACTIVE_RENTERS:
+        return """ps.user_id IN (
+            SELECT r.user_id FROM rentals r WHERE r.status = 'active'
+        )""", []
+
+    raise InvalidSegmentError(f"Segment type must be one of: {', '.join(SEGMENT_TYPES)}")
+
+
+def create_broadcast(cursor, segment, notification, created_by=None):
+    """
+    Record a broadcast and queue its first chunk.
+
+    Args:
+        cursor: Cursor of the transaction creating the broadcast
+        segment (dict): Target segment (see segment_condition)
+        notification (dict): Notification payload for the service worker
+        created_by (int): ID of the admin who created it
+
+    Returns:
+        int: Broadcast ID
+
+    Raises:
+        InvalidSegmentError: If the segment is invalid
+    """
+    segment_condition(segment)
+
+    cursor.execute("""
+        INSERT INTO push_broadcasts (segment, notification, status, created_by)
+        VALUES (%s, %s, 'queued', %s)
+    """, (json.dumps(segment), json.dumps(notification), created_by))
+    broadcast_id = cursor.lastrowid
+
+    _queue_chunk(cursor, broadcast_id, 0, 0)
+    return broadcast_id
+
+
+def get_broadcast(cursor, broadcast_id):
+    """
+    Get a broadcast with its delivery counters.
+
+    Args:
+        cursor: Dictionary cursor
+        broadcast_id (int): Broadcast ID
+
+    Returns:
+        dict: Broadcast row, or None if it does not exist
+    """
+    cursor.execute("""
+        SELECT id, segment, notification, status, created_by, chunks, processed,
+               sent, gone, retried, created_at, started_at, finished_at
+        FROM push_broadcasts
+        WHERE id = %s
+    """, (broadcast_id,))
+    broadcast = cursor.fetchone()
+    if broadcast:
+        for field in ('segment', 'notification'):
+            if isinstance(broadcast[field], (str, bytes)):
+                broadcast[field] = json.loads(broadcast[field])
+    return broadcast
+
+
+def _queue_chunk(cursor, broadcast_id, chunk, after_id):
+    enqueue(cursor, CHANNEL_PUSH, KIND_BROADCAST_CHUNK, {
+        'broadcast_id': broadcast_id,
+        'chunk': chunk,
+        'after_id': after_id
+    }, dedup_key=f"broadcast:{broadcast_id}:{chunk}")
+
+
+@register_handler(CHANNEL_PUSH, kind=KIND_BROADCAST_CHUNK)
+def run_broadcast_chunk(entry):
+    """
+    Outbox handler: deliver the next chunk of a broadcast.
+
+    Subscriptions the push service reports as gone are deleted in one
+    statement; those that failed transiently get their own outbox entry.
+    """
+    payload = entry['payload']
+    broadcast_id = payload['broadcast_id']
+    chunk = payload['chunk']
+
+    with db_cursor() as cursor:
+        broadcast = get_broadcast(cursor, broadcast_id)
+        if broadcast is None or broadcast['status'] in ('completed', 'cancelled'):
+            return
+
+        condition, params = segment_condition(broadcast['segment'])
+        cursor.execute(f"""
+            SELECT ps.subscription_id, ps.user_id, ps.subscription_data
+            FROM push_subscriptions ps
+            WHERE {condition} AND ps.subscription_id > %s
+            ORDER BY ps.subscription_id
+            LIMIT %s
+        """, params + [payload['after_id'], PUSH_BROADCAST_CHUNK_SIZE])
+        rows = cursor.fetchall()
+
+    notification = broadcast['notification']
+    subscriptions = [json.loads(row['subscription_data']) for row in rows]
+    result, processed = _send_until(subscriptions, notification, _chunk_deadline(entry))
+    if rows and not processed:
+        # Started too late in the lease to send anything; retried by the outbox
+        raise TimeoutError(f"Push broadcast {broadcast_id} chunk {chunk} started too late in its lease")
+
+    stopped = processed < len(rows)
+    done = len(rows) < PUSH_BROADCAST_CHUNK_SIZE and not stopped
+    rows = rows[:processed]
+    subscriptions = subscriptions[:processed]
+
+    gone_endpoints = set(result.gone)
+    gone_ids = [
+        row['subscription_id'] for row, subscription_data in zip(rows, subscriptions)
+        if subscription_data.get('endpoint') in gone_endpoints
+    ]
+    user_ids = {
+        subscription_data.get('endpoint'): row['user_id']
+        for row, subscription_data in zip(rows, subscriptions)
+    }
+
+    with db_cursor(commit=True) as cursor:
+        if not _renew_lease(cursor, entry):
+            logger.warning(f"Push broadcast {broadcast_id} chunk {chunk}: outbox entry {entry['id']} "
+                           f"was claimed by another dispatcher; not recording results")
+            return
+
+        if gone_ids:
+            placeholders = ', '.join(['%s'] * len(gone_ids))
+            cursor.execute(f"""
+                DELETE FROM push_subscriptions
+                WHERE subscription_id IN ({placeholders})
+            """, gone_ids)
+
+        enqueue_many(cursor, CHANNEL_PUSH, KIND_BROADCAST, [
+            ({
+                'user_id': user_ids.get(subscription_data.get('endpoint')),
+                'notification': notification,
+                'subscription': subscription_data
+            }, f"outbox:{entry['id']}:{endpoint_hash(subscription_data)}")
+            for subscription_data, _ in result.failed
+        ])
+
+        cursor.execute("""
+            UPDATE push_broadcasts
+            SET status = %s,
+                chunks = chunks + 1,
+                processed = processed + %s,
+                sent = sent + %s,
+                gone = gone + %s,
+                retried = retried + %s,
+                started_at = COALESCE(started_at, NOW()),
+                finished_at = IF(%s, NOW(), NULL)
+            WHERE id = %s
+        """, (
+            'completed' if done else 'running',
+            len(rows), result.sent, len(gone_ids), len(result.failed),
+            done, broadcast_id
+        ))
+
+        if not done:
+            _queue_chunk(cursor, broadcast_id, chunk + 1, rows[-1]['subscription_id'])
+
+    logger.info(f"Push broadcast {broadcast_id} chunk {chunk}: {result.sent} sent, "
+                f"{len(gone_ids)} gone, {len(result.failed)} retried"
+                + (f"; stopped after {len(rows)} at the lease deadline" if stopped else ""))
+
+
+def _chunk_deadline(entry):
+    """Monotonic time by which a chunk has to stop sending."""
+    lease_deadline = entry.get('lease_deadline', time.monotonic() + OUTBOX_LEASE_SECONDS)
+    return lease_deadline - PUSH_BROADCAST_LEASE_MARGIN
+
+
+def _send_until(subscriptions, notification, deadline):
+    """
+    Send to subscriptions in order, in waves, while a whole wave fits before the deadline.
+
+    Returns:
+        tuple: (FanoutResult, number of subscriptions processed from the start)
+    """
+    fanout = get_fanout()
+    wave_size = fanout.workers * PUSH_BROADCAST_WAVE_ROUNDS
+    # Every round of a wave may wait a full request timeout
+    wave_seconds = PUSH_BROADCAST_WAVE_ROUNDS * fanout.timeout
+    result = FanoutResult()
+    processed = 0
+    while processed < len(subscriptions) and time.monotonic() + wave_seconds <= deadline:
+        wave = subscriptions[processed:processed + wave_size]
+        wave_result = fanout.send(wave, notification)
+        result.sent += wave_result.sent
+        result.gone.extend(wave_result.gone)
+        result.failed.extend(wave_result.failed)
+        processed += len(wave)
+    return result, processed
+
+
+def _renew_lease(cursor, entry):
+    """
+    Lock the chunk's outbox row and extend its lease if this dispatcher still holds it.
+
+    Holding the row lock until commit keeps other dispatchers from reclaiming
+    it while the results are written; the renewed lease covers recording it.
+    """
+    cursor.execute("""
+        SELECT locked_by FROM notification_outbox
+        WHERE id = %s AND status = 'processing'
+        FOR UPDATE
+    """, (entry['id'],))
+    row = cursor.fetchone()
+    if row is None or row['locked_by'] != entry.get('locked_by'):
+        return False
+    cursor.execute("""
+        UPDATE notification_outbox
+        SET locked_until = DATE_ADD(NOW(6), INTERVAL %s SECOND)
+        WHERE id = %s
+    """, (OUTBOX_LEASE_SECONDS, entry['id']))
+    return True
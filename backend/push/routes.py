@@ -1,18 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import request, jsonify
 import json
-import os
-from pywebpush import webpush, WebPushException
-from ..utils.db import get_db_connection
-from ..auth.routes import token_required
-
-# Initialize push notification settings
-VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY', 'your_vapid_private_key')
-VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY', 'your_vapid_public_key')
-VAPID_CLAIMS = {
-    "sub": "mailto:admin@giggatek.com"
-}
-
-push_bp = Blueprint('push', __name__)
+from ..utils.db import get_db_connection, db_cursor
+from ..utils.auth import token_required, admin_required
+from . import push_bp
+from .sender import VAPID_PUBLIC_KEY, queue_push_notification
+from .broadcast import create_broadcast, get_broadcast, InvalidSegmentError
 
 @push_bp.route('/subscribe', methods=['POST'])
 @token_required
@@ -158,62 +150,97 @@ def send_notification():
                 'error': 'You do not have permission to send notifications to this user'
             }), 403
         
-        # Get user's subscriptions
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        # Queue the notification in the same transaction as the subscription check;
+        # the outbox dispatcher delivers it to every device
+        with db_cursor(commit=True) as cursor:
+            cursor.execute("""
+                SELECT COUNT(*) AS subscription_count FROM push_subscriptions
+                WHERE user_id = %s
+            """, (user_id,))
+            subscription_count = cursor.fetchone()['subscription_count']
+
+            if not subscription_count:
+                return jsonify({
+                    'success': False,
+                    'error': 'User has no push subscriptions'
+                }), 404
+
+            queue_push_notification(cursor, user_id, notification, kind=data.get('kind', 'push'))
+
+        return jsonify({
+            'success': True,
+            'message': f'Notification queued for {subscription_count} devices'
+        }), 202
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@push_bp.route('/broadcast', methods=['POST'])
+@token_required
+@admin_required
+def broadcast_notification():
+    """
+    Send a push notification to a segment of users
+    
+    Body: {"segment": {"type": "users", "user_ids": [...]} | {"type": "wishlist",
+    "product_id": ...} | {"type": "active_renters"}, "notification": {...}}
+    """
+    try:
+        data = request.get_json()
         
-        cursor.execute("""
-            SELECT subscription_data FROM push_subscriptions
-            WHERE user_id = %s
-        """, (user_id,))
+        # Validate required fields
+        if not data or 'segment' not in data or 'notification' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'Segment and notification data are required'
+            }), 400
         
-        subscriptions = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        # Delivered in the background by the outbox dispatcher
+        with db_cursor(commit=True) as cursor:
+            broadcast_id = create_broadcast(
+                cursor, data['segment'], data['notification'], created_by=request.user_id
+            )
         
-        if not subscriptions:
+        return jsonify({
+            'success': True,
+            'message': 'Broadcast queued',
+            'broadcast_id': broadcast_id
+        }), 202
+    
+    except InvalidSegmentError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@push_bp.route('/broadcasts/<int:broadcast_id>', methods=['GET'])
+@token_required
+@admin_required
+def get_broadcast_status(broadcast_id):
+    """
+    Get the progress and delivery stats of a broadcast
+    """
+    try:
+        with db_cursor() as cursor:
+            broadcast = get_broadcast(cursor, broadcast_id)
+        
+        if not broadcast:
             return jsonify({
                 'success': False,
-                'error': 'User has no push subscriptions'
+                'error': 'Broadcast not found'
             }), 404
         
-        # Send notification to each subscription
-        sent_count = 0
-        failed_count = 0
-        
-        for subscription_row in subscriptions:
-            try:
-                subscription_data = json.loads(subscription_row['subscription_data'])
-                
-                webpush(
-                    subscription_info=subscription_data,
-                    data=json.dumps(notification),
-                    vapid_private_key=VAPID_PRIVATE_KEY,
-                    vapid_claims=VAPID_CLAIMS
-                )
-                
-                sent_count += 1
-            except WebPushException as e:
-                failed_count += 1
-                print(f"WebPush error: {e}")
-                
-                # If subscription is expired or invalid, remove it
-                if e.response and e.response.status_code in [404, 410]:
-                    conn = get_db_connection()
-                    cursor = conn.cursor()
-                    
-                    cursor.execute("""
-                        DELETE FROM push_subscriptions
-                        WHERE user_id = %s AND endpoint = %s
-                    """, (user_id, subscription_data.get('endpoint')))
-                    
-                    conn.commit()
-                    cursor.close()
-                    conn.close()
-        
         return jsonify({
             'success': True,
-            'message': f'Notification sent to {sent_count} devices, failed on {failed_count} devices'
+            'broadcast': broadcast
         })
     
     except Exception as e:
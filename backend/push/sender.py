@@ -0,0 +1,314 @@
+"""
+Web push delivery for GigGatek.
+
+Notifications are queued in the notification outbox (queue_push_notification)
+and delivered by the outbox dispatcher through deliver_outbox_push.
+
+A notification for a user fans out to all of the user's subscriptions
+concurrently on a shared thread pool. Requests to the same push service
+(FCM, Mozilla autopush, ...) reuse keep-alive connections from one HTTP
+session per service host, are rate limited per host, and every request has
+a timeout. VAPID headers are signed once per push service and reused until
+shortly before they expire (see vapid.py).
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from pywebpush import webpush, WebPushException
+
+from ..utils.db import db_cursor
+from ..utils.outbox import enqueue, enqueue_many, register_handler, PermanentDeliveryError, CHANNEL_PUSH
+from .vapid import VapidSigner
+
+logger = logging.getLogger(__name__)
+
+# Initialize push notification settings
+VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY', 'your_vapid_private_key')
+VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY', 'your_vapid_public_key')
+VAPID_CLAIMS = {
+    "sub": "mailto:admin@giggatek.com"
+}
+
+# Fan-out configuration
+PUSH_FANOUT_WORKERS = int(os.environ.get('PUSH_FANOUT_WORKERS', 16))  # Concurrent push requests per process
+PUSH_REQUEST_TIMEOUT = float(os.environ.get('PUSH_REQUEST_TIMEOUT', 10))  # Seconds per push request
+PUSH_RATE_LIMIT = float(os.environ.get('PUSH_RATE_LIMIT', 500))  # Requests/second per push service host; 0 disables
+
+# Push services answer these for subscriptions that no longer exist
+GONE_STATUS_CODES = (404, 410)
+
+
+class FanoutResult:
+    """Outcome of sending one notification to several subscriptions."""
+
+    def __init__(self):
+        self.sent = 0
+        self.gone = []    # Endpoints the push service reported as gone
+        self.failed = []  # (subscription_data, error) pairs worth retrying
+
+    def __repr__(self):
+        return f"<FanoutResult sent={self.sent} gone={len(self.gone)} failed={len(self.failed)}>"
+
+
+class HostRateLimiter:
+    """
+    Token bucket per push service host.
+
+    acquire() reserves the next free slot for the host and sleeps until it
+    comes up, so concurrent senders are spaced out to `rate` requests per
+    second after an initial burst.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._buckets = {}  # host -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        """
+        Wait until a request to `host` may be sent.
+
+        Returns:
+            float: Seconds waited
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+            self._buckets[host] = (tokens, now)
+        delay = -tokens / self.rate if tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class PushFanout:
+    """
+    Sends web push notifications concurrently.
+
+    One requests.Session per push service host keeps connections alive
+    between notifications; its pool is sized to the number of workers.
+    Requests per host are limited to `rate_limit` per second.
+    """
+
+    def __init__(self, workers=PUSH_FANOUT_WORKERS, timeout=PUSH_REQUEST_TIMEOUT,
+                 rate_limit=PUSH_RATE_LIMIT):
+        self.workers = workers
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(rate_limit, burst=workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='push-fanout')
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, host):
+        """HTTP session for a push service host."""
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._sessions[host] = session
+        return session
+
+    def _send_one(self, subscription_data, notification):
+        host = urlparse(subscription_data.get('endpoint') or '').netloc
+        self.rate_limiter.acquire(host)
+        send_web_push(subscription_data, notification,
+                      timeout=self.timeout, session=self.session_for(host))
+
+    def send(self, subscriptions, notification):
+        """
+        Send a notification to several subscriptions at once.
+
+        Args:
+            subscriptions (list): Subscription data dicts (endpoint and keys)
+            notification (dict): Notification payload
+
+        Returns:
+            FanoutResult: Counts of delivered, gone and retryable subscriptions
+        """
+        result = FanoutResult()
+        futures = [
+            (subscription_data, self._executor.submit(self._send_one, subscription_data, notification))
+            for subscription_data in subscriptions
+        ]
+        for subscription_data, future in futures:
+            error = future.exception()
+            if error is None:
+                result.sent += 1
+            elif isinstance(error, WebPushException) and _is_gone(error):
+                result.gone.append(subscription_data.get('endpoint'))
+            else:
+                result.failed.append((subscription_data, error))
+        return result
+
+    def close(self):
+        """Stop the workers and close the HTTP sessions."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+# Process-wide fan-out engine, created lazily and re-created after fork
+_fanout = None
+_fanout_pid = None
+_fanout_lock = threading.Lock()
+
+
+def get_fanout():
+    """Get this process's PushFanout."""
+    global _fanout, _fanout_pid
+    pid = os.getpid()
+    if _fanout is None or _fanout_pid != pid:
+        with _fanout_lock:
+            if _fanout is None or _fanout_pid != pid:
+                _fanout = PushFanout()
+                _fanout_pid = pid
+    return _fanout
+
+
+def queue_push_notification(cursor, user_id, notification, kind='push', dedup_key=None):
+    """
+    Queue a push notification to all of a user's devices.
+
+    Args:
+        cursor: Cursor of the transaction the notification belongs to
+        user_id (int): Recipient user ID
+        notification (dict): Notification payload for the service worker
+        kind (str): Notification type, for logging
+        dedup_key (str): Optional key that prevents queuing it twice
+
+    Returns:
+        bool: True if queued, False if the dedup key was already used
+    """
+    return enqueue(cursor, CHANNEL_PUSH, kind, {
+        'user_id': user_id,
+        'notification': notification
+    }, dedup_key)
+
+
+# Process-wide VAPID signer, re-created if VAPID_PRIVATE_KEY is replaced
+_vapid_signer = None
+_vapid_signer_lock = threading.Lock()
+
+
+def get_vapid_signer():
+    """Get the VapidSigner for the configured key."""
+    global _vapid_signer
+    signer = _vapid_signer
+    if signer is None or signer.private_key is not VAPID_PRIVATE_KEY:
+        with _vapid_signer_lock:
+            signer = _vapid_signer
+            if signer is None or signer.private_key is not VAPID_PRIVATE_KEY:
+                signer = _vapid_signer = VapidSigner(VAPID_PRIVATE_KEY, VAPID_CLAIMS)
+    return signer
+
+
+def send_web_push(subscription_data, notification, timeout=PUSH_REQUEST_TIMEOUT, session=None):
+    """
+    Send one notification to one subscription.
+
+    Raises:
+        WebPushException: If the push service rejected the message
+        requests.RequestException: On connection errors and timeouts
+    """
+    # Pre-signed VAPID headers; without vapid_claims webpush() does not sign again
+    headers = get_vapid_signer().headers_for(subscription_data.get('endpoint') or '')
+    webpush(
+        subscription_info=subscription_data,
+        data=json.dumps(notification),
+        headers=headers,
+        timeout=timeout,
+        requests_session=session
+    )
+
+
+def remove_subscriptions(cursor, user_id, endpoints):
+    """Delete subscriptions the push service reported as gone, in one statement."""
+    endpoints = [endpoint for endpoint in endpoints if endpoint]
+    if not endpoints:
+        return
+    placeholders = ', '.join(['%s'] * len(endpoints))
+    cursor.execute(f"""
+        DELETE FROM push_subscriptions
+        WHERE user_id = %s AND endpoint IN ({placeholders})
+    """, [user_id] + endpoints)
+
+
+def endpoint_hash(subscription_data):
+    """Short stable ID of a subscription's endpoint, for outbox dedup keys."""
+    return hashlib.sha1((subscription_data.get('endpoint') or '').encode('utf-8')).hexdigest()
+
+
+def _is_gone(error):
+    return error.response is not None and error.response.status_code in GONE_STATUS_CODES
+
+
+@register_handler(CHANNEL_PUSH)
+def deliver_outbox_push(entry):
+    """
+    Outbox handler for push notifications.
+
+    An entry addressed to a user fans out to all of the user's subscriptions.
+    Subscriptions that fail transiently get their own outbox entry, so the
+    retry only goes to that device and the others are not notified twice.
+    Entries addressed to a single subscription raise to be retried.
+    """
+    payload = entry['payload']
+    user_id = payload['user_id']
+    notification = payload['notification']
+
+    fanout = get_fanout()
+
+    if 'subscription' in payload:
+        result = fanout.send([payload['subscription']], notification)
+        if result.gone:
+            with db_cursor(commit=True) as cursor:
+                remove_subscriptions(cursor, user_id, result.gone)
+        if result.failed:
+            raise result.failed[0][1]
+        return
+
+    with db_cursor() as cursor:
+        cursor.execute("""
+            SELECT subscription_data FROM push_subscriptions
+            WHERE user_id = %s
+        """, (user_id,))
+        subscriptions = [json.loads(row['subscription_data']) for row in cursor.fetchall()]
+
+    result = fanout.send(subscriptions, notification)
+    for _, error in result.failed:
+        logger.warning(f"WebPush error for user {user_id}: {error}")
+
+    if result.gone or result.failed:
+        with db_cursor(commit=True) as cursor:
+            remove_subscriptions(cursor, user_id, result.gone)
+            enqueue_many(cursor, CHANNEL_PUSH, entry['kind'], [
+                ({
+                    'user_id': user_id,
+                    'notification': notification,
+                    'subscription': subscription_data
+                }, f"outbox:{entry['id']}:{endpoint_hash(subscription_data)}")
+                for subscription_data, _ in result.failed
+            ])
+
+    if subscriptions and len(result.gone) == len(subscriptions):
+        raise PermanentDeliveryError(f"All push subscriptions of user {user_id} are gone")
@@ -0,0 +1,93 @@
+"""
+VAPID signing for GigGatek web push.
+
+pywebpush parses the private key and signs a new VAPID JWT (one ECDSA
+signature) for every message. The JWT only depends on the push service
+(its `aud` claim) and the expiry, so VapidSigner loads the key once and
+reuses the signed headers for each push service until shortly before
+they expire; a broadcast to many endpoints of one service signs once.
+"""
+
+import os
+import time
+import threading
+from urllib.parse import urlparse
+
+from py_vapid import Vapid, Vapid01
+
+# Signed VAPID tokens are valid this long (push services accept up to 24 hours)
+VAPID_TOKEN_TTL = int(os.environ.get('VAPID_TOKEN_TTL', 12 * 60 * 60))
+# Tokens are re-signed this many seconds before they expire
+VAPID_TOKEN_REFRESH_MARGIN = int(os.environ.get('VAPID_TOKEN_REFRESH_MARGIN', 10 * 60))
+
+
+def push_service_audience(endpoint):
+    """VAPID `aud` claim for an endpoint: the push service's origin."""
+    url = urlparse(endpoint)
+    return f"{url.scheme}://{url.netloc}"
+
+
+class VapidSigner:
+    """
+    Signs VAPID headers, caching them per push service audience.
+    """
+
+    def __init__(self, private_key, claims, ttl=VAPID_TOKEN_TTL,
+                 refresh_margin=VAPID_TOKEN_REFRESH_MARGIN):
+        """
+        Args:
+            private_key: Vapid instance, path to a PEM file or the key as a string
+            claims (dict): Static claims (`sub`); `aud` and `exp` are added per service
+            ttl (int): Seconds a signed token is valid
+            refresh_margin (int): Re-sign this many seconds before expiry
+        """
+        self.private_key = private_key
+        self.claims = dict(claims)
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl // 2)
+
+        self._vapid = None
+        self._headers = {}  # audience -> (headers, expires_at)
+        self._lock = threading.Lock()
+        self.signatures = 0
+
+    def _load_key(self):
+        if isinstance(self.private_key, Vapid01):
+            return self.private_key
+        if os.path.isfile(self.private_key):
+            return Vapid.from_file(private_key_file=self.private_key)
+        return Vapid.from_string(private_key=self.private_key)
+
+    def headers_for(self, endpoint):
+        """
+        VAPID headers for a subscription endpoint.
+
+        Args:
+            endpoint (str): Subscription endpoint URL
+
+        Returns:
+            dict: Authorization (and for legacy keys Crypto-Key) headers; do
+            not modify
+        """
+        audience = push_service_audience(endpoint)
+        cached = self._headers.get(audience)
+        now = time.time()
+        if cached and cached[1] - self.refresh_margin > now:
+            return cached[0]
+
+        with self._lock:
+            cached = self._headers.get(audience)
+            if cached and cached[1] - self.refresh_margin > now:
+                return cached[0]
+            if self._vapid is None:
+                self._vapid = self._load_key()
+            expires_at = int(now) + self.ttl
+            headers = self._vapid.sign(dict(self.claims, aud=audience, exp=expires_at))
+            self._headers[audience] = (headers, expires_at)
+            self.signatures += 1
+            return headers
+
+    def clear(self):
+        """Drop cached tokens (e.g. after rotating the key)."""
+        with self._lock:
+            self._headers.clear()
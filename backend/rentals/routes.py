@@ -1,16 +1,23 @@
 from flask import Blueprint, request, jsonify, make_response
 from datetime import datetime, timedelta
 import calendar
-from ..utils.db import get_db_connection
-from ..auth.routes import token_required
+from ..utils.db import get_db_connection, attach_batch
+from ..utils.pagination import (
+    decode_cursor, keyset_condition, order_by_sql, paginate_rows, InvalidCursorError
+)
+from ..utils.auth import token_required
 from ..utils.cache import (
-    cache_get, cache_set, cache_delete,
+    cache_fetch, cache_delete,
     invalidate_user_rentals_cache, invalidate_rental_cache,
-    RENTAL_DETAILS_TTL, RENTAL_LIST_TTL
+    user_rentals_tag, rental_tag, product_tag,
+    RENTAL_DETAILS_TTL, RENTAL_LIST_TTL, RENTAL_STALE_TTL
 )
 
 rentals_bp = Blueprint('rentals', __name__)
 
+# Newest first; the id tiebreaker makes the order usable as a keyset cursor
+RENTAL_LIST_SORT = [('r.created_at', 'DESC'), ('r.id', 'DESC')]
+
 @rentals_bp.route('/', methods=['GET'])
 @token_required
 def get_user_rentals():
@@ -21,15 +28,49 @@ def get_user_rentals():
     status = request.args.get('status')
     page = int(request.args.get('page', 1))
     per_page = min(int(request.args.get('per_page', 10)), 50)  # Limit to 50 max
+    user_id = request.user_id
+
+    # Passing `cursor` (empty for the first page) switches to keyset pagination
+    cursor_token = request.args.get('cursor')
+    include_total = cursor_token is None or request.args.get('include_total', 'false').lower() == 'true'
+    try:
+        after = decode_cursor(cursor_token, 'rentals', len(RENTAL_LIST_SORT)) if cursor_token else None
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
 
     # Generate cache key
-    cache_key = f"rental:user:{request.user_id}:list:status:{status or 'all'}:page:{page}:per_page:{per_page}"
+    if cursor_token is not None:
+        cache_key = (f"rental:user:{user_id}:list:status:{status or 'all'}:cursor:{cursor_token or 'first'}"
+                     f":per_page:{per_page}:total:{int(include_total)}")
+    else:
+        cache_key = f"rental:user:{user_id}:list:status:{status or 'all'}:page:{page}:per_page:{per_page}"
+
+    try:
+        # Only one worker re-runs the queries when the entry expires; the
+        # others keep serving the previous page meanwhile
+        response = cache_fetch(
+            cache_key,
+            lambda: _load_user_rentals(user_id, status, page, per_page,
+                                       keyset=cursor_token is not None, after=after,
+                                       include_total=include_total),
+            RENTAL_LIST_TTL,
+            tags=lambda result: [user_rentals_tag(), user_rentals_tag(user_id)] + [
+                rental_tag(rental['id']) for rental in result['rentals']
+            ],
+            stale_ttl=RENTAL_STALE_TTL
+        )
+        return jsonify(response), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-    # Try to get from cache
-    cached_result = cache_get(cache_key)
-    if cached_result:
-        return jsonify(cached_result), 200
+def _load_user_rentals(user_id, status, page, per_page, keyset=False, after=None, include_total=True):
+    """
+    Query a page of the user's rentals with their payment history
 
+    With keyset=True the page starts after the sort key `after` (None for the
+    first page) instead of at an offset.
+    """
     # Calculate offset for pagination
     offset = (page - 1) * per_page
 
@@ -52,8 +93,8 @@ def get_user_rentals():
         WHERE user_id = %s
     """
 
-    query_params = [request.user_id]
-    count_params = [request.user_id]
+    query_params = [user_id]
+    count_params = [user_id]
 
     # Add status filter if provided
     if status:
@@ -63,8 +104,17 @@ def get_user_rentals():
         count_params.append(status)
 
     # Add sorting and pagination
-    query += " ORDER BY r.created_at DESC LIMIT %s OFFSET %s"
-    query_params.extend([per_page, offset])
+    if keyset:
+        # Seek past the last rental of the previous page instead of skipping rows
+        if after is not None:
+            condition, condition_params = keyset_condition(RENTAL_LIST_SORT, after)
+            query += f" AND {condition}"
+            query_params.extend(condition_params)
+        query += f" ORDER BY {order_by_sql(RENTAL_LIST_SORT)} LIMIT %s"
+        query_params.append(per_page + 1)
+    else:
+        query += f" ORDER BY {order_by_sql(RENTAL_LIST_SORT)} LIMIT %s OFFSET %s"
+        query_params.extend([per_page, offset])
 
     # Execute queries
     conn = get_db_connection()
@@ -72,33 +122,43 @@ def get_user_rentals():
 
     try:
         # Get total count
-        cursor.execute(count_query, count_params)
-        total_count = cursor.fetchone()['total']
+        total_count = None
+        if include_total:
+            cursor.execute(count_query, count_params)
+            total_count = cursor.fetchone()['total']
 
         # Get paginated results
         cursor.execute(query, query_params)
         rentals = cursor.fetchall()
+        if keyset:
+            rentals, next_cursor = paginate_rows(rentals, RENTAL_LIST_SORT, per_page, 'rentals')
 
-        # For each rental, get payment history
-        for rental in rentals:
-            cursor.execute("""
-                SELECT
-                    id, rental_id, amount, payment_date, payment_method,
-                    transaction_id, status, created_at
-                FROM rental_payments
-                WHERE rental_id = %s
-                ORDER BY payment_date DESC
-            """, (rental['id'],))
-            rental['payments'] = cursor.fetchall()
+        # Get payment history for the whole page in one query
+        attach_batch(cursor, rentals, 'payments', """
+            SELECT
+                id, rental_id, amount, payment_date, payment_method,
+                transaction_id, status, created_at
+            FROM rental_payments
+            WHERE rental_id IN ({placeholders})
+            ORDER BY payment_date DESC
+        """, 'rental_id')
 
+        for rental in rentals:
             # Calculate payment progress percentage
             if rental['total_months'] > 0:
                 rental['payment_progress'] = (rental['payments_made'] / rental['total_months']) * 100
             else:
                 rental['payment_progress'] = 0
 
-        cursor.close()
-        conn.close()
+        if keyset:
+            pagination = {
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+            if include_total:
+                pagination['total'] = total_count
+            return {'rentals': rentals, 'pagination': pagination}
 
         # Calculate pagination metadata
         total_pages = (total_count + per_page - 1) // per_page  # Ceiling division
@@ -114,15 +174,11 @@ def get_user_rentals():
             }
         }
 
-        # Cache the result
-        cache_set(cache_key, response, RENTAL_LIST_TTL)
-
-        return jsonify(response), 200
+        return response
 
-    except Exception as e:
+    finally:
         cursor.close()
         conn.close()
-        return jsonify({'error': str(e)}), 500
 
 @rentals_bp.route('/<int:rental_id>', methods=['GET'])
 @token_required
@@ -130,14 +186,37 @@ def get_rental_details(rental_id):
     """
     Get detailed information for a specific rental
     """
+    user_id = request.user_id
+
     # Generate cache key
-    cache_key = f"rental:user:{request.user_id}:id:{rental_id}:details"
+    cache_key = f"rental:user:{user_id}:id:{rental_id}:details"
 
-    # Try to get from cache
-    cached_result = cache_get(cache_key)
-    if cached_result:
-        return jsonify(cached_result), 200
+    try:
+        response = cache_fetch(
+            cache_key,
+            lambda: _load_rental_details(user_id, rental_id),
+            RENTAL_DETAILS_TTL,
+            tags=lambda result: [
+                user_rentals_tag(),
+                user_rentals_tag(user_id),
+                rental_tag(rental_id),
+                product_tag(result['rental']['product_id'])
+            ],
+            stale_ttl=RENTAL_STALE_TTL
+        )
+        if response is None:
+            return jsonify({'error': 'Rental not found or access denied'}), 404
 
+        return jsonify(response), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _load_rental_details(user_id, rental_id):
+    """
+    Query a rental with payments, address, contract, status history and
+    payment schedule. Returns None if the rental does not belong to the user.
+    """
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
 
@@ -154,14 +233,12 @@ def get_rental_details(rental_id):
             FROM rentals r
             JOIN products p ON r.product_id = p.id
             WHERE r.id = %s AND r.user_id = %s
-        """, (rental_id, request.user_id))
+        """, (rental_id, user_id))
 
         rental = cursor.fetchone()
 
         if not rental:
-            cursor.close()
-            conn.close()
-            return jsonify({'error': 'Rental not found or access denied'}), 404
+            return None
 
         # Get payment history
         cursor.execute("""
@@ -251,19 +328,11 @@ def get_rental_details(rental_id):
             if payment['status'] == 'completed'
         )
 
-        cursor.close()
-        conn.close()
-
-        # Cache the result
-        response = {'rental': rental}
-        cache_set(cache_key, response, RENTAL_DETAILS_TTL)
-
-        return jsonify(response), 200
+        return {'rental': rental}
 
-    except Exception as e:
+    finally:
         cursor.close()
         conn.close()
-        return jsonify({'error': str(e)}), 500
 
 @rentals_bp.route('/', methods=['POST'])
 @token_required
@@ -916,14 +985,28 @@ def get_rental_stats():
     """
     Get rental statistics for the authenticated user
     """
+    user_id = request.user_id
+
     # Generate cache key
-    cache_key = f"rental:user:{request.user_id}:stats"
+    cache_key = f"rental:user:{user_id}:stats"
 
-    # Try to get from cache
-    cached_result = cache_get(cache_key)
-    if cached_result:
-        return jsonify(cached_result), 200
+    try:
+        stats = cache_fetch(
+            cache_key,
+            lambda: _load_rental_stats(user_id),
+            RENTAL_LIST_TTL,
+            tags=[user_rentals_tag(), user_rentals_tag(user_id)],
+            stale_ttl=RENTAL_STALE_TTL
+        )
+        return jsonify(stats), 200
 
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _load_rental_stats(user_id):
+    """
+    Query rental totals, status counts and upcoming payments for a user
+    """
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
 
@@ -933,7 +1016,7 @@ def get_rental_stats():
             SELECT COUNT(*) as total_rentals
             FROM rentals
             WHERE user_id = %s
-        """, (request.user_id,))
+        """, (user_id,))
 
         stats = cursor.fetchone()
 
@@ -943,7 +1026,7 @@ def get_rental_stats():
             FROM rentals
             WHERE user_id = %s
             GROUP BY status
-        """, (request.user_id,))
+        """, (user_id,))
 
         status_counts = cursor.fetchall()
         stats['status_counts'] = {item['status']: item['count'] for item in status_counts}
@@ -954,7 +1037,7 @@ def get_rental_stats():
             FROM rental_payments
             WHERE rental_id IN (SELECT id FROM rentals WHERE user_id = %s)
             AND status = 'completed'
-        """, (request.user_id,))
+        """, (user_id,))
 
         total_spent = cursor.fetchone()
         stats['total_spent'] = total_spent['total_spent'] or 0
@@ -967,7 +1050,7 @@ def get_rental_stats():
             JOIN products p ON r.product_id = p.id
             WHERE r.user_id = %s AND r.status = 'active'
             ORDER BY r.next_payment_date ASC
-        """, (request.user_id,))
+        """, (user_id,))
 
         active_rentals = cursor.fetchall()
         stats['upcoming_payments'] = active_rentals
@@ -977,23 +1060,16 @@ def get_rental_stats():
             SELECT COUNT(DISTINCT product_id) as total_products_rented
             FROM rentals
             WHERE user_id = %s
-        """, (request.user_id,))
+        """, (user_id,))
 
         products_result = cursor.fetchone()
         stats['total_products_rented'] = products_result['total_products_rented']
 
-        cursor.close()
-        conn.close()
-
-        # Cache the result
-        cache_set(cache_key, stats, RENTAL_LIST_TTL)
+        return stats
 
-        return jsonify(stats), 200
-
-    except Exception as e:
+    finally:
         cursor.close()
         conn.close()
-        return jsonify({'error': str(e)}), 500
 
 @rentals_bp.route('/<int:rental_id>/contract', methods=['GET'])
 @token_required
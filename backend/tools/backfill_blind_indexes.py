@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Backfill blind indexes of encrypted user fields.
+
+Computes first_name_bidx, last_name_bidx and phone_bidx for every user from
+the encrypted columns (falling back to the plaintext column for rows that
+were never encrypted), so lookups through find_by_blind_index see existing
+users. Run it after add_user_blind_indexes.sql and again whenever
+DB_BLIND_INDEX_KEY changes.
+
+Usage:
+    python -m backend.tools.backfill_blind_indexes [--batch-size 1000]
+"""
+
+import argparse
+import sys
+
+from backend.utils.db import db_connection
+from backend.utils.encryption import BLIND_INDEXED_FIELDS, blind_index_columns, decrypt_rows
+
+FIELDS = list(BLIND_INDEXED_FIELDS['users'])
+
+
+def user_values(rows):
+    """Plaintext values of the indexed fields, preferring the encrypted columns."""
+    encrypted = [f"{field}_encrypted" for field in FIELDS]
+    values = []
+    for row in decrypt_rows(rows, encrypted):
+        values.append({
+            field: row[f"{field}_encrypted"] if row[f"{field}_encrypted"] is not None else row[field]
+            for field in FIELDS
+        })
+    return values
+
+
+def backfill(conn, batch_size):
+    """Recompute the blind indexes of all users. Returns the number of rows updated."""
+    cursor = conn.cursor(dictionary=True)
+    columns = ', '.join(FIELDS + [f"{field}_encrypted" for field in FIELDS])
+    set_clause = ', '.join(f"{field}_bidx = %s" for field in FIELDS)
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            cursor.execute(
+                f"SELECT id, {columns} FROM users WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            updates = []
+            for row, values in zip(rows, user_values(rows)):
+                indexes = blind_index_columns(values, FIELDS)
+                updates.append(tuple(indexes[f"{field}_bidx"] for field in FIELDS) + (row['id'],))
+            cursor.executemany(f"UPDATE users SET {set_clause} WHERE id = %s", updates)
+            conn.commit()
+            updated += len(updates)
+    finally:
+        cursor.close()
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=1000, help='Users per query')
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        updated = backfill(conn, args.batch_size)
+        print(f"Indexed {updated} users.")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Backfill precomputed product fields.
+
+`primary_image` is generated by MySQL from `image_urls`, so it is filled in
+for every row whose image_urls is a JSON array. Older rows that stored the
+array as a JSON-encoded string (e.g. '"[\"/img/a.jpg\"]"') yield NULL; this
+script rewrites them as real arrays so the column is populated, then
+pre-builds the cached, parsed product detail documents served by
+/api/products/<id>.
+
+Usage:
+    python -m backend.tools.backfill_product_fields [--batch-size 500] [--skip-cache]
+"""
+
+import argparse
+import json
+import sys
+
+from backend.utils.db import db_connection
+from backend.utils.cache import cache_fetch, product_tag, invalidate_product_cache, PRODUCT_DETAILS_TTL
+from backend.utils.catalog import load_product_details, product_detail_cache_key
+
+
+def repair_image_urls(conn, batch_size):
+    """Rewrite string-encoded image_urls as JSON arrays. Returns the number of rows fixed."""
+    cursor = conn.cursor(dictionary=True)
+    fixed = 0
+    last_id = 0
+    try:
+        while True:
+            cursor.execute("""
+                SELECT product_id, image_urls FROM products
+                WHERE product_id > %s AND primary_image IS NULL
+                  AND JSON_TYPE(image_urls) = 'STRING'
+                ORDER BY product_id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['product_id']
+
+            updates = []
+            for row in rows:
+                try:
+                    images = json.loads(json.loads(row['image_urls']))
+                except (TypeError, ValueError):
+                    continue
+                if isinstance(images, list):
+                    updates.append((json.dumps(images), row['product_id']))
+
+            if updates:
+                cursor.executemany("UPDATE products SET image_urls = %s WHERE product_id = %s", updates)
+                conn.commit()
+                for _, product_id in updates:
+                    invalidate_product_cache(product_id)
+                fixed += len(updates)
+    finally:
+        cursor.close()
+    return fixed
+
+
+def warm_product_details(conn, batch_size):
+    """Cache the parsed detail document of every product. Returns the number cached."""
+    cursor = conn.cursor(dictionary=True)
+    warmed = 0
+    last_id = 0
+    try:
+        while True:
+            cursor.execute(
+                "SELECT product_id FROM products WHERE product_id > %s ORDER BY product_id LIMIT %s",
+                (last_id, batch_size)
+            )
+            product_ids = [row['product_id'] for row in cursor.fetchall()]
+            if not product_ids:
+                break
+            last_id = product_ids[-1]
+
+            details = load_product_details(cursor, product_ids)
+            for product_id, product in details.items():
+                cache_fetch(
+                    product_detail_cache_key(product_id),
+                    lambda product=product: product,
+                    PRODUCT_DETAILS_TTL,
+                    tags=[product_tag(product_id)]
+                )
+            warmed += len(details)
+    finally:
+        cursor.close()
+    return warmed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500, help='Products per query')
+    parser.add_argument('--skip-cache', action='store_true', help='Do not pre-build cached product details')
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        fixed = repair_image_urls(conn, args.batch_size)
+        print(f"Repaired image_urls on {fixed} products.")
+
+        if not args.skip_cache:
+            warmed = warm_product_details(conn, args.batch_size)
+            print(f"Cached details for {warmed} products.")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Benchmark authentication overhead per request.
+
+Simulates --clients clients each polling --polls times with their own token
+and measures the time token_required adds to a request, verifying every
+token with jwt.decode (as before) and through the verified-token cache.
+Both run the full decorator inside one request context, so the numbers
+exclude routing and the view itself.
+
+Usage:
+    python -m backend.tools.benchmark_auth [--clients 500] [--polls 20]
+"""
+
+import argparse
+import sys
+import time
+
+from flask import Flask, request
+
+from backend.utils import auth
+
+
+def measure(app, tokens, polls, authenticator):
+    """Seconds per authenticated request using the given authenticator."""
+    auth.authenticator = authenticator
+
+    @auth.token_required
+    def view():
+        return 'ok'
+
+    elapsed = 0.0
+    for token in tokens:
+        with app.test_request_context(headers={'Authorization': f"Bearer {token}"}):
+            for _ in range(polls):
+                request.user_id = None  # Authenticate again, as a new request would
+                start = time.perf_counter()
+                response = view()
+                elapsed += time.perf_counter() - start
+                if response != 'ok':
+                    raise RuntimeError(f"Authentication failed: {response}")
+    return elapsed / (len(tokens) * polls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500, help='Distinct tokens')
+    parser.add_argument('--polls', type=int, default=20, help='Requests per token')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    tokens = [auth.generate_token(user_id) for user_id in range(1, args.clients + 1)]
+    original = auth.authenticator
+
+    try:
+        uncached = measure(app, tokens, args.polls, auth.TokenAuthenticator(cache_size=0))
+        cached_authenticator = auth.TokenAuthenticator()
+        cached = measure(app, tokens, args.polls, cached_authenticator)
+    finally:
+        auth.authenticator = original
+
+    print(f"token_required ({args.clients} clients x {args.polls} requests)")
+    print(f"  {'jwt.decode per request':<28} {uncached * 1e6:9.1f} us")
+    print(f"  {'verified-token cache':<28} {cached * 1e6:9.1f} us")
+    print(f"  {'speedup':<28} {uncached / cached:9.1f}x")
+    print(f"  {'cached tokens':<28} {len(cached_authenticator.cache.entries):9d}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmark catalog brand filtering against a large synthetic product table.
+
+Seeds a `bench_products` table with the same definition as `products`
+(including the generated `brand` column and catalog indexes), then compares
+the legacy `specifications LIKE '%"brand"%'` filter with the indexed filter
+built by backend.utils.catalog. Reports median latency and the EXPLAIN access
+type / estimated rows for each query.
+
+Usage:
+    python -m backend.tools.benchmark_catalog [--rows 100000] [--runs 20] [--keep]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+from backend.utils.db import db_connection
+from backend.utils.catalog import build_product_filters, PRODUCT_LIST_COLUMNS, PRODUCT_SORTS
+
+BENCH_TABLE = 'bench_products'
+BRANDS = ['Dell', 'HP', 'Lenovo', 'Apple', 'ASUS', 'Acer', 'MSI', 'NVIDIA', 'AMD', 'Intel',
+          'Samsung', 'Corsair', 'Gigabyte', 'EVGA', 'Kingston', 'Crucial', 'Seagate', 'Western Digital']
+CATEGORIES = ['laptops', 'desktops', 'graphics-cards', 'processors', 'memory', 'storage', 'monitors']
+CONDITIONS = ['Excellent', 'Good', 'Fair']
+
+
+def seed(conn, rows, batch_size=5000):
+    """Create and fill the benchmark table."""
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"CREATE TABLE {BENCH_TABLE} LIKE products")
+
+    insert = (f"INSERT INTO {BENCH_TABLE} (name, description, category, specifications, "
+              "condition_rating, purchase_price, rental_price_3m, rental_price_6m, rental_price_12m, "
+              "stock_quantity, is_featured, image_urls) "
+              "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+    rng = random.Random(42)
+
+    for start in range(0, rows, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, rows)):
+            price = round(rng.uniform(20, 3000), 2)
+            batch.append((
+                f"Bench product {i}",
+                "Synthetic benchmark product",
+                rng.choice(CATEGORIES),
+                json.dumps({'Brand': rng.choice(BRANDS), 'Model': f"M-{i}"}),
+                rng.choice(CONDITIONS),
+                price,
+                round(price / 8, 2),
+                round(price / 14, 2),
+                round(price / 24, 2),
+                rng.randint(0, 20),
+                rng.random() < 0.05,
+                json.dumps([f"/img/bench/{i}.jpg"])
+            ))
+        cursor.executemany(insert, batch)
+        conn.commit()
+
+    cursor.execute(f"ANALYZE TABLE {BENCH_TABLE}")
+    cursor.fetchall()
+    cursor.close()
+
+
+def legacy_query(brands):
+    """Filter as the product list endpoint did before the catalog index."""
+    clauses = ["stock_quantity > 0"]
+    params = []
+    if brands:
+        brand_clauses = []
+        for brand in brands:
+            brand_clauses.append("specifications LIKE %s")
+            params.append(f'%"{brand}"%')
+        clauses.append("(" + " OR ".join(brand_clauses) + ")")
+    return "WHERE " + " AND ".join(clauses), params
+
+
+def time_query(cursor, sql, params, runs):
+    """Return the median wall time in milliseconds over `runs` executions."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def explain(cursor, sql, params):
+    """Return (access type, estimated rows) for the first table in the plan."""
+    cursor.execute("EXPLAIN " + sql, params)
+    plan = cursor.fetchall()[0]
+    return plan['type'], plan['rows']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='Number of products to seed')
+    parser.add_argument('--runs', type=int, default=20, help='Executions per query')
+    parser.add_argument('--brand', action='append', help='Brand to filter on (repeatable)')
+    parser.add_argument('--keep', action='store_true', help='Keep the benchmark table afterwards')
+    args = parser.parse_args()
+    brands = args.brand or ['Dell', 'Lenovo']
+
+    with db_connection() as conn:
+        print(f"Seeding {args.rows} rows into {BENCH_TABLE}...")
+        seed(conn, args.rows)
+
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cases = [
+                ('legacy LIKE', legacy_query(brands)),
+                ('indexed brand', build_product_filters(brands=brands))
+            ]
+            for label, (where_sql, params) in cases:
+                sql = (f"SELECT {PRODUCT_LIST_COLUMNS} FROM {BENCH_TABLE} {where_sql} "
+                       f"ORDER BY {PRODUCT_SORTS['price-low']} LIMIT 12")
+                median_ms = time_query(cursor, sql, params, args.runs)
+                access_type, est_rows = explain(cursor, sql, params)
+                print(f"{label:<15} median {median_ms:8.2f} ms  type={access_type}  rows={est_rows}")
+        finally:
+            if not args.keep:
+                cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            cursor.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+Benchmark the encryption module.
+
+Times each part of backend/utils/encryption.py against what it replaced or
+is an alternative to:
+
+- keys: deriving the master key with PBKDF2 vs a DatabaseEncryption built
+  from the derived key cache
+- hashing: hash_sensitive_data/verify_hashed_data at the legacy 100,000
+  rounds and at --iterations rounds
+- fields: encrypt/decrypt of one field with a new Fernet per call vs the
+  shared DatabaseEncryption.cipher_suite
+- index: blind_index vs hash_sensitive_data for an equality lookup key
+- rows: encrypt_rows/decrypt_rows in one process
+
+Usage:
+    python -m backend.tools.benchmark_encryption [--only keys,hashing,fields,index,rows]
+                                                 [--hashes 50] [--values 20000] [--iterations 20000]
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import sys
+import time
+
+from cryptography.fernet import Fernet
+
+from backend.utils.encryption import (
+    DatabaseEncryption, db_encryption, hash_sensitive_data, verify_hashed_data,
+    blind_index, LEGACY_HASH_ITERATIONS
+)
+
+SECTIONS = ['keys', 'hashing', 'fields', 'index', 'rows']
+PII_FIELDS = ['first_name', 'last_name', 'phone']
+
+
+def timed(func, count):
+    """Run func() count times; returns seconds per call."""
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return (time.perf_counter() - start) / count
+
+
+def report(label, seconds, base=None):
+    speedup = f"  {base / seconds:9.1f}x" if base else ''
+    print(f"  {label:<40} {seconds * 1e6:12.1f} us{speedup}")
+
+
+def bench_keys(args):
+    print("Master key derivation")
+    master_key = base64.b64encode(os.urandom(32))
+    salt = b'giggatek_salt_should_be_changed_in_production'
+    base = timed(lambda: hashlib.pbkdf2_hmac('sha256', master_key, salt, 100000), 3)
+    report('PBKDF2, 100,000 rounds', base)
+    DatabaseEncryption(master_key)
+    report('DatabaseEncryption, cached key', timed(lambda: DatabaseEncryption(master_key), 100), base)
+
+
+def bench_hashing(args):
+    print(f"Sensitive data hashes ({args.hashes} values)")
+    values = [f"{i:03d}-45-{i % 10000:04d}" for i in range(args.hashes)]
+    ssn = iter(values * 3)
+    base = timed(lambda: hash_sensitive_data(next(ssn), iterations=LEGACY_HASH_ITERATIONS), args.hashes)
+    report(f"hash_sensitive_data, {LEGACY_HASH_ITERATIONS:,} rounds", base)
+    report(f"hash_sensitive_data, {args.iterations:,} rounds",
+           timed(lambda: hash_sensitive_data(next(ssn), iterations=args.iterations), args.hashes), base)
+
+    hashes = [(value, hash_sensitive_data(value, iterations=LEGACY_HASH_ITERATIONS)) for value in values]
+    upgraded = [(value, hash_sensitive_data(value, iterations=args.iterations)) for value in values]
+    stored = iter(hashes + upgraded)
+
+    def verify():
+        value, stored_hash = next(stored)
+        if not verify_hashed_data(value, stored_hash['hash'], stored_hash['salt'], stored_hash['iterations']):
+            raise AssertionError(f"Hash of {value} did not verify")
+
+    base = timed(verify, args.hashes)
+    report(f"verify_hashed_data, {LEGACY_HASH_ITERATIONS:,} rounds", base)
+    report(f"verify_hashed_data, {args.iterations:,} rounds", timed(verify, args.hashes), base)
+
+
+def bench_fields(args):
+    print(f"Field encryption ({args.values:,} values)")
+    values = [f"First{i}".encode('utf-8') for i in range(args.values)]
+    key = db_encryption.encryption_key
+    fernet = db_encryption.cipher_suite
+
+    encrypted = iter(values)
+    base = timed(lambda: Fernet(key).encrypt(next(encrypted)), args.values)
+    report('Fernet per call, encrypt', base)
+    encrypted = iter(values)
+    report('cipher_suite.encrypt', timed(lambda: fernet.encrypt(next(encrypted)), args.values), base)
+
+    stored = [fernet.encrypt(value) for value in values]
+    decrypted = iter(stored)
+    base = timed(lambda: Fernet(key).decrypt(next(decrypted)), args.values)
+    report('Fernet per call, decrypt', base)
+    decrypted = iter(stored)
+    report('cipher_suite.decrypt', timed(lambda: fernet.decrypt(next(decrypted)), args.values), base)
+
+
+def bench_index(args):
+    count = max(1, args.hashes)
+    print(f"Equality lookup key ({count} values)")
+    phones = iter([f"555-{i:04d}" for i in range(count)] * 2)
+    base = timed(lambda: hash_sensitive_data(next(phones), salt=b'fixed', iterations=LEGACY_HASH_ITERATIONS),
+                 count)
+    report('hash_sensitive_data, fixed salt', base)
+    report('blind_index', timed(lambda: blind_index(next(phones), 'phone'), count), base)
+
+
+def bench_rows(args):
+    print(f"Rows ({args.values:,} rows, fields {', '.join(PII_FIELDS)})")
+    rows = [{
+        'id': i,
+        'first_name': f"First{i}",
+        'last_name': f"Last{i}",
+        'phone': f"555-{i % 10000:04d}"
+    } for i in range(args.values)]
+    start = time.perf_counter()
+    encrypted = db_encryption.encrypt_rows(rows, PII_FIELDS, workers=0)
+    report('encrypt_rows, per row', (time.perf_counter() - start) / args.values)
+    start = time.perf_counter()
+    decrypted = db_encryption.decrypt_rows(encrypted, PII_FIELDS, workers=0)
+    report('decrypt_rows, per row', (time.perf_counter() - start) / args.values)
+    if decrypted != rows:
+        raise AssertionError('Decrypted rows differ')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', default=','.join(SECTIONS), help='Comma-separated sections to run')
+    parser.add_argument('--hashes', type=int, default=50, help='Values hashed with PBKDF2')
+    parser.add_argument('--values', type=int, default=20000, help='Values encrypted per run')
+    parser.add_argument('--iterations', type=int, default=20000,
+                        help='PBKDF2 rounds compared with the legacy cost')
+    args = parser.parse_args()
+
+    sections = [section.strip() for section in args.only.split(',') if section.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"Unknown sections: {', '.join(sorted(unknown))}")
+
+    print(f"{os.cpu_count()} CPUs")
+    for section in sections:
+        try:
+            globals()[f"bench_{section}"](args)
+        except AssertionError as e:
+            print(e, file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Benchmark the in-process rate limit store under thread contention.
+
+Runs --threads threads that each count --ops requests against random client
+keys, simulating an IP-spray attack (--hot-ratio of the requests come from a
+small set of regular clients), first on a store guarded by one global lock
+with periodic full-scan cleanup (the previous MemoryStore) and then on the
+lock-striped MemoryStore. Reports throughput, per-operation latency, the
+number of keys held at the end and how long a full expiry pass holds the
+lock.
+
+Usage:
+    python -m backend.tools.benchmark_memory_store [--threads 32] [--ops 20000]
+                                                   [--max-entries 100000] [--stripes 64]
+"""
+
+import argparse
+import gc
+import random
+import sys
+import threading
+import time
+
+from backend.utils.security import MemoryStore
+
+
+class GlobalLockStore:
+    """The previous MemoryStore: one lock, unbounded dict, full-scan cleanup."""
+
+    def __init__(self, cleanup_interval=300):
+        self.storage = {}
+        self.lock = threading.Lock()
+        self.cleanup_interval = cleanup_interval
+        self.last_cleanup = time.time()
+
+    def increment(self, key, expiry):
+        with self.lock:
+            self._cleanup_if_needed()
+            entry = self.storage.get(key)
+            if entry is None or entry[1] < time.time():
+                self.storage[key] = (1, time.time() + expiry)
+                return 1
+            new_value = entry[0] + 1
+            self.storage[key] = (new_value, time.time() + expiry)
+            return new_value
+
+    def _cleanup_if_needed(self):
+        now = time.time()
+        if now - self.last_cleanup > self.cleanup_interval:
+            self._cleanup()
+            self.last_cleanup = now
+
+    def _cleanup(self):
+        now = time.time()
+        for key in [key for key, entry in self.storage.items() if entry[1] < now]:
+            del self.storage[key]
+
+    def __len__(self):
+        return len(self.storage)
+
+
+def run(store, threads, ops, hot_ratio, expiry):
+    """Run the workload; returns (elapsed seconds, sorted per-op latencies)."""
+    gc.collect()
+    latencies = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        rng = random.Random(index)
+        hot_keys = [f"hot:{i}" for i in range(64)]
+        samples = latencies[index]
+        barrier.wait()
+        for _ in range(ops):
+            if rng.random() < hot_ratio:
+                key = rng.choice(hot_keys)
+            else:
+                key = f"spray:{rng.getrandbits(32)}"
+            start = time.perf_counter()
+            store.increment(key, expiry)
+            samples.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, sorted(sample for samples in latencies for sample in samples)
+
+
+def report(label, keys, elapsed, samples, cleanup):
+    count = len(samples)
+    print(label)
+    print(f"  {'throughput':<24} {count / elapsed:12,.0f} ops/s")
+    print(f"  {'p50 latency':<24} {samples[count // 2] * 1e6:12.1f} us")
+    print(f"  {'p99 latency':<24} {samples[int(count * 0.99)] * 1e6:12.1f} us")
+    print(f"  {'max latency':<24} {samples[-1] * 1e3:12.2f} ms")
+    print(f"  {'keys held':<24} {keys:12,d}")
+    print(f"  {'expiry pass (lock held)':<24} {cleanup * 1e3:12.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32, help='Concurrent threads')
+    parser.add_argument('--ops', type=int, default=20000, help='Operations per thread')
+    parser.add_argument('--hot-ratio', type=float, default=0.1, help='Share of requests from regular clients')
+    parser.add_argument('--expiry', type=float, default=60, help='Key expiry in seconds')
+    parser.add_argument('--max-entries', type=int, default=100000, help='MemoryStore entry cap')
+    parser.add_argument('--stripes', type=int, default=64, help='MemoryStore lock stripes')
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads x {args.ops} increments, {1 - args.hot_ratio:.0%} new keys")
+
+    baseline = GlobalLockStore()
+    elapsed, samples = run(baseline, args.threads, args.ops, args.hot_ratio, args.expiry)
+    baseline_keys = len(baseline)
+    # Make every key expired and time the full scan the old store ran every 5 minutes
+    baseline.storage = {key: (value, 0) for key, (value, _) in baseline.storage.items()}
+    gc.collect()
+    start = time.perf_counter()
+    with baseline.lock:
+        baseline._cleanup()
+    report('Global lock, full-scan cleanup', baseline_keys, elapsed, samples, time.perf_counter() - start)
+
+    store = MemoryStore(stripes=args.stripes, max_entries=args.max_entries)
+    elapsed, samples = run(store, args.threads, args.ops, args.hot_ratio, args.expiry)
+    keys = len(store)
+    # Incremental expiry only visits what has expired; time the worst stripe
+    now = time.monotonic() + args.expiry + 1
+    slowest = 0.0
+    gc.collect()
+    for shard in store.shards:
+        start = time.perf_counter()
+        with shard.lock:
+            shard.expire(now)
+        slowest = max(slowest, time.perf_counter() - start)
+    report(f"Striped ({args.stripes} stripes, cap {args.max_entries:,})", keys, elapsed, samples, slowest)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
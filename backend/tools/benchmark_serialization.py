@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Microbenchmark JSON serialization of product and rental payloads.
+
+Compares Flask's default JSON provider and stdlib json cache encoding with
+backend.utils.serialization (the active backend, orjson when installed) on
+list-endpoint shaped payloads: Decimal prices and datetime columns as MySQL
+returns them. With --from-db the payloads are the first rows of the real
+products and rentals tables instead of synthetic ones.
+
+Usage:
+    python -m backend.tools.benchmark_serialization [--rows 24] [--number 2000] [--from-db]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from backend.utils import serialization
+from backend.utils.serialization import FastJSONProvider, dump_cache_value, load_cache_value
+
+
+def synthetic_payloads(rows):
+    """Payloads shaped like /api/products and /api/rentals/ responses."""
+    now = datetime(2024, 5, 1, 12, 0, 0)
+    products = [{
+        'product_id': i,
+        'name': f"Refurbished GPU Model {i}",
+        'category': 'graphics-cards',
+        'purchase_price': Decimal('499.99') + i,
+        'rental_price_12m': Decimal('45.50'),
+        'condition': 'Excellent',
+        'image_urls': '["/img/products/gpu-%d.jpg", "/img/products/gpu-%d-2.jpg"]' % (i, i),
+        'primary_image': f"/img/products/gpu-{i}.jpg"
+    } for i in range(rows)]
+
+    rentals = [{
+        'id': i,
+        'user_id': 42,
+        'product_id': i,
+        'start_date': (now - timedelta(days=30 * i)).date(),
+        'end_date': (now + timedelta(days=365)).date(),
+        'monthly_rate': Decimal('45.50'),
+        'total_months': 12,
+        'total_amount': Decimal('546.00'),
+        'status': 'active',
+        'payments_made': 3,
+        'remaining_payments': 9,
+        'next_payment_date': (now + timedelta(days=10)).date(),
+        'created_at': now,
+        'updated_at': now,
+        'product_name': f"Refurbished GPU Model {i}",
+        'payment_progress': 25.0,
+        'payments': [{
+            'id': i * 10 + j,
+            'rental_id': i,
+            'amount': Decimal('45.50'),
+            'payment_date': now - timedelta(days=30 * j),
+            'payment_method': 'card',
+            'transaction_id': f"txn_{i}_{j}",
+            'status': 'completed',
+            'created_at': now
+        } for j in range(3)]
+    } for i in range(rows)]
+
+    return {
+        'products': {'products': products, 'total': 1000, 'page': 1, 'limit': rows, 'pages': 42},
+        'rentals': {'rentals': rentals, 'pagination': {'total': rows, 'page': 1, 'per_page': rows}}
+    }
+
+
+def db_payloads(rows):
+    """Payloads built from the first rows of the products and rentals tables."""
+    from backend.utils.db import db_cursor
+    from backend.utils.catalog import PRODUCT_LIST_COLUMNS
+
+    with db_cursor() as cursor:
+        cursor.execute(f"SELECT {PRODUCT_LIST_COLUMNS} FROM products LIMIT %s", (rows,))
+        products = cursor.fetchall()
+        cursor.execute("SELECT * FROM rentals LIMIT %s", (rows,))
+        rentals = cursor.fetchall()
+
+    return {
+        'products': {'products': products, 'total': len(products), 'page': 1, 'limit': rows},
+        'rentals': {'rentals': rentals, 'pagination': {'total': len(rentals), 'page': 1, 'per_page': rows}}
+    }
+
+
+def bench(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"  {label:<32} {seconds / number * 1e6:9.1f} us/op")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=24, help='Rows per payload')
+    parser.add_argument('--number', type=int, default=2000, help='Iterations per measurement')
+    parser.add_argument('--from-db', action='store_true', help='Use rows from the database')
+    args = parser.parse_args()
+
+    payloads = db_payloads(args.rows) if args.from_db else synthetic_payloads(args.rows)
+
+    default_app = Flask('default')
+    default_app.json = DefaultJSONProvider(default_app)
+    fast_app = Flask('fast')
+    fast_app.json = FastJSONProvider(fast_app)
+
+    print(f"Serializer backend: {serialization.backend.name}")
+    for name, payload in payloads.items():
+        legacy_cached = json.dumps(payload, default=str).encode('utf-8')
+        cached = dump_cache_value(payload)
+        print(f"{name} ({args.rows} rows, {len(cached)} bytes cached)")
+
+        with default_app.app_context():
+            base = bench('response: Flask default', lambda: default_app.json.response(payload), args.number)
+        with fast_app.app_context():
+            fast = bench('response: FastJSONProvider', lambda: fast_app.json.response(payload), args.number)
+        print(f"  {'speedup':<32} {base / fast:9.1f}x")
+
+        base = bench('cache write: json.dumps', lambda: json.dumps(payload, default=str).encode('utf-8'), args.number)
+        fast = bench('cache write: dump_cache_value', lambda: dump_cache_value(payload), args.number)
+        print(f"  {'speedup':<32} {base / fast:9.1f}x")
+
+        base = bench('cache read: json.loads', lambda: json.loads(legacy_cached), args.number)
+        fast = bench('cache read: load_cache_value', lambda: load_cache_value(cached), args.number)
+        print(f"  {'speedup':<32} {base / fast:9.1f}x")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+"""
+Index legacy rental cache keys into tag sets.
+
+Rental cache entries written before tag-based invalidation was introduced
+(`rental:user:{user_id}:...`) are not referenced by any tag set, so tag
+invalidation would miss them until they expire. This script walks the
+keyspace once with SCAN and registers those keys under their user and
+rental tags.
+
+Usage:
+    python -m backend.tools.migrate_cache_tags
+"""
+
+import sys
+
+from backend.utils.cache import migrate_legacy_rental_keys
+
+
+def main():
+    """Run the migration and report the number of indexed keys."""
+    indexed = migrate_legacy_rental_keys()
+    if indexed is False:
+        print("Cache migration skipped: Redis is disabled or unavailable.")
+        return 1
+    print(f"Indexed {indexed} legacy rental cache keys.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
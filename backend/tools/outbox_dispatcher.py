@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Deliver queued emails and push notifications from the notification outbox.
+
+Runs until interrupted (SIGINT / SIGTERM finish the current batch first).
+Several dispatchers can run at once; each claims its own rows.
+
+Usage:
+    python -m backend.tools.outbox_dispatcher [--channel email] [--channel push]
+                                              [--batch-size 100] [--once]
+"""
+
+import argparse
+import logging
+import signal
+import sys
+
+from backend.utils.outbox import OutboxDispatcher, OUTBOX_BATCH_SIZE, OUTBOX_CONCURRENCY
+
+# Importing the senders registers their outbox handlers
+import backend.utils.email  # noqa: F401
+import backend.push.sender  # noqa: F401
+import backend.push.broadcast  # noqa: F401
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--channel', action='append', choices=sorted(OUTBOX_CONCURRENCY),
+                        help='Channel to deliver (repeatable, default: all)')
+    parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE,
+                        help='Rows claimed per batch')
+    parser.add_argument('--once', action='store_true',
+                        help='Process one batch per channel and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    dispatcher = OutboxDispatcher(channels=args.channel, batch_size=args.batch_size)
+
+    if args.once:
+        for channel in dispatcher.channels:
+            processed = dispatcher.run_once(channel)
+            print(f"{channel}: processed {processed} entries")
+        dispatcher.close()
+        return 0
+
+    def handle_signal(signum, frame):
+        logging.info("Stopping outbox dispatcher after the current batch")
+        dispatcher.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    dispatcher.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
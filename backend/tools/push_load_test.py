@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Load-test push notification fan-out against a local fake push service.
+
+Starts an HTTP server on localhost that behaves like a web push service:
+it accepts encrypted push messages with 201, answers 410 Gone for a share of
+the endpoints (--gone-ratio) and can add latency per request (--latency-ms).
+It then sends one notification to --count subscriptions pointing at it,
+serially with a new connection and VAPID signature per message as before
+(--compare) and through PushFanout. Reports throughput, TCP connections
+opened, VAPID signatures made and the gone endpoints that would be deleted.
+
+Usage:
+    python -m backend.tools.push_load_test [--count 200] [--workers 16]
+                                           [--latency-ms 50] [--gone-ratio 0.1] [--compare]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from py_vapid import Vapid01
+from pywebpush import webpush
+
+from backend.push import sender
+
+
+class FakePushService(ThreadingHTTPServer):
+    """Threaded HTTP server counting connections and push messages."""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, gone=()):
+        super().__init__(('127.0.0.1', 0), FakePushHandler)
+        self.latency = latency
+        self.gone = set(gone)
+        self.connections = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def endpoint(self, subscription_id):
+        return f"http://127.0.0.1:{self.server_address[1]}/push/{subscription_id}"
+
+    def count(self, attribute):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+
+class FakePushHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like real push services
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        subscription_id = self.path.rsplit('/', 1)[-1]
+        status = 410 if subscription_id in self.server.gone else 201
+        if status == 201:
+            self.server.count('messages')
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fake_subscriptions(service, count):
+    """Subscriptions with valid encryption keys, all pointing at the fake service."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    p256dh = key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    keys = {
+        'p256dh': base64.urlsafe_b64encode(p256dh).decode('ascii').rstrip('='),
+        'auth': base64.urlsafe_b64encode(os.urandom(16)).decode('ascii').rstrip('=')
+    }
+    return [{'endpoint': service.endpoint(i), 'keys': keys} for i in range(count)]
+
+
+def report(label, service, elapsed, count, signatures, gone=None):
+    print(f"{label}")
+    print(f"  {'time':<24} {elapsed:8.2f} s ({count / elapsed:,.0f} notifications/s)")
+    print(f"  {'delivered':<24} {service.messages:8d}")
+    print(f"  {'TCP connections':<24} {service.connections:8d}")
+    print(f"  {'VAPID signatures':<24} {signatures:8d}")
+    if gone is not None:
+        print(f"  {'gone (batched delete)':<24} {len(gone):8d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=200, help='Subscriptions to notify')
+    parser.add_argument('--workers', type=int, default=sender.PUSH_FANOUT_WORKERS,
+                        help='Concurrent push requests')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Fake push service latency')
+    parser.add_argument('--gone-ratio', type=float, default=0.1,
+                        help='Share of endpoints answering 410 Gone')
+    parser.add_argument('--compare', action='store_true',
+                        help='Also send serially with a connection and signature per message')
+    args = parser.parse_args()
+
+    # Sign with a throwaway VAPID key instead of the configured one
+    vapid = Vapid01()
+    vapid.generate_keys()
+    sender.VAPID_PRIVATE_KEY = vapid
+
+    gone_ids = {str(i) for i in range(args.count) if i % round(1 / args.gone_ratio) == 0} \
+        if args.gone_ratio > 0 else set()
+    notification = {'title': 'Load test', 'body': 'Fan-out benchmark'}
+
+    if args.compare:
+        service = FakePushService(args.latency_ms / 1000, gone_ids)
+        threading.Thread(target=service.serve_forever, daemon=True).start()
+        subscriptions = fake_subscriptions(service, args.count)
+        start = time.perf_counter()
+        for subscription_data in subscriptions:
+            try:
+                webpush(subscription_data, json.dumps(notification), vapid_private_key=vapid,
+                        vapid_claims=dict(sender.VAPID_CLAIMS))
+            except Exception:
+                pass
+        report('Serial, connection and signature per message', service,
+               time.perf_counter() - start, args.count, args.count)
+        service.shutdown()
+        service.server_close()
+
+    service = FakePushService(args.latency_ms / 1000, gone_ids)
+    threading.Thread(target=service.serve_forever, daemon=True).start()
+    subscriptions = fake_subscriptions(service, args.count)
+    fanout = sender.PushFanout(workers=args.workers)
+    start = time.perf_counter()
+    result = fanout.send(subscriptions, notification)
+    report(f"PushFanout ({args.workers} workers)", service, time.perf_counter() - start,
+           args.count, sender.get_vapid_signer().signatures, result.gone)
+    fanout.close()
+    service.shutdown()
+    service.server_close()
+
+    if result.failed:
+        print(f"{len(result.failed)} failed, first error: {result.failed[0][1]}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Queue payment reminders for rentals due in the next 7 days.
+
+Meant to run daily from cron. Safe to re-run: rentals already reminded for
+their current due date are skipped, and a run that was interrupted resumes
+after the last committed chunk. Prints the throughput at the end.
+
+Usage:
+    python -m backend.tools.send_payment_reminders [--batch-size 500]
+                                                   [--render-workers 0] [--no-resume]
+"""
+
+import argparse
+import logging
+import sys
+
+from backend.utils.db import get_db_connection
+from backend.utils.email import (
+    send_upcoming_payment_reminders, REMINDER_BATCH_SIZE, REMINDER_RENDER_WORKERS
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE,
+                        help='Rentals per chunk (one commit per chunk)')
+    parser.add_argument('--render-workers', type=int, default=REMINDER_RENDER_WORKERS,
+                        help='Processes rendering templates (0 renders inline)')
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Ignore today's checkpoint and scan from the beginning")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    conn = get_db_connection()
+    try:
+        stats = send_upcoming_payment_reminders(
+            conn,
+            batch_size=args.batch_size,
+            render_workers=args.render_workers,
+            resume=not args.no_resume
+        )
+    finally:
+        conn.close()
+
+    print(f"Rentals processed: {stats['rentals']} in {stats['chunks']} chunks")
+    print(f"Reminders queued:  {stats['queued']}")
+    print(f"Elapsed:           {stats['elapsed']:.2f}s ({stats['emails_per_second']:.1f} emails/s)")
+    if 'error' in stats:
+        print(f"Stopped early: {stats['error']} (re-run to resume)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
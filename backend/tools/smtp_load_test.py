@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Load-test email delivery against a local SMTP stand-in.
+
+Starts an aiosmtpd server on localhost that accepts and counts messages,
+points the email settings at it, and sends --count emails through
+send_email_async (the pooled workers) and, with --compare, through one
+SMTP session per email as before. Reports throughput and the number of
+SMTP sessions each approach opened.
+
+Requires aiosmtpd (pip install aiosmtpd); it is only needed for this tool.
+
+Usage:
+    python -m backend.tools.smtp_load_test [--count 500] [--workers 4] [--compare]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+
+class CountingHandler:
+    """aiosmtpd handler that counts sessions and delivered messages."""
+
+    def __init__(self):
+        self.sessions = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self._lock:
+            self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.messages += 1
+        return '250 Message accepted for delivery'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=500, help='Emails to send')
+    parser.add_argument('--workers', type=int, default=4, help='Delivery workers')
+    parser.add_argument('--port', type=int, default=8025, help='Port for the SMTP stand-in')
+    parser.add_argument('--compare', action='store_true', help='Also send with one session per email')
+    args = parser.parse_args()
+
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("aiosmtpd is required: pip install aiosmtpd")
+        return 1
+
+    # Point the email module at the stand-in before it reads its settings
+    os.environ.update({
+        'EMAIL_HOST': '127.0.0.1',
+        'EMAIL_PORT': str(args.port),
+        'EMAIL_HOST_USER': '',
+        'EMAIL_USE_TLS': 'false',
+        'EMAIL_WORKERS': str(args.workers)
+    })
+    from backend.utils import email as email_utils
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+    try:
+        html = "<html><body><p>Your payment of $45.50 is due in 3 days.</p></body></html>"
+
+        start = time.perf_counter()
+        futures = [
+            email_utils.send_email_async(f"user{i}@example.com", f"Load test #{i}", html)
+            for i in range(args.count)
+        ]
+        sent = sum(1 for future in futures if future.result())
+        elapsed = time.perf_counter() - start
+        pooled_sessions = handler.sessions
+        print(f"pooled:      {sent}/{args.count} sent in {elapsed:6.2f}s "
+              f"({sent / elapsed:7.1f} emails/s), {pooled_sessions} SMTP sessions")
+        print(f"             pool stats: {email_utils.get_email_delivery_stats()}")
+
+        if args.compare:
+            handler.sessions = 0
+            start = time.perf_counter()
+            sent = sum(
+                1 for i in range(args.count)
+                if email_utils._send_email(f"user{i}@example.com", f"Load test #{i}", html)
+            )
+            elapsed = time.perf_counter() - start
+            print(f"per-email:   {sent}/{args.count} sent in {elapsed:6.2f}s "
+                  f"({sent / elapsed:7.1f} emails/s), {handler.sessions} SMTP sessions")
+    finally:
+        email_utils.get_delivery_pool().shutdown(wait=True)
+        controller.stop()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,88 +1,401 @@
 """
 Authentication utility functions and middleware for GigGatek backend.
-Includes role-based access control and route protection functions.
+Includes token issuing, route protection and role-based access control.
+
+All protected routes authenticate through TokenAuthenticator. Verifying a
+token (HMAC check, base64 and JSON decoding) is done once per token: the
+claims are kept in a bounded in-process cache keyed by the token's hash until
+the token expires, so clients polling rentals and orders are not re-verified
+on every request. Revoked tokens (logout) are recorded in a Redis sorted set
+shared by all workers and checked on every request, cached or not.
 """
 
+import os
+import time
+import uuid
+import hashlib
+import logging
+import datetime
+import threading
+from collections import OrderedDict
 from functools import wraps
+
+import jwt
 from flask import jsonify, request
-from flask_jwt_extended import get_jwt, verify_jwt_in_request
 
-def role_required(role_list):
+from .cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Secret key for JWT token generation and verification
+JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'giggatek_secure_jwt_key_change_in_production')
+JWT_ALGORITHM = 'HS256'
+
+# Token expiration time (in minutes)
+TOKEN_EXPIRATION = int(os.environ.get('JWT_TOKEN_EXPIRATION', 60))
+
+# Verified tokens kept per process
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+# Seconds between reloads of the shared revocation set; bounds how long a
+# token revoked by another worker is still accepted here
+AUTH_REVOCATION_REFRESH = float(os.environ.get('AUTH_REVOCATION_REFRESH', 5))
+AUTH_REVOKED_KEY = "auth:revoked"
+
+ROLE_ADMIN = 'admin'
+ROLE_MANAGER = 'manager'
+ROLE_CUSTOMER = 'customer'
+
+
+class TokenRevokedError(jwt.InvalidTokenError):
+    """Raised for a token that was revoked before it expired."""
+
+
+def hash_token(token):
+    """Cache and revocation key of a token; the token itself is never stored."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def generate_token(user_id, is_admin=False, role=None):
+    """
+    Issue an access token.
+
+    Args:
+        user_id (int): User ID
+        is_admin (bool): Whether the user is an administrator
+        role (str): Role claim; derived from is_admin if not given
+
+    Returns:
+        str: Signed JWT
+    """
+    now = datetime.datetime.utcnow()
+    payload = {
+        'user_id': user_id,
+        'is_admin': is_admin,
+        'role': role or (ROLE_ADMIN if is_admin else ROLE_CUSTOMER),
+        'jti': uuid.uuid4().hex,  # Tokens issued in the same second differ, so revoking one spares the others
+        'iat': now,
+        'exp': now + datetime.timedelta(minutes=TOKEN_EXPIRATION)
+    }
+    return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+def token_role(claims):
+    """Role of a verified token; tokens issued before the role claim fall back to is_admin."""
+    return claims.get('role') or (ROLE_ADMIN if claims.get('is_admin') else ROLE_CUSTOMER)
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified token claims, each entry expiring with its token.
+
+    Cached claims are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=AUTH_TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # token hash -> (claims, expires_at)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, claims, expires_at):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (claims, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class RevocationList:
+    """
+    Hashes of revoked tokens that have not expired yet.
+
+    Revocations are written to the AUTH_REVOKED_KEY sorted set (scored by
+    the token's expiry) and every worker reloads it at most every
+    refresh_interval seconds, so a lookup never waits on Redis. Without
+    Redis, revocations only apply to the process that made them. If a reload
+    fails, the last loaded set stays in use.
+    """
+
+    def __init__(self, client=None, refresh_interval=AUTH_REVOCATION_REFRESH):
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self._revoked = {}  # token hash -> expires_at
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def revoke(self, token_hash, expires_at):
+        now = time.time()
+        with self._lock:
+            self._revoked[token_hash] = expires_at
+            self._revoked = {h: exp for h, exp in self._revoked.items() if exp > now}
+        if self.client is None:
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.zadd(AUTH_REVOKED_KEY, {token_hash: expires_at})
+            pipe.zremrangebyscore(AUTH_REVOKED_KEY, '-inf', now)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Error recording token revocation: {e}")
+
+    def is_revoked(self, token_hash):
+        self._refresh()
+        return token_hash in self._revoked
+
+    def _refresh(self):
+        if self.client is None:
+            return
+        refreshed_at = self._refreshed_at
+        if refreshed_at is not None and time.monotonic() - refreshed_at < self.refresh_interval:
+            return
+        # One thread reloads; the others keep using the current set
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._refreshed_at = time.monotonic()
+            now = time.time()
+            members = self.client.zrangebyscore(AUTH_REVOKED_KEY, now, '+inf', withscores=True)
+            revoked = {
+                (member.decode('utf-8') if isinstance(member, bytes) else member): score
+                for member, score in members
+            }
+            # Keep local revocations whose write to Redis failed
+            for token_hash, expires_at in self._revoked.items():
+                if expires_at > now:
+                    revoked.setdefault(token_hash, expires_at)
+            self._revoked = revoked
+        except Exception as e:
+            logger.warning(f"Error loading revoked tokens: {e}")
+        finally:
+            self._lock.release()
+
+
+class TokenAuthenticator:
+    """
+    Verifies access tokens, caching the claims of valid ones.
+    """
+
+    def __init__(self, secret=JWT_SECRET_KEY, cache_size=AUTH_TOKEN_CACHE_SIZE, revocations=None):
+        """
+        Args:
+            secret (str): HMAC key the tokens are signed with
+            cache_size (int): Verified tokens to keep; 0 verifies every call
+            revocations (RevocationList): Revoked tokens; local only if not given
+        """
+        self.secret = secret
+        self.cache = VerifiedTokenCache(cache_size)
+        self.revocations = revocations or RevocationList()
+
+    def authenticate(self, token):
+        """
+        Verify a token.
+
+        Args:
+            token (str): Encoded JWT
+
+        Returns:
+            dict: Token claims; do not modify
+
+        Raises:
+            jwt.ExpiredSignatureError: If the token has expired
+            TokenRevokedError: If the token was revoked
+            jwt.InvalidTokenError: If the token is otherwise invalid
+        """
+        token_hash = hash_token(token)
+        if self.revocations.is_revoked(token_hash):
+            raise TokenRevokedError('Token has been revoked')
+
+        claims = self.cache.get(token_hash)
+        if claims is not None:
+            return claims
+
+        claims = jwt.decode(token, self.secret, algorithms=[JWT_ALGORITHM])
+        if 'user_id' not in claims:
+            raise jwt.InvalidTokenError('Token has no user_id')
+        if 'exp' in claims:
+            self.cache.set(token_hash, claims, claims['exp'])
+        return claims
+
+    def revoke(self, token):
+        """
+        Revoke a token until it expires.
+
+        Args:
+            token (str): Encoded JWT
+
+        Returns:
+            bool: True if the token was valid and is now revoked
+        """
+        try:
+            claims = self.authenticate(token)
+        except jwt.InvalidTokenError:
+            return False
+        token_hash = hash_token(token)
+        self.revocations.revoke(token_hash, claims.get('exp', time.time() + TOKEN_EXPIRATION * 60))
+        self.cache.delete(token_hash)
+        return True
+
+
+authenticator = TokenAuthenticator(revocations=RevocationList(redis_client))
+
+
+def bearer_token():
+    """Token from the request's Authorization header, or None."""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
+
+def authenticate_request():
+    """
+    Authenticate the current request and set request.user_id,
+    request.is_admin and request.user_role.
+
+    Returns:
+        tuple: Error response (JSON, 401) if not authenticated, otherwise None
+    """
+    if getattr(request, 'user_id', None) is not None:
+        return None
+
+    token = bearer_token()
+    if not token:
+        return jsonify({'error': 'Token is missing'}), 401
+
+    try:
+        claims = authenticator.authenticate(token)
+    except jwt.ExpiredSignatureError:
+        return jsonify({'error': 'Token has expired'}), 401
+    except TokenRevokedError:
+        return jsonify({'error': 'Token has been revoked'}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({'error': 'Invalid token'}), 401
+
+    request.user_id = claims['user_id']
+    request.is_admin = claims.get('is_admin', False)
+    request.user_role = token_role(claims)
+    return None
+
+
+def revoke_token(token):
+    """
+    Revoke an access token, e.g. on logout.
+
+    Args:
+        token (str): Encoded JWT
+
+    Returns:
+        bool: True if the token was valid and is now revoked
+    """
+    return authenticator.revoke(token)
+
+
+def token_required(f):
+    """
+    Decorator for routes that require a valid access token.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        error = authenticate_request()
+        if error:
+            return error
+        return f(*args, **kwargs)
+
+    return decorated
+
+
+def role_required(role_list, message='Insufficient permissions'):
     """
     Decorator for API routes that checks if the current user has the required roles.
-    
+
+    Authenticates the request first, so it can be used with or without token_required.
+
     Args:
         role_list (list or str): A list of roles or a single role required to access the route.
-        
+        message (str): Error message when the role does not match.
+
     Returns:
         Function: Decorated route function.
     """
+    roles = role_list if isinstance(role_list, list) else [role_list]
+
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            # First verify JWT is valid
-            verify_jwt_in_request()
-            
-            # Convert single role to list
-            roles = role_list if isinstance(role_list, list) else [role_list]
-            
-            # Get claims from JWT
-            claims = get_jwt()
-            
-            # Check if user role is in the required roles list
-            if 'role' not in claims or claims['role'] not in roles:
-                return jsonify({"status": "error", "message": "Insufficient permissions"}), 403
-            
+            error = authenticate_request()
+            if error:
+                return error
+            if request.user_role not in roles:
+                return jsonify({'error': message}), 403
             return fn(*args, **kwargs)
         return wrapper
     return decorator
 
+
 # Predefined role decorators for common use cases
 def admin_required(fn):
     """
     Decorator for routes that require admin privileges.
     """
-    return role_required('admin')(fn)
+    return role_required(ROLE_ADMIN, message='Admin privileges required')(fn)
+
 
 def manager_required(fn):
     """
     Decorator for routes that require manager privileges.
     Manager or admin roles are allowed.
     """
-    return role_required(['manager', 'admin'])(fn)
+    return role_required([ROLE_MANAGER, ROLE_ADMIN])(fn)
+
 
 def customer_or_higher_required(fn):
     """
     Decorator for routes that require customer or higher privileges.
     Customer, manager, or admin roles are allowed.
     """
-    return role_required(['customer', 'manager', 'admin'])(fn)
+    return role_required([ROLE_CUSTOMER, ROLE_MANAGER, ROLE_ADMIN])(fn)
+
 
 # Helper functions for authentication
 def get_user_id_from_token():
     """
     Extract user_id from JWT token.
-    
+
     Returns:
         int: The user_id from the token or None if no token or invalid token.
     """
-    try:
-        verify_jwt_in_request()
-        claims = get_jwt()
-        return claims.get('sub')  # 'sub' is the JWT subject, which contains the user_id
-    except:
+    if authenticate_request():
         return None
+    return request.user_id
+
 
 def get_user_role_from_token():
     """
     Extract user role from JWT token.
-    
+
     Returns:
         str: The user role from the token or None if no token or invalid token.
     """
-    try:
-        verify_jwt_in_request()
-        claims = get_jwt()
-        return claims.get('role')
-    except:
+    if authenticate_request():
         return None
+    return request.user_role
@@ -1,6 +1,9 @@
 """
 Redis-based caching utility for the GigGatek application.
 Provides functions for storing and retrieving cached data.
+
+Reads go through a small in-process LRU (L1) before Redis (L2). Workers keep
+their L1 coherent by broadcasting deleted keys over Redis pub/sub.
 """
 
 import json
@@ -9,8 +12,17 @@ import logging
 from datetime import timedelta
 import hashlib
 import os
+import time
+import math
+import random
+import uuid
+import fnmatch
+import threading
+from collections import OrderedDict
 from functools import wraps
 
+from .serialization import dump_cache_value, load_cache_value
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,6 +39,27 @@ DEFAULT_CACHE_TTL = 3600  # 1 hour
 RENTAL_DETAILS_TTL = 1800  # 30 minutes
 RENTAL_LIST_TTL = 300     # 5 minutes
 PRODUCT_DETAILS_TTL = 3600  # 1 hour
+CATALOG_FACETS_TTL = 300  # 5 minutes
+RENTAL_STALE_TTL = 120    # Serve expired rental entries for 2 minutes while one worker refreshes
+
+# Tag sets index the keys written under them so invalidation never scans the keyspace.
+# They outlive their members; deleting an already expired member is harmless.
+CACHE_TAG_PREFIX = "tag:"
+CACHE_TAG_TTL = 86400  # 24 hours
+
+# In-process L1 cache. Entries live at most CACHE_L1_TTL seconds, which also
+# bounds staleness if an invalidation message is missed.
+CACHE_L1_ENABLED = os.environ.get('CACHE_L1_ENABLED', 'true').lower() == 'true'
+CACHE_L1_MAX_ENTRIES = int(os.environ.get('CACHE_L1_MAX_ENTRIES', 2048))
+CACHE_L1_MAX_BYTES = int(os.environ.get('CACHE_L1_MAX_BYTES', 32 * 1024 * 1024))
+CACHE_L1_TTL = int(os.environ.get('CACHE_L1_TTL', 60))
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Stampede protection for cache_fetch: one worker recomputes an entry while the
+# others wait briefly (no value yet) or keep serving the current/stale value.
+CACHE_LOCK_TTL = int(os.environ.get('CACHE_LOCK_TTL', 10))
+CACHE_LOCK_WAIT = float(os.environ.get('CACHE_LOCK_WAIT', 2.0))
+CACHE_XFETCH_BETA = float(os.environ.get('CACHE_XFETCH_BETA', 1.0))
 
 # Initialize Redis client
 redis_client = None
@@ -52,6 +85,167 @@ else:
     logger.info("Redis caching disabled by configuration")
 
 
+class LocalCache:
+    """
+    Bounded in-process LRU cache with per-entry TTL and a byte-size cap.
+
+    Values are stored deserialized, so a hit costs neither a network round-trip
+    nor json.loads. Returned values are shared between callers and must be
+    treated as read-only.
+    """
+
+    def __init__(self, max_entries=CACHE_L1_MAX_ENTRIES, max_bytes=CACHE_L1_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, expires_at, size)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, time.monotonic() + ttl, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self._remove(key)
+
+    def delete_pattern(self, pattern):
+        with self.lock:
+            for key in [k for k in self.entries if fnmatch.fnmatchcase(k, pattern)]:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.total_bytes -= size
+
+
+local_cache = LocalCache()
+
+# Hit/miss counters per tier (per process)
+cache_stats = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0}
+_stats_lock = threading.Lock()
+
+# Pub/sub listener state, re-created after fork
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def _count(stat):
+    with _stats_lock:
+        cache_stats[stat] += 1
+
+
+def _l1_active():
+    """L1 is only safe with Redis available to broadcast invalidations."""
+    if not (CACHE_L1_ENABLED and REDIS_ENABLED and redis_client):
+        return False
+    if _listener_pid != os.getpid():
+        _start_invalidation_listener()
+    return True
+
+
+def _start_invalidation_listener():
+    global _listener_pid
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        # Entries inherited from a parent process were never subscribed
+        local_cache.clear()
+        thread = threading.Thread(target=_listen_for_invalidations, name='cache-invalidation', daemon=True)
+        thread.start()
+        _listener_pid = os.getpid()
+
+
+def _listen_for_invalidations():
+    """Evict L1 entries deleted by any worker; runs in a daemon thread."""
+    while True:
+        pubsub = None
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message and message['type'] == 'message':
+                    _apply_invalidation(json.loads(message['data']))
+        except Exception as e:
+            # Invalidations may have been missed while disconnected
+            logger.warning(f"Cache invalidation listener error, clearing L1: {e}")
+            local_cache.clear()
+            time.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def _apply_invalidation(payload):
+    if payload.get('clear'):
+        local_cache.clear()
+    if payload.get('keys'):
+        local_cache.delete(*payload['keys'])
+    if payload.get('pattern'):
+        local_cache.delete_pattern(payload['pattern'])
+
+
+def _broadcast_invalidation(**payload):
+    """Evict locally, then tell the other workers to do the same."""
+    _apply_invalidation(payload)
+    if not CACHE_L1_ENABLED:
+        return
+    try:
+        redis_client.publish(CACHE_INVALIDATION_CHANNEL, json.dumps(payload))
+    except Exception as e:
+        logger.error(f"Error publishing cache invalidation: {e}")
+
+
+def get_cache_stats():
+    """
+    Hit statistics for the L1 (in-process) and L2 (Redis) tiers of this process.
+
+    L2 is only consulted on an L1 miss, so the L2 ratio is relative to L1 misses.
+
+    Returns:
+        dict: Raw counters, per-tier hit ratios and current L1 size
+    """
+    with _stats_lock:
+        stats = dict(cache_stats)
+    l1_total = stats['l1_hits'] + stats['l1_misses']
+    l2_total = stats['l2_hits'] + stats['l2_misses']
+    stats['l1_hit_ratio'] = stats['l1_hits'] / l1_total if l1_total else 0.0
+    stats['l2_hit_ratio'] = stats['l2_hits'] / l2_total if l2_total else 0.0
+    stats['l1_entries'] = len(local_cache.entries)
+    stats['l1_bytes'] = local_cache.total_bytes
+    return stats
+
+
 def generate_cache_key(prefix, *args, **kwargs):
     """
     Generate a unique cache key based on function arguments.
@@ -99,24 +293,38 @@ def cache_get(key):
     if not REDIS_ENABLED or not redis_client:
         return None
     
+    use_l1 = _l1_active()
+    if use_l1:
+        value = local_cache.get(key)
+        if value is not None:
+            _count('l1_hits')
+            return value
+        _count('l1_misses')
+    
     try:
         cached_data = redis_client.get(key)
         if cached_data:
-            return json.loads(cached_data)
+            _count('l2_hits')
+            value = load_cache_value(cached_data)
+            if use_l1:
+                local_cache.set(key, value, CACHE_L1_TTL, len(cached_data))
+            return value
+        _count('l2_misses')
         return None
     except Exception as e:
         logger.error(f"Error retrieving from cache: {e}")
         return None
 
 
-def cache_set(key, value, ttl=DEFAULT_CACHE_TTL):
+def cache_set(key, value, ttl=DEFAULT_CACHE_TTL, tags=None):
     """
     Set a value in the cache.
     
     Args:
         key (str): Cache key
-        value: Value to cache (must be JSON serializable)
+        value: Value to cache (JSON types plus Decimal/date, see utils.serialization)
         ttl (int): Time to live in seconds
+        tags (list, optional): Tags to index the key under (see invalidate_tags)
         
     Returns:
         bool: True if set successfully, False otherwise
@@ -125,13 +333,214 @@ def cache_set(key, value, ttl=DEFAULT_CACHE_TTL):
         return False
     
     try:
-        serialized_value = json.dumps(value)
-        return redis_client.setex(key, ttl, serialized_value)
+        serialized_value = dump_cache_value(value)
+        if not tags:
+            result = redis_client.setex(key, ttl, serialized_value)
+        else:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.setex(key, ttl, serialized_value)
+            _register_tags(pipe, key, tags, ttl)
+            result = pipe.execute()[0]
+        
+        if result and _l1_active():
+            local_cache.set(key, value, min(ttl, CACHE_L1_TTL), len(serialized_value))
+        return result
     except Exception as e:
         logger.error(f"Error setting cache: {e}")
         return False
 
 
+def cache_fetch(key, compute, ttl=DEFAULT_CACHE_TTL, tags=None, stale_ttl=0, beta=CACHE_XFETCH_BETA):
+    """
+    Get a value from the cache, recomputing it with stampede protection.
+    
+    Entries are refreshed probabilistically before they expire (XFetch: the
+    closer to expiry and the slower `compute` was, the likelier an early
+    refresh), and only the worker holding the per-key lock recomputes. Others
+    keep serving the current value, or the stale one for up to `stale_ttl`
+    seconds after expiry (stale-while-revalidate). Without any cached value
+    they wait up to CACHE_LOCK_WAIT seconds for the lock holder's result.
+    
+    Args:
+        key (str): Cache key
+        compute (callable): Called without arguments to produce the value.
+            A None result is returned but not cached.
+        ttl (int): Time in seconds the value is considered fresh
+        tags (list or callable, optional): Tags for the entry, or a function
+            called with the computed value that returns them
+        stale_ttl (int): Seconds a stale value may still be served while one
+            worker refreshes it
+        beta (float): XFetch aggressiveness; 0 disables early refresh
+        
+    Returns:
+        The cached or freshly computed value
+    """
+    if not REDIS_ENABLED or not redis_client:
+        return compute()
+    
+    entry = _get_envelope(key)
+    if entry is not None:
+        now = time.time()
+        fresh = now < entry['expiry']
+        early = beta > 0 and now - entry['delta'] * beta * math.log(1.0 - random.random()) >= entry['expiry']
+        if fresh and not early:
+            return entry['value']
+        if not _acquire_lock(key):
+            # Someone else is refreshing; serve what we have
+            if fresh or now < entry['expiry'] + stale_ttl:
+                return entry['value']
+            return _wait_for_value(key, compute, ttl, tags, stale_ttl)
+        return _recompute(key, compute, ttl, tags, stale_ttl, locked=True)
+    
+    if _acquire_lock(key):
+        return _recompute(key, compute, ttl, tags, stale_ttl, locked=True)
+    return _wait_for_value(key, compute, ttl, tags, stale_ttl)
+
+
+def _get_envelope(key):
+    entry = cache_get(key)
+    # Values written by plain cache_set (or older code) are treated as misses
+    if isinstance(entry, dict) and '_xf_expiry' in entry:
+        return {'value': entry['_xf_value'], 'delta': entry['_xf_delta'], 'expiry': entry['_xf_expiry']}
+    return None
+
+
+def _recompute(key, compute, ttl, tags, stale_ttl, locked=False):
+    try:
+        start = time.time()
+        value = compute()
+        delta = time.time() - start
+        if value is not None:
+            envelope = {'_xf_value': value, '_xf_delta': delta, '_xf_expiry': time.time() + ttl}
+            entry_tags = tags(value) if callable(tags) else tags
+            cache_set(key, envelope, ttl + stale_ttl, tags=entry_tags)
+        return value
+    finally:
+        if locked:
+            _release_lock(key)
+
+
+def _wait_for_value(key, compute, ttl, tags, stale_ttl):
+    deadline = time.monotonic() + CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = _get_envelope(key)
+        if entry is not None:
+            return entry['value']
+    # The lock holder is too slow or died; compute without the lock
+    return _recompute(key, compute, ttl, tags, stale_ttl)
+
+
+_lock_tokens = threading.local()
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _acquire_lock(key):
+    try:
+        token = uuid.uuid4().hex
+        if redis_client.set(f"lock:{key}", token, nx=True, ex=CACHE_LOCK_TTL):
+            if not hasattr(_lock_tokens, 'tokens'):
+                _lock_tokens.tokens = {}
+            _lock_tokens.tokens[key] = token
+            return True
+        return False
+    except Exception as e:
+        logger.error(f"Error acquiring cache lock: {e}")
+        # Without Redis locking, fall back to recomputing
+        return True
+
+
+def _release_lock(key):
+    token = getattr(_lock_tokens, 'tokens', {}).pop(key, None)
+    if token is None:
+        return
+    try:
+        redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+    except Exception as e:
+        logger.error(f"Error releasing cache lock: {e}")
+
+
+def _register_tags(pipe, key, tags, ttl):
+    """Queue commands adding key to each tag set on a Redis pipeline."""
+    tag_ttl = max(ttl, CACHE_TAG_TTL)
+    for tag in tags:
+        tag_key = f"{CACHE_TAG_PREFIX}{tag}"
+        pipe.sadd(tag_key, key)
+        pipe.expire(tag_key, tag_ttl)
+
+
+def invalidate_tags(*tags):
+    """
+    Delete every cache entry indexed under any of the given tags.
+    
+    Cost is proportional to the number of keys in the tags, not the keyspace.
+    
+    Args:
+        *tags (str): Tags to invalidate
+        
+    Returns:
+        int: Number of cache entries deleted, or False on error / cache disabled
+    """
+    if not REDIS_ENABLED or not redis_client or not tags:
+        return False
+    
+    try:
+        # Read and drop each tag set atomically so keys tagged concurrently
+        # land in a fresh set instead of being lost
+        pipe = redis_client.pipeline(transaction=True)
+        for tag in tags:
+            tag_key = f"{CACHE_TAG_PREFIX}{tag}"
+            pipe.smembers(tag_key)
+            pipe.delete(tag_key)
+        results = pipe.execute()
+        
+        keys = set()
+        for members in results[0::2]:
+            keys.update(members)
+        
+        deleted = 0
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            deleted += redis_client.delete(*keys[i:i + 500])
+        if keys:
+            _broadcast_invalidation(keys=[k.decode() if isinstance(k, bytes) else k for k in keys])
+        return deleted
+    except Exception as e:
+        logger.error(f"Error invalidating cache tags {tags}: {e}")
+        return False
+
+
+def user_tag(user_id):
+    """Tag for every cache entry belonging to a user."""
+    return f"user:{user_id}"
+
+
+def user_rentals_tag(user_id=None):
+    """Tag for a user's rental entries, or for all rental entries if user_id is None."""
+    return f"user:{user_id}:rentals" if user_id else "rentals"
+
+
+def rental_tag(rental_id):
+    """Tag for cache entries that embed a specific rental."""
+    return f"rental:{rental_id}"
+
+
+def product_tag(product_id):
+    """Tag for cache entries that embed a specific product."""
+    return f"product:{product_id}"
+
+
+def catalog_tag():
+    """Tag for catalog-wide entries (counts, aggregates) affected by any product change."""
+    return "catalog"
+
+
 def cache_delete(key):
     """
     Delete a value from the cache.
@@ -147,14 +556,24 @@ def cache_delete(key):
     
     try:
         if '*' in key:
-            # Pattern delete
-            keys = redis_client.keys(key)
-            if keys:
-                return redis_client.delete(*keys)
-            return 0
+            # Pattern delete. Prefer tags (invalidate_tags) for hot paths; SCAN
+            # at least walks the keyspace incrementally instead of blocking Redis.
+            deleted = 0
+            batch = []
+            for matched in redis_client.scan_iter(match=key, count=1000):
+                batch.append(matched)
+                if len(batch) >= 500:
+                    deleted += redis_client.delete(*batch)
+                    batch = []
+            if batch:
+                deleted += redis_client.delete(*batch)
+            _broadcast_invalidation(pattern=key)
+            return deleted
         else:
             # Single key delete
-            return redis_client.delete(key)
+            deleted = redis_client.delete(key)
+            _broadcast_invalidation(keys=[key])
+            return deleted
     except Exception as e:
         logger.error(f"Error deleting from cache: {e}")
         return False
@@ -170,18 +589,7 @@ def invalidate_user_rentals_cache(user_id=None):
     Returns:
         bool: True if invalidated successfully, False otherwise
     """
-    if not REDIS_ENABLED or not redis_client:
-        return False
-    
-    try:
-        pattern = f"rental:user:{user_id}:*" if user_id else "rental:*"
-        keys = redis_client.keys(pattern)
-        if keys:
-            return redis_client.delete(*keys)
-        return True
-    except Exception as e:
-        logger.error(f"Error invalidating rental cache: {e}")
-        return False
+    return invalidate_tags(user_rentals_tag(user_id)) is not False
 
 
 def invalidate_rental_cache(rental_id):
@@ -194,27 +602,78 @@ def invalidate_rental_cache(rental_id):
     Returns:
         bool: True if invalidated successfully, False otherwise
     """
+    return invalidate_tags(rental_tag(rental_id)) is not False
+
+
+def invalidate_product_cache(product_id):
+    """
+    Invalidate cache entries that embed a specific product, and catalog-wide
+    entries such as list counts.
+    
+    Args:
+        product_id (int): Product ID
+        
+    Returns:
+        bool: True if invalidated successfully, False otherwise
+    """
+    return invalidate_tags(product_tag(product_id), catalog_tag()) is not False
+
+
+def migrate_legacy_rental_keys():
+    """
+    Index rental entries written before tag-based invalidation.
+    
+    Keys following the `rental:user:{user_id}:...` scheme (optionally containing
+    `:id:{rental_id}:`) are added to the tag sets the invalidation helpers use.
+    Run once per deploy; it walks the keyspace with SCAN, so it never blocks Redis.
+    
+    Returns:
+        int: Number of keys indexed, or False on error / cache disabled
+    """
     if not REDIS_ENABLED or not redis_client:
         return False
     
     try:
-        pattern = f"rental:*:id:{rental_id}*"
-        keys = redis_client.keys(pattern)
-        if keys:
-            return redis_client.delete(*keys)
-        return True
+        indexed = 0
+        pipe = redis_client.pipeline(transaction=False)
+        for raw_key in redis_client.scan_iter(match="rental:user:*", count=1000):
+            key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            parts = key.split(':')
+            
+            ttl = redis_client.ttl(key)
+            if ttl is None or ttl < 0:
+                ttl = DEFAULT_CACHE_TTL
+            
+            tags = [user_rentals_tag(), user_rentals_tag(parts[2])]
+            if 'id' in parts[3:-1]:
+                tags.append(rental_tag(parts[parts.index('id', 3) + 1]))
+            
+            _register_tags(pipe, key, tags, ttl)
+            indexed += 1
+            if indexed % 500 == 0:
+                pipe.execute()
+        pipe.execute()
+        logger.info(f"Indexed {indexed} legacy rental cache keys into tag sets")
+        return indexed
     except Exception as e:
-        logger.error(f"Error invalidating rental cache: {e}")
+        logger.error(f"Error migrating legacy rental cache keys: {e}")
         return False
 
 
-def cache_decorator(prefix, ttl=DEFAULT_CACHE_TTL):
+def cache_decorator(prefix, ttl=DEFAULT_CACHE_TTL, tags=None, stale_ttl=0, beta=CACHE_XFETCH_BETA):
     """
     Decorator for caching function results.
     
+    Results are stored through cache_fetch, so concurrent callers of an expiring
+    entry do not all re-run the function.
+    
     Args:
         prefix (str): Prefix for the cache key
         ttl (int): Time to live in seconds
+        tags (list or callable, optional): Tags for the cached entry, or a function
+            called with the decorated function's arguments that returns them
+        stale_ttl (int): Seconds a stale result may be served while it is refreshed
+        beta (float): XFetch early-refresh aggressiveness; 0 disables it
         
     Returns:
         function: Decorated function
@@ -228,26 +687,21 @@ def cache_decorator(prefix, ttl=DEFAULT_CACHE_TTL):
             # Skip first arg if it's 'self' or 'cls'
             skip_first = False
             if args and (func.__qualname__.endswith('.__call__') or 
-                        func.__module__ == args[0].__module__):
+                        func.__module__ == getattr(args[0], '__module__', None)):
                 skip_first = True
             
             # Generate cache key
             cache_args = args[1:] if skip_first else args
             cache_key = generate_cache_key(prefix, *cache_args, **kwargs)
             
-            # Try to get from cache
-            cached_result = cache_get(cache_key)
-            if cached_result is not None:
-                logger.debug(f"Cache hit for key: {cache_key}")
-                return cached_result
-            
-            # Cache miss, execute function
-            result = func(*args, **kwargs)
-            
-            # Store in cache
-            cache_set(cache_key, result, ttl)
-            logger.debug(f"Cached result for key: {cache_key}")
-            
-            return result
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            return cache_fetch(
+                cache_key,
+                lambda: func(*args, **kwargs),
+                ttl,
+                tags=entry_tags,
+                stale_ttl=stale_ttl,
+                beta=beta
+            )
         return wrapper
     return decorator
@@ -0,0 +1,255 @@
+"""
+Product catalog query helpers for GigGatek backend.
+
+Filters are expressed against indexed columns only: `brand` is a stored
+generated column extracted from the `specifications` JSON (see
+migrations/add_product_catalog_index.sql), so MySQL keeps it in sync on every
+product insert or update and brand filters no longer scan the JSON text.
+
+`primary_image` is derived the same way from `image_urls`, so list endpoints
+return rows as fetched without parsing JSON per row. Product details are
+parsed once and cached until invalidate_product_cache() is called for the
+product.
+"""
+
+import json
+import hashlib
+
+from .pagination import order_by_sql
+
+# Columns returned by the product list endpoint
+PRODUCT_LIST_COLUMNS = """product_id, name, category, purchase_price, rental_price_12m,
+                      condition_rating as `condition`, image_urls, primary_image"""
+
+# Columns returned by the product detail endpoint
+PRODUCT_DETAIL_COLUMNS = """product_id, name, description, category, specifications,
+                        condition_rating, purchase_price, rental_price_3m, rental_price_6m,
+                        rental_price_12m, stock_quantity, image_urls, primary_image"""
+
+# JSON columns decoded in the cached product detail
+PRODUCT_JSON_FIELDS = ('specifications', 'image_urls')
+
+# Sort orders accepted by the product list endpoint, as (column, direction)
+# pairs ending in the primary key so they can drive keyset pagination
+PRODUCT_SORT_KEYS = {
+    'price-low': [('purchase_price', 'ASC'), ('product_id', 'ASC')],
+    'price-high': [('purchase_price', 'DESC'), ('product_id', 'DESC')],
+    'newest': [('created_at', 'DESC'), ('product_id', 'DESC')],
+    'featured': [('is_featured', 'DESC'), ('product_id', 'ASC')]
+}
+PRODUCT_SORTS = {name: order_by_sql(keys) for name, keys in PRODUCT_SORT_KEYS.items()}
+
+# Price facet buckets as (label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = [
+    ('0-100', 0, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500-1000', 500, 1000),
+    ('1000-2000', 1000, 2000),
+    ('2000+', 2000, None)
+]
+
+# Facet dimensions: response key -> (grouped column alias, filter argument)
+FACET_DIMENSIONS = {
+    'category': ('category', 'categories'),
+    'brand': ('brand', 'brands'),
+    'condition': ('condition_rating', 'conditions')
+}
+
+
+def normalize_brand(brand):
+    """Normalize a brand name the same way the generated `brand` column does."""
+    return brand.strip().lower() if brand else brand
+
+
+def build_product_filters(categories=None, brands=None, conditions=None,
+                          price_min=None, price_max=None, in_stock=True):
+    """
+    Build the WHERE clause for a product catalog query.
+
+    Args:
+        categories (list): Category names to include
+        brands (list): Brand names to include (case-insensitive)
+        conditions (list): Condition ratings to include
+        price_min (float): Minimum purchase price
+        price_max (float): Maximum purchase price
+        in_stock (bool): Only include products with stock
+
+    Returns:
+        tuple: (where_sql, params) where where_sql starts with "WHERE"
+    """
+    clauses = []
+    params = []
+
+    if in_stock:
+        clauses.append("stock_quantity > 0")
+
+    if categories:
+        clauses.append(f"category IN ({', '.join(['%s'] * len(categories))})")
+        params.extend(categories)
+
+    if brands:
+        clauses.append(f"brand IN ({', '.join(['%s'] * len(brands))})")
+        params.extend(normalize_brand(brand) for brand in brands)
+
+    if conditions:
+        clauses.append(f"condition_rating IN ({', '.join(['%s'] * len(conditions))})")
+        params.extend(conditions)
+
+    if price_min is not None and price_max is not None:
+        clauses.append("purchase_price BETWEEN %s AND %s")
+        params.extend([price_min, price_max])
+    elif price_min is not None:
+        clauses.append("purchase_price >= %s")
+        params.append(price_min)
+    elif price_max is not None:
+        clauses.append("purchase_price <= %s")
+        params.append(price_max)
+
+    where_sql = "WHERE " + " AND ".join(clauses) if clauses else ""
+    return where_sql, params
+
+
+def parse_product_row(product):
+    """
+    Decode the JSON columns of a product row in place.
+
+    Args:
+        product (dict): Row selected with PRODUCT_DETAIL_COLUMNS
+
+    Returns:
+        dict: The same row, with specifications and image_urls decoded
+    """
+    for field in PRODUCT_JSON_FIELDS:
+        value = product.get(field)
+        if isinstance(value, (bytes, bytearray)):
+            value = value.decode('utf-8')
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                value = None
+        product[field] = value
+    return product
+
+
+def load_product_details(cursor, product_ids):
+    """
+    Load and parse product details for many products in one query.
+
+    Args:
+        cursor: Dictionary cursor
+        product_ids (list): Product IDs
+
+    Returns:
+        dict: Product ID -> parsed product row (missing products are omitted)
+    """
+    if not product_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    cursor.execute(
+        f"SELECT {PRODUCT_DETAIL_COLUMNS} FROM products WHERE product_id IN ({placeholders})",
+        list(product_ids)
+    )
+    return {row['product_id']: parse_product_row(row) for row in cursor.fetchall()}
+
+
+def product_detail_cache_key(product_id):
+    """Cache key of the parsed product detail document."""
+    return f"product:{product_id}:detail"
+
+
+def normalize_filters(categories=None, brands=None, conditions=None,
+                      price_min=None, price_max=None):
+    """
+    Canonical form of a catalog filter set.
+
+    Equivalent requests (different parameter order, duplicates, brand case)
+    normalize to the same dict, so it can be used as a cache signature.
+
+    Returns:
+        dict: Keyword arguments for build_product_filters
+    """
+    return {
+        'categories': sorted(set(categories or [])),
+        'brands': sorted({normalize_brand(brand) for brand in brands or [] if brand.strip()}),
+        'conditions': sorted(set(conditions or [])),
+        'price_min': float(price_min) if price_min is not None else None,
+        'price_max': float(price_max) if price_max is not None else None
+    }
+
+
+def filter_signature(filters):
+    """Stable hash of a normalized filter set."""
+    return hashlib.md5(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _price_bucket_sql():
+    cases = []
+    for label, low, high in PRICE_BUCKETS:
+        if high is None:
+            cases.append(f"WHEN purchase_price >= {low} THEN '{label}'")
+        else:
+            cases.append(f"WHEN purchase_price >= {low} AND purchase_price < {high} THEN '{label}'")
+    return "CASE " + " ".join(cases) + " END"
+
+
+def compute_facets(cursor, filters):
+    """
+    Count products per category, brand, condition and price bucket.
+
+    Runs a single GROUP BY over every facet combination that matches the
+    stock and price filters, then folds the combinations in Python. Facet
+    selections are applied disjunctively: the counts of a dimension ignore
+    that dimension's own selection (so selecting "nvidia" still shows how
+    many "amd" products there are) but respect all the others.
+
+    Args:
+        cursor: Dictionary cursor
+        filters (dict): Normalized filters from normalize_filters
+
+    Returns:
+        dict: {'total', 'category', 'brand', 'condition', 'price'} where
+            each facet maps value -> count
+    """
+    where_sql, params = build_product_filters(
+        price_min=filters['price_min'],
+        price_max=filters['price_max']
+    )
+    cursor.execute(f"""
+        SELECT category, brand, condition_rating, {_price_bucket_sql()} as price_bucket,
+               COUNT(*) as count
+        FROM products
+        {where_sql}
+        GROUP BY category, brand, condition_rating, price_bucket
+    """, params)
+    combinations = cursor.fetchall()
+
+    selected = {
+        column: set(filters[argument])
+        for column, argument in FACET_DIMENSIONS.values()
+    }
+
+    def matches(row, skip=None):
+        return all(
+            not values or row[column] in values
+            for column, values in selected.items()
+            if column != skip
+        )
+
+    facets = {name: {} for name in FACET_DIMENSIONS}
+    facets['price'] = {label: 0 for label, _, _ in PRICE_BUCKETS}
+    total = 0
+
+    for row in combinations:
+        count = int(row['count'])
+        for name, (column, _) in FACET_DIMENSIONS.items():
+            if row[column] is not None and matches(row, skip=column):
+                facets[name][row[column]] = facets[name].get(row[column], 0) + count
+        if matches(row):
+            total += count
+            if row['price_bucket'] is not None:
+                facets['price'][row['price_bucket']] += count
+
+    facets['total'] = total
+    return facets
@@ -0,0 +1,66 @@
+"""
+Resumable progress for GigGatek batch jobs.
+
+A job that walks a table in keyset order saves the sort key of the last row
+it finished in `job_checkpoints`, in the same transaction as the chunk's own
+writes. If the job dies, the next run with the same run key continues after
+that row instead of starting over.
+"""
+
+from .pagination import encode_cursor, decode_cursor, InvalidCursorError
+
+
+def load_checkpoint(cursor, job_name, run_key, size=None):
+    """
+    Get the position a previous run of a job stopped at.
+
+    Args:
+        cursor: Dictionary cursor
+        job_name (str): Job identifier
+        run_key (str): Identifies one run of the job, e.g. the run date
+        size (int): Expected number of sort key values
+
+    Returns:
+        list: Sort key values of the last processed row, or None to start
+        from the beginning
+    """
+    cursor.execute("""
+        SELECT position FROM job_checkpoints
+        WHERE job_name = %s AND run_key = %s
+    """, (job_name, run_key))
+    row = cursor.fetchone()
+    if not row or not row['position']:
+        return None
+    try:
+        return decode_cursor(row['position'], sort=job_name, size=size)
+    except InvalidCursorError:
+        return None
+
+
+def save_checkpoint(cursor, job_name, run_key, position, processed=0):
+    """
+    Record progress; commit together with the work it covers.
+
+    Args:
+        cursor: Database cursor
+        job_name (str): Job identifier
+        run_key (str): Identifies one run of the job
+        position (list): Sort key values of the last processed row
+        processed (int): Rows processed since the previous checkpoint
+    """
+    cursor.execute("""
+        INSERT INTO job_checkpoints (job_name, run_key, position, processed, updated_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            position = VALUES(position),
+            processed = processed + VALUES(processed),
+            updated_at = NOW()
+    """, (job_name, run_key, encode_cursor(position, job_name), processed))
+
+
+def clear_checkpoint(cursor, job_name, run_key):
+    """Forget a job's progress once the run has completed."""
+    cursor.execute("""
+        DELETE FROM job_checkpoints
+        WHERE job_name = %s AND run_key = %s
+    """, (job_name, run_key))
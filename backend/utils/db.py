@@ -1,24 +1,40 @@
 """
 Database utility functions for GigGatek backend.
+
+Connections are served from a process-wide pool so that each request reuses an
+already authenticated MySQL session instead of paying a TCP + auth handshake.
 """
 
 import mysql.connector
 from mysql.connector import Error
 import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def get_db_connection():
-    """
-    Establishes a connection to the MySQL database using environment variables.
+logger = logging.getLogger(__name__)
 
-    Returns:
-        A MySQL connection object if successful, None otherwise.
-    """
-    # Database Configuration from environment variables
-    DB_CONFIG = {
+# Pool configuration (per process, i.e. per gunicorn worker)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # 30 minutes
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+
+class PoolTimeoutError(Error):
+    """Raised when no connection could be checked out within the pool timeout."""
+
+
+def _get_db_config():
+    """Database configuration from environment variables."""
+    return {
         'host': os.getenv('DB_HOST', 'localhost'),
         'port': int(os.getenv('DB_PORT', 3306)),
         'user': os.getenv('DB_USER', 'giggatek_user'),
@@ -26,11 +42,362 @@ def get_db_connection():
         'database': os.getenv('DB_NAME', 'giggatek')
     }
 
-    conn = None
+
+class PooledConnection:
+    """
+    Proxy around a MySQL connection checked out from a ConnectionPool.
+
+    Behaves like the underlying connection, except that close() hands the
+    connection back to the pool instead of tearing down the session, so
+    existing `conn.close()` calls in the routes keep working unchanged.
+    """
+
+    def __init__(self, pool, raw_conn, created_at):
+        self._pool = pool
+        self._conn = raw_conn
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def is_connected(self):
+        if self._released:
+            return False
+        return self._conn.is_connected()
+
+    def close(self):
+        """Return the connection to the pool (idempotent)."""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._conn, self._created_at)
+
+
+class ConnectionPool:
+    """
+    Thread-safe MySQL connection pool.
+
+    Keeps up to `size` idle connections and allows `max_overflow` additional
+    connections under load. Borrowers wait up to `timeout` seconds for a free
+    slot, connections are pinged before being handed out (`pre_ping`) and are
+    replaced once they are older than `recycle` seconds.
+    """
+
+    def __init__(self, db_config, size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW,
+                 timeout=DB_POOL_TIMEOUT, recycle=DB_POOL_RECYCLE, pre_ping=DB_POOL_PRE_PING):
+        self.db_config = db_config
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()  # (raw_conn, created_at)
+        self._in_use = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        # Counters for monitoring
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_pings = 0
+
+    @property
+    def max_connections(self):
+        return self.size + self.max_overflow
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.db_config)
+        with self._cond:
+            self._created += 1
+        logger.debug(f"Opened MySQL connection to {self.db_config['database']} on {self.db_config['host']}")
+        return conn, time.monotonic()
+
+    def _discard(self, raw_conn):
+        try:
+            raw_conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, raw_conn, created_at):
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if self.pre_ping:
+            try:
+                raw_conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._failed_pings += 1
+                return False
+        return True
+
+    def acquire(self, timeout=None):
+        """
+        Check out a connection from the pool.
+
+        Args:
+            timeout: Seconds to wait for a free connection (defaults to the pool timeout)
+
+        Returns:
+            PooledConnection: Connection whose close() returns it to the pool
+
+        Raises:
+            PoolTimeoutError: If the pool stayed exhausted for the whole timeout
+            mysql.connector.Error: If a new connection could not be opened
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        waited = False
+
+        with self._cond:
+            while not self._idle and self._in_use >= self.max_connections:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        msg=f"Timed out after {timeout}s waiting for a database connection "
+                            f"({self._in_use} in use, pool limit {self.max_connections})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            entry = self._idle.pop() if self._idle else None
+            self._in_use += 1
+
+            wait_time = time.monotonic() - start
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_time_total += wait_time
+            self._wait_time_max = max(self._wait_time_max, wait_time)
+
+        # Health checks and connects happen outside the lock
+        try:
+            if entry is not None:
+                raw_conn, created_at = entry
+                if not self._is_healthy(raw_conn, created_at):
+                    self._discard(raw_conn)
+                    entry = None
+            if entry is None:
+                entry = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, *entry)
+
+    def _release(self, raw_conn, created_at):
+        # End any implicit transaction so the next borrower gets a fresh snapshot
+        reusable = True
+        try:
+            raw_conn.rollback()
+        except Exception:
+            reusable = False
+
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            reusable = False
+            with self._cond:
+                self._recycled += 1
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable and len(self._idle) < self.size:
+                self._idle.append((raw_conn, created_at))
+                raw_conn = None
+            self._cond.notify()
+
+        # Overflow or broken connections are closed
+        if raw_conn is not None:
+            self._discard(raw_conn)
+
+    def dispose(self):
+        """Close all idle connections."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for raw_conn, _ in idle:
+            self._discard(raw_conn)
+
+    def stats(self):
+        """
+        Snapshot of pool usage.
+
+        Returns:
+            dict: Pool sizing, current in-use/idle counts and wait statistics
+        """
+        with self._cond:
+            return {
+                'pid': os.getpid(),
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total': self._wait_time_total,
+                'wait_time_max': self._wait_time_max,
+                'wait_time_avg': self._wait_time_total / self._checkouts if self._checkouts else 0.0,
+                'timeouts': self._timeouts,
+                'connections_created': self._created,
+                'connections_recycled': self._recycled,
+                'failed_pings': self._failed_pings
+            }
+
+
+# Process-wide pool, created lazily and re-created after fork so that
+# gunicorn workers never share sockets with the master process.
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the connection pool for the current process."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(_get_db_config())
+                _pool_pid = pid
+    return _pool
+
+
+def get_pool_stats():
+    """Return usage statistics for this process's connection pool."""
+    return get_pool().stats()
+
+
+def get_db_connection():
+    """
+    Checks out a pooled connection to the MySQL database.
+
+    The returned connection behaves like a regular MySQL connection; calling
+    close() on it returns it to the pool.
+
+    Returns:
+        A pooled MySQL connection object if successful, None otherwise.
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        if conn.is_connected():
-            print(f"Connected to MySQL database: {DB_CONFIG['database']} on {DB_CONFIG['host']}")
+        return get_pool().acquire()
     except Error as e:
-        print(f"Error connecting to MySQL Database: {e}")
-    return conn
+        logger.error(f"Error connecting to MySQL Database: {e}")
+        return None
+
+
+@contextmanager
+def db_connection():
+    """
+    Context manager that checks out a pooled connection and always returns it.
+
+    Uncommitted work is rolled back when the connection goes back to the pool.
+
+    Example:
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            ...
+            conn.commit()
+
+    Raises:
+        PoolTimeoutError: If no connection became available in time
+    """
+    conn = get_pool().acquire()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def db_cursor(dictionary=True, commit=False):
+    """
+    Context manager yielding a cursor on a pooled connection.
+
+    Args:
+        dictionary (bool): Return rows as dictionaries
+        commit (bool): Commit when the block exits without an exception
+
+    Example:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT ...", params)
+            rows = cursor.fetchall()
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            if commit:
+                conn.commit()
+        finally:
+            cursor.close()
+
+
+def batch_load(cursor, query, ids, group_by, chunk_size=1000):
+    """
+    Fetch child rows for many parents with one IN-list query per chunk.
+
+    Use this instead of querying once per parent row (N+1) in list endpoints.
+
+    Args:
+        cursor: Dictionary cursor to run the query on
+        query (str): SELECT with an `IN ({placeholders})` clause; must return
+            the `group_by` column
+        ids (iterable): Parent ids to load children for
+        group_by (str): Column holding the parent id in the child rows
+        chunk_size (int): Maximum ids per query
+
+    Returns:
+        dict: Parent id -> list of child rows, in query order
+
+    Example:
+        payments = batch_load(
+            cursor,
+            "SELECT id, rental_id, amount FROM rental_payments "
+            "WHERE rental_id IN ({placeholders}) ORDER BY payment_date DESC",
+            [rental['id'] for rental in rentals],
+            'rental_id'
+        )
+    """
+    unique_ids = list(dict.fromkeys(ids))
+    grouped = {parent_id: [] for parent_id in unique_ids}
+
+    for i in range(0, len(unique_ids), chunk_size):
+        chunk = unique_ids[i:i + chunk_size]
+        cursor.execute(query.format(placeholders=', '.join(['%s'] * len(chunk))), chunk)
+        for row in cursor.fetchall():
+            grouped.setdefault(row[group_by], []).append(row)
+
+    return grouped
+
+
+def attach_batch(cursor, rows, field, query, group_by, id_field='id'):
+    """
+    Load child rows for a page of parent rows and attach them as a list field.
+
+    Args:
+        cursor: Dictionary cursor to run the query on
+        rows (list): Parent rows (dicts); modified in place
+        field (str): Name of the list field to set on each parent
+        query (str): Child query, see batch_load
+        group_by (str): Column holding the parent id in the child rows
+        id_field (str): Parent id column
+
+    Returns:
+        list: The same rows, for chaining
+    """
+    if not rows:
+        return rows
+
+    grouped = batch_load(cursor, query, [row[id_field] for row in rows], group_by)
+    for row in rows:
+        row[field] = grouped.get(row[id_field], [])
+    return rows
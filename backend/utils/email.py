@@ -10,19 +10,29 @@ Emails are sent via SMTP using a configurable email service.
 """
 
 import os
-import smtplib
-import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import time
 import logging
-from jinja2 import Environment, FileSystemLoader
+import atexit
 import threading
 
-# Initialize Jinja2 environment for email templates
-template_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates/emails')
-jinja_env = Environment(loader=FileSystemLoader(template_dir))
+from mysql.connector import Error
+
+from .db import db_cursor
+from .email_delivery import SMTPConnection, EmailDeliveryPool, EmailQueueFullError
+from .email_templates import EmailTemplateRenderer
+from .outbox import enqueue, enqueue_many, register_handler, CHANNEL_EMAIL
+from .pagination import keyset_condition, order_by_sql
+from .checkpoints import load_checkpoint, save_checkpoint, clear_checkpoint
+
+# Compiled email templates (bytecode cached on disk, see email_templates.py)
+template_renderer = EmailTemplateRenderer()
+jinja_env = template_renderer.env
 
 # Email configuration
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.example.com')
@@ -33,12 +43,79 @@ EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_FROM = os.environ.get('EMAIL_FROM', 'GigGatek <notifications@giggatek.com>')
 EMAIL_REPLY_TO = os.environ.get('EMAIL_REPLY_TO', 'support@giggatek.com')
 
+# Delivery pool: EMAIL_WORKERS threads, each reusing one SMTP session
+EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', 4))
+EMAIL_QUEUE_SIZE = int(os.environ.get('EMAIL_QUEUE_SIZE', 1000))
+EMAIL_QUEUE_TIMEOUT = float(os.environ.get('EMAIL_QUEUE_TIMEOUT', 5))  # Max producer wait when the queue is full
+EMAIL_SMTP_TIMEOUT = int(os.environ.get('EMAIL_SMTP_TIMEOUT', 30))
+EMAIL_SMTP_IDLE_TIMEOUT = int(os.environ.get('EMAIL_SMTP_IDLE_TIMEOUT', 60))  # Close sessions idle this long
+EMAIL_SMTP_MAX_MESSAGES = int(os.environ.get('EMAIL_SMTP_MAX_MESSAGES', 100))  # Messages per session
+
+# Write emails to the notification outbox (delivered by the dispatcher process)
+# instead of sending them from the web worker
+EMAIL_OUTBOX_ENABLED = os.environ.get('EMAIL_OUTBOX_ENABLED', 'true').lower() == 'true'
+
+# Payment reminder job
+REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 500))  # Rentals per chunk (one commit each)
+REMINDER_RENDER_WORKERS = int(os.environ.get('REMINDER_RENDER_WORKERS', 0))  # Render processes; 0 renders inline
+REMINDER_WINDOW_DAYS = 7
+PAYMENT_REMINDER_JOB = 'rental_payment_reminders'
+PAYMENT_REMINDER_SORT = [('r.next_payment_date', 'ASC'), ('r.id', 'ASC')]
+
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# Process-wide delivery pool, created lazily and re-created after fork
+_delivery_pool = None
+_delivery_pool_pid = None
+_delivery_pool_lock = threading.Lock()
+
+def _create_smtp_connection():
+    return SMTPConnection(
+        EMAIL_HOST,
+        EMAIL_PORT,
+        username=EMAIL_HOST_USER,
+        password=EMAIL_HOST_PASSWORD,
+        use_tls=EMAIL_USE_TLS,
+        timeout=EMAIL_SMTP_TIMEOUT,
+        max_messages=EMAIL_SMTP_MAX_MESSAGES
+    )
+
+def get_delivery_pool():
+    """Return the email delivery pool for the current process."""
+    global _delivery_pool, _delivery_pool_pid
+    pid = os.getpid()
+    if _delivery_pool is None or _delivery_pool_pid != pid:
+        with _delivery_pool_lock:
+            if _delivery_pool is None or _delivery_pool_pid != pid:
+                _delivery_pool = EmailDeliveryPool(
+                    _create_smtp_connection,
+                    workers=EMAIL_WORKERS,
+                    queue_size=EMAIL_QUEUE_SIZE,
+                    submit_timeout=EMAIL_QUEUE_TIMEOUT,
+                    idle_timeout=EMAIL_SMTP_IDLE_TIMEOUT
+                )
+                _delivery_pool_pid = pid
+    return _delivery_pool
+
+def get_email_delivery_stats():
+    """Return queue and SMTP session statistics for this process's delivery pool."""
+    stats = get_delivery_pool().stats()
+    stats['pid'] = os.getpid()
+    return stats
+
+@atexit.register
+def _drain_delivery_pool():
+    # Scheduled jobs exit right after queuing their emails; deliver them first
+    if _delivery_pool is not None and _delivery_pool_pid == os.getpid():
+        _delivery_pool.shutdown(wait=True)
+
 def send_email_async(to_email, subject, html_content, text_content=None, attachments=None):
     """
-    Send an email asynchronously to avoid blocking the main execution thread.
+    Queue an email for delivery by the background worker pool.
+    
+    Blocks for up to EMAIL_QUEUE_TIMEOUT seconds when the queue is full, so
+    bulk senders are throttled to the rate the SMTP workers can sustain.
     
     Args:
         to_email: Recipient email address or list of addresses
@@ -46,17 +123,24 @@ def send_email_async(to_email, subject, html_content, text_content=None, attachm
         html_content: HTML content of the email
         text_content: Plain text content (optional, will be generated from HTML if not provided)
         attachments: List of file paths to attach (optional)
+    
+    Returns:
+        concurrent.futures.Future resolving to True if sent, False otherwise
+    
+    Raises:
+        EmailQueueFullError: If the queue stayed full for EMAIL_QUEUE_TIMEOUT seconds
     """
-    thread = threading.Thread(
-        target=_send_email,
-        args=(to_email, subject, html_content, text_content, attachments)
+    return get_delivery_pool().submit(
+        lambda connection: _send_email(
+            to_email, subject, html_content, text_content, attachments, connection=connection
+        )
     )
-    thread.start()
-    return thread
 
-def _send_email(to_email, subject, html_content, text_content=None, attachments=None):
+def _send_email(to_email, subject, html_content, text_content=None, attachments=None, connection=None):
     """
     Internal function to send emails via SMTP.
+    
+    Uses the given pooled SMTPConnection, or a one-off session if none is given.
     """
     if isinstance(to_email, str):
         to_email = [to_email]
@@ -96,19 +180,110 @@ def _send_email(to_email, subject, html_content, text_content=None, attachments=
                 logger.error(f"Error attaching file {file_path}: {str(e)}")
     
     try:
-        # Connect to SMTP server
-        context = ssl.create_default_context()
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
-            if EMAIL_USE_TLS:
-                server.starttls(context=context)
-            server.login(EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)
-            server.sendmail(EMAIL_FROM, to_email, msg.as_string())
+        if connection is None:
+            connection = _create_smtp_connection()
+            try:
+                connection.send(EMAIL_FROM, to_email, msg.as_string())
+            finally:
+                connection.close()
+        else:
+            connection.send(EMAIL_FROM, to_email, msg.as_string())
         logger.info(f"Email sent to {to_email}: {subject}")
         return True
     except Exception as e:
         logger.error(f"Failed to send email to {to_email}: {str(e)}")
         return False
 
+def queue_email(to_email, subject, html_content, kind, cursor=None, dedup_key=None,
+                text_content=None, attachments=None):
+    """
+    Hand an email over for delivery through the notification outbox.
+    
+    With a cursor, the outbox row is part of the caller's transaction and is
+    only delivered if the caller commits. Without one, it is written in its own
+    transaction. If the outbox is disabled or cannot be written, the email is
+    sent directly through the delivery pool.
+    
+    Args:
+        to_email: Recipient email address or list of addresses
+        subject: Email subject
+        html_content: HTML content of the email
+        kind: Email type (template name), used for logging
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the same email from being queued twice (optional)
+        text_content: Plain text content (optional)
+        attachments: List of file paths to attach (optional)
+    
+    Returns:
+        True if queued (False if the dedup key was already used), or a Future
+        when sent directly
+    """
+    if EMAIL_OUTBOX_ENABLED:
+        payload = {
+            'to': to_email,
+            'subject': subject,
+            'html': html_content,
+            'text': text_content,
+            'attachments': attachments
+        }
+        if cursor is not None:
+            return enqueue(cursor, CHANNEL_EMAIL, kind, payload, dedup_key)
+        try:
+            with db_cursor(commit=True) as own_cursor:
+                return enqueue(own_cursor, CHANNEL_EMAIL, kind, payload, dedup_key)
+        except Error as e:
+            logger.error(f"Could not write {kind} email to the outbox, sending directly: {e}")
+    return send_email_async(to_email, subject, html_content, text_content, attachments)
+
+def queue_emails(cursor, kind, messages):
+    """
+    Queue many emails of one kind in the caller's transaction.
+    
+    Args:
+        cursor: Cursor of the transaction the emails belong to
+        kind: Email type (template name)
+        messages: List of dicts with 'to', 'subject', 'html' and optionally
+            'text' and 'dedup_key'
+    
+    Returns:
+        Number of emails queued (or handed to the delivery pool when the
+        outbox is disabled)
+    """
+    if not EMAIL_OUTBOX_ENABLED:
+        for message in messages:
+            send_email_async(message['to'], message['subject'], message['html'], message.get('text'))
+        return len(messages)
+    
+    return enqueue_many(cursor, CHANNEL_EMAIL, kind, [
+        ({
+            'to': message['to'],
+            'subject': message['subject'],
+            'html': message['html'],
+            'text': message.get('text'),
+            'attachments': None
+        }, message.get('dedup_key'))
+        for message in messages
+    ])
+
+@register_handler(CHANNEL_EMAIL)
+def deliver_outbox_email(entry):
+    """
+    Outbox handler: send a queued email and wait for the SMTP result.
+    
+    Raises:
+        RuntimeError: If delivery failed (the dispatcher retries later)
+    """
+    payload = entry['payload']
+    future = send_email_async(
+        payload['to'],
+        payload['subject'],
+        payload['html'],
+        payload.get('text'),
+        payload.get('attachments')
+    )
+    if not future.result():
+        raise RuntimeError(f"SMTP delivery of outbox entry {entry['id']} failed")
+
 def render_template(template_name, context):
     """
     Render an email template with the given context.
@@ -121,12 +296,33 @@ def render_template(template_name, context):
         Rendered HTML content
     """
     try:
-        template = jinja_env.get_template(f"{template_name}.html")
-        return template.render(**context)
+        return template_renderer.render(template_name, context)
     except Exception as e:
         logger.error(f"Error rendering template {template_name}: {str(e)}")
-        # Fallback to a simple message
-        return f"""
+        return _fallback_html(context)
+
+def render_templates(template_name, contexts, shared=None):
+    """
+    Render one email template for many recipients (batch jobs).
+    
+    Args:
+        template_name: Name of the template file (without extension)
+        contexts: List of per-recipient variable dictionaries
+        shared: Variables common to all recipients (optional)
+    
+    Returns:
+        List of rendered HTML content, in the order of contexts
+    """
+    try:
+        return template_renderer.render_many(template_name, contexts, shared)
+    except Exception as e:
+        logger.error(f"Error rendering template {template_name} in bulk: {str(e)}")
+        # Render one by one so only the failing recipients get the fallback
+        return [render_template(template_name, {**(shared or {}), **context}) for context in contexts]
+
+def _fallback_html(context):
+    """Simple message used when a template fails to render."""
+    return f"""
         <html>
         <body>
             <h1>{context.get('subject', 'GigGatek Notification')}</h1>
@@ -138,13 +334,15 @@ def render_template(template_name, context):
 
 # Account-related email functions
 
-def send_welcome_email(user_email, user_name):
+def send_welcome_email(user_email, user_name, cursor=None, dedup_key=None):
     """
     Send a welcome email to a newly registered user.
     
     Args:
         user_email: User's email address
         user_name: User's first name
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     subject = "Welcome to GigGatek!"
     context = {
@@ -153,9 +351,11 @@ def send_welcome_email(user_email, user_name):
         'subject': subject
     }
     html_content = render_template('welcome', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'welcome', cursor=cursor, dedup_key=dedup_key)
 
-def send_password_reset_email(user_email, user_name, reset_token, reset_url=None):
+def send_password_reset_email(user_email, user_name, reset_token, reset_url=None,
+                              cursor=None, dedup_key=None):
     """
     Send a password reset email.
     
@@ -164,6 +364,8 @@ def send_password_reset_email(user_email, user_name, reset_token, reset_url=None
         user_name: User's first name
         reset_token: Password reset token
         reset_url: Full URL for password reset (optional)
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     if reset_url is None:
         reset_url = f"https://giggatek.com/reset-password?token={reset_token}"
@@ -178,9 +380,11 @@ def send_password_reset_email(user_email, user_name, reset_token, reset_url=None
         'subject': subject
     }
     html_content = render_template('password_reset', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'password_reset', cursor=cursor, dedup_key=dedup_key)
 
-def send_account_verification_email(user_email, user_name, verification_token, verification_url=None):
+def send_account_verification_email(user_email, user_name, verification_token, verification_url=None,
+                                    cursor=None, dedup_key=None):
     """
     Send an account verification email.
     
@@ -189,6 +393,8 @@ def send_account_verification_email(user_email, user_name, verification_token, v
         user_name: User's first name
         verification_token: Account verification token
         verification_url: Full URL for verification (optional)
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     if verification_url is None:
         verification_url = f"https://giggatek.com/verify-account?token={verification_token}"
@@ -203,11 +409,12 @@ def send_account_verification_email(user_email, user_name, verification_token, v
         'subject': subject
     }
     html_content = render_template('account_verification', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'account_verification', cursor=cursor, dedup_key=dedup_key)
 
 # Order-related email functions
 
-def send_order_confirmation_email(user_email, user_name, order_data):
+def send_order_confirmation_email(user_email, user_name, order_data, cursor=None, dedup_key=None):
     """
     Send an order confirmation email.
     
@@ -215,6 +422,8 @@ def send_order_confirmation_email(user_email, user_name, order_data):
         user_email: User's email address
         user_name: User's first name
         order_data: Dictionary containing order details (id, date, items, totals, etc.)
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     subject = f"Order Confirmation #{order_data['id']}"
     context = {
@@ -224,9 +433,11 @@ def send_order_confirmation_email(user_email, user_name, order_data):
         'subject': subject
     }
     html_content = render_template('order_confirmation', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'order_confirmation', cursor=cursor, dedup_key=dedup_key)
 
-def send_order_status_update_email(user_email, user_name, order_data, old_status, new_status):
+def send_order_status_update_email(user_email, user_name, order_data, old_status, new_status,
+                                   cursor=None, dedup_key=None):
     """
     Send an order status update email.
     
@@ -236,6 +447,8 @@ def send_order_status_update_email(user_email, user_name, order_data, old_status
         order_data: Dictionary containing order details
         old_status: Previous order status
         new_status: New order status
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     subject = f"Order #{order_data['id']} Status Update"
     context = {
@@ -247,9 +460,11 @@ def send_order_status_update_email(user_email, user_name, order_data, old_status
         'subject': subject
     }
     html_content = render_template('order_status_update', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'order_status_update', cursor=cursor, dedup_key=dedup_key)
 
-def send_shipping_confirmation_email(user_email, user_name, order_data, tracking_number, carrier):
+def send_shipping_confirmation_email(user_email, user_name, order_data, tracking_number, carrier,
+                                     cursor=None, dedup_key=None):
     """
     Send a shipping confirmation email.
     
@@ -259,6 +474,8 @@ def send_shipping_confirmation_email(user_email, user_name, order_data, tracking
         order_data: Dictionary containing order details
         tracking_number: Shipment tracking number
         carrier: Shipping carrier (USPS, FedEx, etc.)
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     subject = f"Your GigGatek Order #{order_data['id']} Has Shipped"
     context = {
@@ -270,11 +487,12 @@ def send_shipping_confirmation_email(user_email, user_name, order_data, tracking
         'subject': subject
     }
     html_content = render_template('shipping_confirmation', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'shipping_confirmation', cursor=cursor, dedup_key=dedup_key)
 
 # Rental-related email functions
 
-def send_rental_confirmation_email(user_email, user_name, rental_data):
+def send_rental_confirmation_email(user_email, user_name, rental_data, cursor=None, dedup_key=None):
     """
     Send a rental confirmation email.
     
@@ -282,6 +500,8 @@ def send_rental_confirmation_email(user_email, user_name, rental_data):
         user_email: User's email address
         user_name: User's first name
         rental_data: Dictionary containing rental details
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     subject = f"Rental Confirmation #{rental_data['id']}"
     context = {
@@ -291,9 +511,11 @@ def send_rental_confirmation_email(user_email, user_name, rental_data):
         'subject': subject
     }
     html_content = render_template('rental_confirmation', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'rental_confirmation', cursor=cursor, dedup_key=dedup_key)
 
-def send_rental_payment_reminder_email(user_email, user_name, rental_data, days_until_due):
+def send_rental_payment_reminder_email(user_email, user_name, rental_data, days_until_due,
+                                       cursor=None, dedup_key=None):
     """
     Send a rental payment reminder email.
     
@@ -302,9 +524,29 @@ def send_rental_payment_reminder_email(user_email, user_name, rental_data, days_
         user_name: User's first name
         rental_data: Dictionary containing rental details
         days_until_due: Number of days until payment is due
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
+    """
+    subject, html_content = build_payment_reminder_email(user_name, rental_data, days_until_due)
+    return queue_email(user_email, subject, html_content,
+                       'rental_payment_reminder', cursor=cursor, dedup_key=dedup_key)
+
+def build_payment_reminder_email(user_name, rental_data, days_until_due):
+    """
+    Render the subject and HTML of a rental payment reminder.
+    
+    Args:
+        user_name: User's first name
+        rental_data: Dictionary containing rental details
+        days_until_due: Number of days until payment is due
+    
+    Returns:
+        Tuple of (subject, html_content)
     """
     subject = f"Payment Reminder for Rental #{rental_data['id']}"
-    payment_date = datetime.strptime(rental_data['next_payment_date'], '%Y-%m-%d')
+    payment_date = rental_data['next_payment_date']
+    if isinstance(payment_date, str):
+        payment_date = datetime.strptime(payment_date, '%Y-%m-%d')
     
     context = {
         'user_name': user_name,
@@ -315,10 +557,10 @@ def send_rental_payment_reminder_email(user_email, user_name, rental_data, days_
         'current_year': datetime.now().year,
         'subject': subject
     }
-    html_content = render_template('rental_payment_reminder', context)
-    return send_email_async(user_email, subject, html_content)
+    return subject, render_template('rental_payment_reminder', context)
 
-def send_rental_payment_receipt_email(user_email, user_name, rental_data, payment_data):
+def send_rental_payment_receipt_email(user_email, user_name, rental_data, payment_data,
+                                      cursor=None, dedup_key=None):
     """
     Send a rental payment receipt email.
     
@@ -327,6 +569,8 @@ def send_rental_payment_receipt_email(user_email, user_name, rental_data, paymen
         user_name: User's first name
         rental_data: Dictionary containing rental details
         payment_data: Dictionary containing payment details
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     subject = f"Payment Receipt for Rental #{rental_data['id']}"
     context = {
@@ -337,9 +581,10 @@ def send_rental_payment_receipt_email(user_email, user_name, rental_data, paymen
         'subject': subject
     }
     html_content = render_template('rental_payment_receipt', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'rental_payment_receipt', cursor=cursor, dedup_key=dedup_key)
 
-def send_rental_completion_email(user_email, user_name, rental_data):
+def send_rental_completion_email(user_email, user_name, rental_data, cursor=None, dedup_key=None):
     """
     Send a rental completion email when all payments are made.
     
@@ -347,6 +592,8 @@ def send_rental_completion_email(user_email, user_name, rental_data):
         user_email: User's email address
         user_name: User's first name
         rental_data: Dictionary containing rental details
+        cursor: Cursor of the transaction the email belongs to (optional)
+        dedup_key: Key that prevents the email from being queued twice (optional)
     """
     subject = f"Congratulations on Completing Your Rental #{rental_data['id']}"
     context = {
@@ -356,71 +603,151 @@ def send_rental_completion_email(user_email, user_name, rental_data):
         'subject': subject
     }
     html_content = render_template('rental_completion', context)
-    return send_email_async(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content,
+                       'rental_completion', cursor=cursor, dedup_key=dedup_key)
 
 # ---------------
 # Batch email functions for administrative purposes
 # ---------------
 
-def send_upcoming_payment_reminders(db_connection):
+def _render_payment_reminder(rental, today):
+    """Build one reminder message; runs in the render worker processes."""
+    rental = dict(rental)
+    if rental.get('total_months'):
+        rental['payment_progress'] = (rental['payments_made'] / rental['total_months']) * 100
+    else:
+        rental['payment_progress'] = 0
+    days_until_due = (rental['next_payment_date'] - today).days
+    subject, html_content = build_payment_reminder_email(rental['first_name'], rental, days_until_due)
+    return {
+        'to': rental['email'],
+        'subject': subject,
+        'html': html_content,
+        'dedup_key': f"rental_payment_reminder:{rental['id']}:{rental['next_payment_date']}"
+    }
+
+def send_upcoming_payment_reminders(db_connection, batch_size=None, render_workers=None, resume=True):
     """
     Send payment reminders for rentals with payments due in the next 7 days.
     This function would typically be called by a scheduled task/cron job.
     
+    Rentals are read in keyset order in chunks of `batch_size`. Each chunk is
+    rendered (in `render_workers` processes when set), queued to the outbox
+    and logged in email_log with bulk inserts, then committed together with a
+    checkpoint, so a run that dies part-way resumes after the last committed
+    chunk. Rentals already reminded for their current due date are skipped,
+    which makes re-runs idempotent.
+    
     Args:
         db_connection: Database connection object
+        batch_size: Rentals per chunk (defaults to REMINDER_BATCH_SIZE)
+        render_workers: Template render processes (defaults to REMINDER_RENDER_WORKERS)
+        resume: Continue after today's checkpoint if a previous run stopped early
+    
+    Returns:
+        Dictionary with the number of reminders queued, chunks committed,
+        elapsed seconds and emails per second
     """
-    cursor = db_connection.cursor(dictionary=True)
+    batch_size = batch_size or REMINDER_BATCH_SIZE
+    if render_workers is None:
+        render_workers = REMINDER_RENDER_WORKERS
     
-    # Get rentals with payments due in the next 7 days
-    upcoming_date = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+    today = date.today()
+    upcoming_date = today + timedelta(days=REMINDER_WINDOW_DAYS)
+    run_key = today.isoformat()
+    stats = {'queued': 0, 'rentals': 0, 'chunks': 0, 'elapsed': 0.0, 'emails_per_second': 0.0}
+    
+    cursor = db_connection.cursor(dictionary=True)
+    pool = ProcessPoolExecutor(max_workers=render_workers) if render_workers > 0 else None
+    start = time.monotonic()
     
     try:
-        cursor.execute("""
-            SELECT r.*, u.email, u.first_name, p.name as product_name
-            FROM rentals r
-            JOIN users u ON r.user_id = u.id
-            JOIN products p ON r.product_id = p.id
-            WHERE r.status = 'active'
-            AND r.next_payment_date <= %s
-            ORDER BY r.next_payment_date ASC
-        """, (upcoming_date,))
+        after = None
+        if resume:
+            after = load_checkpoint(cursor, PAYMENT_REMINDER_JOB, run_key, size=len(PAYMENT_REMINDER_SORT))
+            if after is not None:
+                logger.info(f"Resuming payment reminders after rental {after[1]}")
         
-        rentals = cursor.fetchall()
-        
-        for rental in rentals:
-            payment_date = datetime.strptime(str(rental['next_payment_date']), '%Y-%m-%d')
-            days_until_due = (payment_date - datetime.now()).days + 1
+        while True:
+            # Rentals due from today on, not yet reminded for this due date
+            query = """
+                SELECT r.*, u.email, u.first_name, p.name as product_name
+                FROM rentals r
+                JOIN users u ON r.user_id = u.id
+                JOIN products p ON r.product_id = p.id
+                WHERE r.status = 'active'
+                AND r.next_payment_date >= %s
+                AND r.next_payment_date <= %s
+                AND NOT EXISTS (
+                    SELECT 1 FROM email_log el
+                    WHERE el.email_type = 'rental_payment_reminder'
+                    AND el.reference_id = r.id
+                    AND el.reference_date = r.next_payment_date
+                )
+            """
+            params = [today, upcoming_date]
+            if after is not None:
+                condition, condition_params = keyset_condition(PAYMENT_REMINDER_SORT, after)
+                query += f" AND {condition}"
+                params.extend(condition_params)
+            query += f" ORDER BY {order_by_sql(PAYMENT_REMINDER_SORT)} LIMIT %s"
+            params.append(batch_size)
+            
+            cursor.execute(query, params)
+            rentals = cursor.fetchall()
+            if not rentals:
+                break
+            
+            if pool is not None:
+                chunksize = max(1, len(rentals) // (render_workers * 4))
+                messages = list(pool.map(_render_payment_reminder, rentals, repeat(today), chunksize=chunksize))
+            else:
+                messages = list(map(_render_payment_reminder, rentals, repeat(today)))
+            
+            queued = queue_emails(cursor, 'rental_payment_reminder', messages)
+            
+            cursor.executemany("""
+                INSERT IGNORE INTO email_log (
+                    user_id, email_type, reference_id, reference_date, sent_at
+                ) VALUES (%s, %s, %s, %s, NOW())
+            """, [
+                (rental['user_id'], 'rental_payment_reminder', rental['id'], rental['next_payment_date'])
+                for rental in rentals
+            ])
             
-            # Skip if payment is already overdue
-            if days_until_due < 0:
-                continue
+            last = rentals[-1]
+            after = [last['next_payment_date'], last['id']]
+            save_checkpoint(cursor, PAYMENT_REMINDER_JOB, run_key, after, len(rentals))
+            db_connection.commit()
             
-            send_rental_payment_reminder_email(
-                rental['email'],
-                rental['first_name'],
-                rental,
-                days_until_due
-            )
+            stats['queued'] += queued
+            stats['rentals'] += len(rentals)
+            stats['chunks'] += 1
             
-            # Log that reminder was sent
-            cursor.execute("""
-                INSERT INTO email_log (
-                    user_id, email_type, reference_id, sent_at
-                ) VALUES (%s, %s, %s, NOW())
-            """, (
-                rental['user_id'],
-                'rental_payment_reminder',
-                rental['id']
-            ))
+            if len(rentals) < batch_size:
+                break
         
+        # Finished: a later run starts from the beginning (and skips what was sent)
+        clear_checkpoint(cursor, PAYMENT_REMINDER_JOB, run_key)
         db_connection.commit()
         
     except Exception as e:
         logger.error(f"Error sending payment reminders: {str(e)}")
         db_connection.rollback()
+        stats['error'] = str(e)
     finally:
         cursor.close()
+        if pool is not None:
+            pool.shutdown()
+    
+    stats['elapsed'] = time.monotonic() - start
+    if stats['elapsed'] > 0:
+        stats['emails_per_second'] = stats['queued'] / stats['elapsed']
+    logger.info(
+        f"Payment reminders: {stats['queued']} queued for {stats['rentals']} rentals in "
+        f"{stats['chunks']} chunks, {stats['elapsed']:.2f}s ({stats['emails_per_second']:.1f} emails/s)"
+    )
+    return stats
 
 def send_order_update_digest(db_connection):
     """
@@ -463,28 +790,35 @@ def send_order_update_digest(db_connection):
                 }
             user_orders[user_id]['orders'].append(order)
         
-        # Send digest emails
-        for user_id, data in user_orders.items():
-            subject = f"GigGatek Order Updates"
-            context = {
-                'user_name': data['first_name'],
-                'orders': data['orders'],
-                'current_year': datetime.now().year,
-                'subject': subject
+        # Render all digests in one pass; the shared parts are rendered once
+        subject = "GigGatek Order Updates"
+        today = datetime.now().strftime('%Y-%m-%d')
+        recipients = list(user_orders.items())
+        html_contents = render_templates(
+            'order_update_digest',
+            [{'user_name': data['first_name'], 'orders': data['orders']} for _, data in recipients],
+            shared={'current_year': datetime.now().year, 'subject': subject}
+        )
+        
+        queue_emails(cursor, 'order_update_digest', [
+            {
+                'to': data['email'],
+                'subject': subject,
+                'html': html_content,
+                'dedup_key': f"order_update_digest:{user_id}:{today}"
             }
-            html_content = render_template('order_update_digest', context)
-            send_email_async(data['email'], subject, html_content)
-            
-            # Log that digest was sent
-            cursor.execute("""
-                INSERT INTO email_log (
-                    user_id, email_type, reference_id, sent_at
-                ) VALUES (%s, %s, %s, NOW())
-            """, (
-                user_id,
-                'order_update_digest',
-                None
-            ))
+            for (user_id, data), html_content in zip(recipients, html_contents)
+        ])
+        
+        # Log that digests were sent (one per user and day)
+        cursor.executemany("""
+            INSERT IGNORE INTO email_log (
+                user_id, email_type, reference_id, reference_date, sent_at
+            ) VALUES (%s, %s, %s, %s, NOW())
+        """, [
+            (user_id, 'order_update_digest', user_id, today)
+            for user_id, _ in recipients
+        ])
         
         db_connection.commit()
         
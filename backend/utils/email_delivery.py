@@ -0,0 +1,282 @@
+"""
+Bounded SMTP delivery for GigGatek emails.
+
+A fixed set of worker threads drains a bounded queue of outgoing messages.
+Each worker keeps one authenticated SMTP session open and reuses it for many
+messages, so a batch of thousands of emails costs a handful of TCP + STARTTLS
++ AUTH handshakes instead of one per email. When the queue is full, producers
+block (up to a timeout) instead of piling up threads.
+"""
+
+import ssl
+import time
+import queue
+import logging
+import smtplib
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Queue item telling a worker to exit
+_STOP = object()
+
+
+def _is_connection_error(error):
+    """True if the session is unusable (reopen and retry), False for message-level rejections."""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class EmailQueueFullError(Exception):
+    """Raised when the delivery queue stayed full for the whole submit timeout."""
+
+
+class SMTPConnection:
+    """
+    A reusable, authenticated SMTP session.
+
+    Opens lazily, is checked with NOOP after being idle, and is reopened after
+    `max_messages` messages or when the server drops it.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True,
+                 timeout=30, max_messages=100, check_after=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.check_after = check_after
+
+        self._server = None
+        self._sent_on_session = 0
+        self._last_used = 0.0
+        self.connects = 0
+
+    @property
+    def is_open(self):
+        return self._server is not None
+
+    def open(self):
+        """Connect, upgrade to TLS and log in."""
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls(context=ssl.create_default_context())
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._sent_on_session = 0
+        self._last_used = time.monotonic()
+        self.connects += 1
+
+    def close(self):
+        """Close the session politely (QUIT), ignoring errors."""
+        server, self._server = self._server, None
+        self._sent_on_session = 0
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _ensure_open(self):
+        if self._server is not None:
+            if self.max_messages and self._sent_on_session >= self.max_messages:
+                self.close()
+            elif time.monotonic() - self._last_used > self.check_after:
+                try:
+                    healthy = self._server.noop()[0] == 250
+                except Exception:
+                    healthy = False
+                if not healthy:
+                    self.close()
+        if self._server is None:
+            self.open()
+
+    def send(self, from_addr, to_addrs, message):
+        """
+        Send one message, reconnecting and retrying once if the session broke.
+
+        Args:
+            from_addr (str): Envelope sender
+            to_addrs (list): Envelope recipients
+            message (str): Serialized message
+
+        Returns:
+            dict: Refused recipients as returned by smtplib.sendmail
+        """
+        for attempt in (1, 2):
+            try:
+                self._ensure_open()
+                refused = self._server.sendmail(from_addr, to_addrs, message)
+                self._sent_on_session += 1
+                self._last_used = time.monotonic()
+                return refused
+            except Exception as e:
+                if not _is_connection_error(e):
+                    raise
+                self.close()
+                if attempt == 2:
+                    raise
+                logger.warning(f"SMTP session to {self.host} dropped, reconnecting")
+
+
+class EmailDeliveryPool:
+    """
+    Fixed-size pool of delivery workers fed by a bounded queue.
+
+    Jobs are callables that receive the worker's SMTPConnection; their return
+    value (or exception) is delivered through the Future returned by submit().
+    A job returning False or raising counts as a failed delivery.
+    """
+
+    def __init__(self, connection_factory, workers=4, queue_size=1000,
+                 submit_timeout=5.0, idle_timeout=60.0):
+        self.connection_factory = connection_factory
+        self.workers = workers
+        self.submit_timeout = submit_timeout
+        self.idle_timeout = idle_timeout
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Counters for monitoring
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def _start(self):
+        with self._lock:
+            if self._threads or self._closed:
+                return
+            for i in range(self.workers):
+                connection = self.connection_factory()
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(connection,),
+                    name=f"email-worker-{i}",
+                    daemon=True
+                )
+                self._connections.append(connection)
+                self._threads.append(thread)
+                thread.start()
+
+    def _run(self, connection):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Nothing to send for a while; don't hold the session open
+                connection.close()
+                continue
+
+            if item is _STOP:
+                connection.close()
+                self._queue.task_done()
+                return
+
+            job, future = item
+            try:
+                if future.set_running_or_notify_cancel():
+                    result = job(connection)
+                    future.set_result(result)
+                    with self._lock:
+                        if result is False:
+                            self._failed += 1
+                        else:
+                            self._completed += 1
+            except Exception as e:
+                future.set_exception(e)
+                with self._lock:
+                    self._failed += 1
+            finally:
+                self._queue.task_done()
+
+    def submit(self, job, timeout=None):
+        """
+        Queue a delivery job.
+
+        Blocks while the queue is full, which slows down bulk producers to the
+        rate the SMTP workers can sustain.
+
+        Args:
+            job (callable): Called with an SMTPConnection
+            timeout (float): Seconds to wait for queue space (defaults to submit_timeout)
+
+        Returns:
+            concurrent.futures.Future: Resolves to the job's return value
+
+        Raises:
+            EmailQueueFullError: If no space became available in time
+        """
+        if self._closed:
+            raise RuntimeError("Email delivery pool is shut down")
+        self._start()
+
+        future = Future()
+        try:
+            self._queue.put((job, future), timeout=self.submit_timeout if timeout is None else timeout)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise EmailQueueFullError(
+                f"Email queue is full ({self._queue.maxsize} pending messages)"
+            )
+        with self._lock:
+            self._submitted += 1
+        return future
+
+    def join(self):
+        """Block until every queued job has been processed."""
+        self._queue.join()
+
+    def shutdown(self, wait=True):
+        """Deliver queued jobs, then stop the workers and close their sessions."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(_STOP)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def stats(self):
+        """
+        Snapshot of pool usage.
+
+        Returns:
+            dict: Worker count, queue depth and job / connection counters
+        """
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'open_connections': sum(1 for c in self._connections if c.is_open),
+                'connects': sum(c.connects for c in self._connections)
+            }
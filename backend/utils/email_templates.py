@@ -0,0 +1,168 @@
+"""
+Compiled email templates for GigGatek.
+
+Templates are compiled once per process and kept in memory; the compiled
+bytecode is also cached on disk, so a new worker loads templates instead of
+recompiling them. File changes are only picked up when
+EMAIL_TEMPLATE_AUTO_RELOAD is enabled (development).
+
+Static parts shared by many emails (style blocks, footers, fixed status
+explanations) live in `partials/` and are rendered once per distinct
+argument set with the `fragment()` template function:
+
+    {{ fragment('order_footer', current_year=current_year) }}
+
+Batch jobs render one template for many recipients with render_many(),
+which looks the template up once and merges a shared context into each
+recipient's context.
+"""
+
+import os
+import logging
+import stat
+import threading
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates/emails')
+# Unset uses Jinja's private per-user directory (_jinja2-cache-<uid>, mode 0700);
+# empty disables the on-disk bytecode cache
+EMAIL_TEMPLATE_CACHE_DIR = os.environ.get('EMAIL_TEMPLATE_CACHE_DIR')
+EMAIL_TEMPLATE_AUTO_RELOAD = os.environ.get('EMAIL_TEMPLATE_AUTO_RELOAD', 'false').lower() == 'true'
+
+PARTIALS_DIR = 'partials'
+
+
+def _bytecode_cache(cache_dir):
+    """
+    Bytecode cache in cache_dir, or Jinja's per-user directory if None.
+
+    Cached bytecode is loaded with marshal, so a configured directory must
+    belong to this user and not be writable by anyone else.
+    """
+    if cache_dir is None:
+        # Jinja creates it with mode 0700 and checks that this user owns it
+        return FileSystemBytecodeCache()
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    info = os.stat(cache_dir)
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        raise RuntimeError('directory is owned by another user')
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise RuntimeError('directory is writable by other users')
+    return FileSystemBytecodeCache(cache_dir)
+
+
+class EmailTemplateRenderer:
+    """
+    Renders email templates from an in-memory cache of compiled templates.
+    """
+
+    def __init__(self, template_dir=EMAIL_TEMPLATE_DIR, cache_dir=EMAIL_TEMPLATE_CACHE_DIR,
+                 auto_reload=EMAIL_TEMPLATE_AUTO_RELOAD):
+        bytecode_cache = None
+        if cache_dir is None or cache_dir:
+            try:
+                bytecode_cache = _bytecode_cache(cache_dir)
+            except (OSError, RuntimeError) as e:
+                logger.warning(f"Email template bytecode cache disabled ({cache_dir or 'default'}): {e}")
+
+        self.auto_reload = auto_reload
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            bytecode_cache=bytecode_cache,
+            auto_reload=auto_reload
+        )
+        self.env.globals['fragment'] = self.fragment
+
+        self._templates = {}
+        self._fragments = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """
+        Get a compiled template.
+
+        Args:
+            name (str): Template name without the .html extension
+
+        Returns:
+            jinja2.Template: Compiled template
+        """
+        template = self._templates.get(name)
+        if template is None or (self.auto_reload and not template.is_up_to_date):
+            with self._lock:
+                template = self.env.get_template(f"{name}.html")
+                self._templates[name] = template
+        return template
+
+    def warm(self):
+        """
+        Compile (or load from the bytecode cache) every template up front.
+
+        Returns:
+            list: Names of the loaded templates
+        """
+        names = [
+            name[:-len('.html')]
+            for name in self.env.list_templates(extensions=['html'])
+        ]
+        for name in names:
+            self.get(name)
+        return names
+
+    def fragment(self, name, **context):
+        """
+        Render a partial once per distinct context and reuse the result.
+
+        Args:
+            name (str): Partial name (file in partials/ without .html)
+            **context: Values the partial needs; must be hashable
+
+        Returns:
+            Markup: Rendered fragment
+        """
+        key = (name, tuple(sorted(context.items())))
+        html = self._fragments.get(key)
+        if html is None or self.auto_reload:
+            html = Markup(self.get(f"{PARTIALS_DIR}/{name}").render(**context))
+            self._fragments[key] = html
+        return html
+
+    def render(self, name, context):
+        """
+        Render a template.
+
+        Args:
+            name (str): Template name without the .html extension
+            context (dict): Template variables
+
+        Returns:
+            str: Rendered HTML
+        """
+        return self.get(name).render(**context)
+
+    def render_many(self, name, contexts, shared=None):
+        """
+        Render one template for many recipients.
+
+        Args:
+            name (str): Template name without the .html extension
+            contexts (list): Per-recipient template variables
+            shared (dict): Variables common to every recipient
+
+        Returns:
+            list: Rendered HTML, in the order of `contexts`
+        """
+        template = self.get(name)
+        if not shared:
+            return [template.render(**context) for context in contexts]
+        return [template.render({**shared, **context}) for context in contexts]
+
+    def clear(self):
+        """Drop compiled templates and rendered fragments (e.g. after a deploy)."""
+        with self._lock:
+            self._templates.clear()
+            self._fragments.clear()
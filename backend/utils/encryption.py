@@ -1,14 +1,176 @@
 """
 Encryption utilities for GigGatek backend.
 Provides functionality for encrypting and decrypting sensitive data in the database.
+
+Values are stored as Fernet tokens made by one Fernet instance per key.
+Many rows (e.g. a user export) are handled by encrypt_rows/decrypt_rows in
+one pass, split across a process pool once a batch reaches
+PII_BATCH_PARALLEL_THRESHOLD rows. Pool workers receive the derived key, so
+they do not repeat the key derivation.
+
+Encrypted fields that need equality lookups (e.g. support finding a user by
+phone) also get a blind index: a keyed HMAC of the normalized value, stored
+in an indexed `<field>_bidx` column, so a lookup is an index seek on the
+HMAC of the search term instead of decrypting every row.
+
+Keys derived from the master key are kept in a small in-process cache keyed
+by a fingerprint of the master key and the salt, so building another
+DatabaseEncryption does not repeat 100,000 PBKDF2 rounds. Hashes of
+sensitive values are never cached. hash_sensitive_data stores its iteration count with each
+hash, so SENSITIVE_HASH_ITERATIONS can change without invalidating older
+hashes, which verify_and_upgrade_hashed_data re-hashes at the current cost.
 """
 
 import os
+import hmac
 import base64
 import hashlib
+import binascii
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+# Batches at least this large are encrypted/decrypted on the process pool
+PII_BATCH_PARALLEL_THRESHOLD = int(os.environ.get('PII_BATCH_PARALLEL_THRESHOLD', 20000))
+# Processes in the pool; 1 or less keeps batches in the calling process
+PII_BATCH_WORKERS = int(os.environ.get('PII_BATCH_WORKERS', os.cpu_count() or 1))
+# Rows sent to a pool worker at a time
+PII_BATCH_CHUNK_SIZE = int(os.environ.get('PII_BATCH_CHUNK_SIZE', 5000))
+# PBKDF2 rounds of new hash_sensitive_data hashes (stored with each hash)
+SENSITIVE_HASH_ITERATIONS = int(os.environ.get('SENSITIVE_HASH_ITERATIONS', 100000))
+# Rounds assumed for hashes stored before the count was recorded
+LEGACY_HASH_ITERATIONS = 100000
+# Derived keys kept in memory by derive_key
+KEY_DERIVATION_CACHE_SIZE = int(os.environ.get('KEY_DERIVATION_CACHE_SIZE', 1024))
+# Key of the blind index HMAC; derived from the encryption key if unset
+DB_BLIND_INDEX_KEY = os.environ.get('DB_BLIND_INDEX_KEY')
+# Bytes of the HMAC kept; stored as hex in CHAR(2 * BLIND_INDEX_BYTES) columns
+BLIND_INDEX_BYTES = 16
+
+# Fields with a `<field>_bidx` blind index column, per table
+BLIND_INDEXED_FIELDS = {
+    'users': ('first_name', 'last_name', 'phone')
+}
+
+class DerivedKeyCache:
+    """
+    LRU cache of PBKDF2-HMAC-SHA256 results.
+
+    Entries are keyed by (secret id, salt, iterations, length), where the
+    secret id is an HMAC of the secret under a key generated per process,
+    so the cache holds neither the secrets nor unkeyed hashes of them.
+    """
+
+    def __init__(self, max_entries=KEY_DERIVATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._id_key = os.urandom(32)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def secret_id(self, secret):
+        return hmac.new(self._id_key, secret, hashlib.sha256).digest()
+
+    def derive(self, secret, salt, iterations, length=32):
+        """
+        PBKDF2-HMAC-SHA256 of a secret, from the cache when possible.
+
+        Args:
+            secret (bytes): Master key or value to derive from
+            salt (bytes): Salt
+            iterations (int): PBKDF2 rounds
+            length (int): Bytes to derive
+
+        Returns:
+            bytes: Derived key
+        """
+        cache_key = (self.secret_id(secret), salt, iterations, length)
+        with self._lock:
+            derived = self._entries.get(cache_key)
+            if derived is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return derived
+            self.misses += 1
+        # Derive outside the lock; a concurrent miss on the same key just derives twice
+        derived = hashlib.pbkdf2_hmac('sha256', secret, salt, iterations, length)
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[cache_key] = derived
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return derived
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+derived_keys = DerivedKeyCache()
+
+def derive_key(secret, salt, iterations, length=32):
+    """PBKDF2-HMAC-SHA256 through the shared derived key cache."""
+    return derived_keys.derive(secret, salt, iterations, length)
+
+
+def _normalize_text(value):
+    return ' '.join(value.split()).casefold()
+
+def _normalize_digits(value):
+    return ''.join(c for c in value if c.isdigit())
+
+# How values are normalized before indexing, so lookups match however they were typed
+BLIND_INDEX_NORMALIZERS = {
+    'phone': _normalize_digits
+}
+
+
+class BlindIndex:
+    """
+    Deterministic keyed hashes of field values for equality lookups.
+
+    Unlike hash_sensitive_data there is no per-value salt or key stretching:
+    the same value always gives the same index, and the secret key (not the
+    iteration count) is what stops the index being brute-forced from a
+    database dump. The field name is part of the HMAC input, so equal values
+    in different columns cannot be correlated.
+    """
+
+    def __init__(self, key, length=BLIND_INDEX_BYTES):
+        """
+        Args:
+            key (bytes): HMAC key, kept separate from the encryption key
+            length (int): Bytes of the HMAC to keep
+        """
+        self._hmac = hmac.new(key, digestmod=hashlib.sha256)
+        self.length = length
+
+    def compute(self, field, value):
+        """
+        Blind index of a value.
+
+        Args:
+            field (str): Field the value belongs to; selects the normalization
+            value: Value to index
+
+        Returns:
+            str: Hex index, or None if the value is None or normalizes to nothing
+        """
+        if value is None:
+            return None
+        normalize = BLIND_INDEX_NORMALIZERS.get(field, _normalize_text)
+        value = normalize(str(value))
+        if not value:
+            return None
+        mac = self._hmac.copy()
+        mac.update(field.encode('utf-8') + b'\x00' + value.encode('utf-8'))
+        return mac.hexdigest()[:self.length * 2]
+
 
 class DatabaseEncryption:
     """
@@ -39,8 +201,28 @@ class DatabaseEncryption:
             master_key = master_key.encode('utf-8')
         
         # Derive encryption key from master key
-        self.encryption_key = self._derive_key(master_key)
-        self.cipher_suite = Fernet(self.encryption_key)
+        self._set_key(self._derive_key(master_key))
+    
+    @classmethod
+    def from_key(cls, encryption_key):
+        """
+        Create an instance from an already derived key (skips PBKDF2).
+        
+        Args:
+            encryption_key: Fernet key as returned by _derive_key
+        """
+        instance = cls.__new__(cls)
+        instance._set_key(encryption_key)
+        return instance
+    
+    def _set_key(self, encryption_key):
+        self.encryption_key = encryption_key
+        self.cipher_suite = Fernet(encryption_key)
+        self.blind_index = BlindIndex(self._blind_index_key(encryption_key))
+        self._pool = None
+        self._pool_pid = None
+        self._pool_workers = None
+        self._pool_lock = threading.Lock()
     
     def _generate_key(self):
         """Generate a random key (for development use only)."""
@@ -62,15 +244,21 @@ class DatabaseEncryption:
         # In production, salt should be stored securely and consistently
         salt = b'giggatek_salt_should_be_changed_in_production'
         
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(master_key))
+        # Same PBKDF2-HMAC-SHA256 as before; cached so further instances skip it
+        key = base64.urlsafe_b64encode(derive_key(master_key, salt, 100000))
         return key
     
+    def _blind_index_key(self, encryption_key):
+        """
+        Key for blind indexes: DB_BLIND_INDEX_KEY, or one derived from the
+        encryption key with HMAC, so it cannot be used to recover that key.
+        """
+        if DB_BLIND_INDEX_KEY:
+            return DB_BLIND_INDEX_KEY.encode('utf-8')
+        return hmac.new(
+            base64.urlsafe_b64decode(encryption_key), b'giggatek blind index', hashlib.sha256
+        ).digest()
+    
     def encrypt(self, data):
         """
         Encrypt data for storage in the database.
@@ -116,6 +304,105 @@ class DatabaseEncryption:
         
         # Return as string
         return decrypted_data.decode('utf-8')
+    
+    def encrypt_rows(self, rows, fields, workers=None):
+        """
+        Encrypt fields of many rows.
+        
+        Args:
+            rows: List of dictionaries
+            fields: Names of the fields to encrypt; missing or None values are left as they are
+            workers: Processes to use; None uses the pool for batches of at
+                least PII_BATCH_PARALLEL_THRESHOLD rows, 0 never does
+            
+        Returns:
+            List of new dictionaries with the fields encrypted, in the same order
+        """
+        return self._map_rows(_encrypt_chunk, self._encrypt_rows, rows, fields, workers)
+    
+    def decrypt_rows(self, rows, fields, workers=None):
+        """
+        Decrypt fields of many rows (see encrypt_rows).
+        
+        Returns:
+            List of new dictionaries with the fields decrypted, in the same order
+        """
+        return self._map_rows(_decrypt_chunk, self._decrypt_rows, rows, fields, workers)
+    
+    def _encrypt_rows(self, rows, fields):
+        encrypt = self.cipher_suite.encrypt
+        b64encode = base64.b64encode
+        result = []
+        for row in rows:
+            row = dict(row)
+            for field in fields:
+                value = row.get(field)
+                if value is not None:
+                    row[field] = b64encode(encrypt(str(value).encode('utf-8'))).decode('ascii')
+            result.append(row)
+        return result
+    
+    def _decrypt_rows(self, rows, fields):
+        decrypt = self.cipher_suite.decrypt
+        b64decode = base64.b64decode
+        result = []
+        for row in rows:
+            row = dict(row)
+            for field in fields:
+                value = row.get(field)
+                if value is not None:
+                    if isinstance(value, str):
+                        value = b64decode(value)
+                    row[field] = decrypt(value).decode('utf-8')
+            result.append(row)
+        return result
+    
+    def _map_rows(self, chunk_func, serial_func, rows, fields, workers):
+        rows = list(rows)
+        fields = list(fields)
+        if workers is None:
+            workers = PII_BATCH_WORKERS if len(rows) >= PII_BATCH_PARALLEL_THRESHOLD else 0
+        if workers <= 1 or len(rows) <= PII_BATCH_CHUNK_SIZE:
+            return serial_func(rows, fields)
+        
+        chunks = [
+            (rows[i:i + PII_BATCH_CHUNK_SIZE], fields)
+            for i in range(0, len(rows), PII_BATCH_CHUNK_SIZE)
+        ]
+        result = []
+        for chunk in self._executor(workers).map(chunk_func, chunks):
+            result.extend(chunk)
+        return result
+    
+    def _executor(self, workers):
+        with self._pool_lock:
+            # A pool inherited across fork or sized differently is replaced
+            if (self._pool is None or self._pool_pid != os.getpid()
+                    or self._pool_workers != workers):
+                if self._pool is not None and self._pool_pid == os.getpid():
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker, initargs=(self.encryption_key,)
+                )
+                self._pool_pid = os.getpid()
+                self._pool_workers = workers
+            return self._pool
+
+
+# Per-process instance of pool workers, created from the parent's derived key
+_worker_encryption = None
+
+def _init_worker(encryption_key):
+    global _worker_encryption
+    _worker_encryption = DatabaseEncryption.from_key(encryption_key)
+
+def _encrypt_chunk(args):
+    rows, fields = args
+    return _worker_encryption._encrypt_rows(rows, fields)
+
+def _decrypt_chunk(args):
+    rows, fields = args
+    return _worker_encryption._decrypt_rows(rows, fields)
 
 # Create a singleton instance
 db_encryption = DatabaseEncryption()
@@ -129,16 +416,82 @@ def decrypt_data(encrypted_data):
     """Decrypt data retrieved from database."""
     return db_encryption.decrypt(encrypted_data)
 
-def hash_sensitive_data(data, salt=None):
+def encrypt_rows(rows, pii_fields, workers=None):
+    """Encrypt PII fields of many rows (see DatabaseEncryption.encrypt_rows)."""
+    return db_encryption.encrypt_rows(rows, pii_fields, workers)
+
+def decrypt_rows(rows, pii_fields, workers=None):
+    """Decrypt PII fields of many rows (see DatabaseEncryption.decrypt_rows)."""
+    return db_encryption.decrypt_rows(rows, pii_fields, workers)
+
+def blind_index(value, field):
+    """Blind index of a field value (see BlindIndex.compute)."""
+    return db_encryption.blind_index.compute(field, value)
+
+def blind_index_columns(data, fields):
+    """
+    Blind index columns for the fields present in a data dictionary.
+    
+    Args:
+        data: Dictionary of plaintext values
+        fields: Names of the indexed fields
+        
+    Returns:
+        Dictionary of `<field>_bidx` column names to index values
+    """
+    compute = db_encryption.blind_index.compute
+    return {f"{field}_bidx": compute(field, data[field]) for field in fields if field in data}
+
+def blind_index_condition(table, field, value):
+    """
+    SQL condition matching rows whose field equals a value.
+    
+    Args:
+        table: Table name (a key of BLIND_INDEXED_FIELDS)
+        field: Indexed field to match
+        value: Plaintext value to look up
+        
+    Returns:
+        Tuple of (condition, params) for a WHERE clause
+        
+    Raises:
+        ValueError: If the field has no blind index
+    """
+    if field not in BLIND_INDEXED_FIELDS.get(table, ()):
+        raise ValueError(f"{table}.{field} has no blind index")
+    return f"`{field}_bidx` = %s", [blind_index(value, field)]
+
+def find_by_blind_index(cursor, table, field, value, columns=('id',)):
+    """
+    Find rows by an encrypted field without decrypting them.
+    
+    Args:
+        cursor: Database cursor
+        table: Table name (a key of BLIND_INDEXED_FIELDS)
+        field: Indexed field to match
+        value: Plaintext value to look up
+        columns: Columns to select
+        
+    Returns:
+        List of matching rows
+    """
+    condition, params = blind_index_condition(table, field, value)
+    if params[0] is None:
+        return []
+    cursor.execute(f"SELECT {', '.join(columns)} FROM `{table}` WHERE {condition}", params)
+    return cursor.fetchall()
+
+def hash_sensitive_data(data, salt=None, iterations=None):
     """
     Create a one-way hash of sensitive data (like SSN, for matching without storing).
     
     Args:
         data: The data to hash
         salt: Optional salt to use (will generate one if not provided)
+        iterations: PBKDF2 rounds (default: SENSITIVE_HASH_ITERATIONS)
         
     Returns:
-        dict with 'hash' and 'salt' keys
+        dict with 'hash', 'salt' and 'iterations' keys
     """
     if data is None:
         return None
@@ -153,15 +506,19 @@ def hash_sensitive_data(data, salt=None):
     elif isinstance(salt, str):
         salt = salt.encode('utf-8')
     
+    if iterations is None:
+        iterations = SENSITIVE_HASH_ITERATIONS
+    
     # Create hash
-    hash_obj = hashlib.pbkdf2_hmac('sha256', data, salt, 100000)
+    hash_obj = hashlib.pbkdf2_hmac('sha256', data, salt, iterations)
     
     return {
         'hash': base64.b64encode(hash_obj).decode('utf-8'),
-        'salt': base64.b64encode(salt).decode('utf-8')
+        'salt': base64.b64encode(salt).decode('utf-8'),
+        'iterations': iterations
     }
 
-def verify_hashed_data(data, stored_hash, stored_salt):
+def verify_hashed_data(data, stored_hash, stored_salt, iterations=None):
     """
     Verify if provided data matches the stored hash.
     
@@ -169,6 +526,8 @@ def verify_hashed_data(data, stored_hash, stored_salt):
         data: The data to verify
         stored_hash: The previously stored hash (base64 string)
         stored_salt: The salt used for hashing (base64 string)
+        iterations: Rounds stored with the hash; None for hashes stored
+            before they were recorded (LEGACY_HASH_ITERATIONS)
         
     Returns:
         True if the data matches the hash, False otherwise
@@ -180,15 +539,43 @@ def verify_hashed_data(data, stored_hash, stored_salt):
     if isinstance(data, str):
         data = data.encode('utf-8')
     
-    # Decode salt
-    salt = base64.b64decode(stored_salt)
+    # Decode salt and hash
+    try:
+        salt = base64.b64decode(stored_salt)
+        expected = base64.b64decode(stored_hash)
+    except (TypeError, binascii.Error):
+        return False
     
-    # Create hash with same salt
-    hash_obj = hashlib.pbkdf2_hmac('sha256', data, salt, 100000)
-    new_hash = base64.b64encode(hash_obj).decode('utf-8')
+    # Create hash with same salt and cost
+    hash_obj = hashlib.pbkdf2_hmac('sha256', data, salt, iterations or LEGACY_HASH_ITERATIONS, len(expected) or 32)
     
-    # Compare hashes
-    return new_hash == stored_hash
+    # Compare hashes in constant time
+    return hmac.compare_digest(hash_obj, expected)
+
+def hashed_data_needs_upgrade(iterations):
+    """Whether a hash stored with this many rounds should be re-hashed at the current cost."""
+    return (iterations or LEGACY_HASH_ITERATIONS) != SENSITIVE_HASH_ITERATIONS
+
+def verify_and_upgrade_hashed_data(data, stored_hash, stored_salt, iterations=None):
+    """
+    Verify data against a stored hash and re-hash it if its cost is outdated.
+    
+    Args:
+        data: The data to verify
+        stored_hash: The previously stored hash (base64 string)
+        stored_salt: The salt used for hashing (base64 string)
+        iterations: Rounds stored with the hash (None for legacy hashes)
+        
+    Returns:
+        Tuple of (matches, new_hash) where new_hash is the dict from
+        hash_sensitive_data to store in place of the old hash, or None if
+        the data does not match or the hash is current
+    """
+    if not verify_hashed_data(data, stored_hash, stored_salt, iterations):
+        return False, None
+    if not hashed_data_needs_upgrade(iterations):
+        return True, None
+    return True, hash_sensitive_data(data)
 
 # PII field encryption/decryption
 def encrypt_pii_fields(data, pii_fields):
@@ -205,12 +592,7 @@ def encrypt_pii_fields(data, pii_fields):
     if not data or not pii_fields:
         return data
     
-    encrypted_data = data.copy()
-    for field in pii_fields:
-        if field in encrypted_data and encrypted_data[field] is not None:
-            encrypted_data[field] = encrypt_data(str(encrypted_data[field]))
-    
-    return encrypted_data
+    return db_encryption._encrypt_rows([data], pii_fields)[0]
 
 def decrypt_pii_fields(data, pii_fields):
     """
@@ -226,9 +608,4 @@ def decrypt_pii_fields(data, pii_fields):
     if not data or not pii_fields:
         return data
     
-    decrypted_data = data.copy()
-    for field in pii_fields:
-        if field in decrypted_data and decrypted_data[field] is not None:
-            decrypted_data[field] = decrypt_data(decrypted_data[field])
-    
-    return decrypted_data
+    return db_encryption._decrypt_rows([data], pii_fields)[0]
@@ -0,0 +1,297 @@
+"""
+CIDR-aware IP blocklist for GigGatek backend.
+
+Blocked networks (IPv4 and IPv6, any prefix length) are kept in one binary
+prefix trie per address family, so a lookup walks at most as many nodes as
+the longest blocked prefix no matter how many ranges are blocked, and a /16
+is one entry rather than 65,536 addresses.
+
+Ranges listed in IP_BLOCKLIST_FILE are loaded into every worker at startup.
+Bans added at runtime (blacklist/temp_blacklist) are written to the
+IP_BLOCKLIST_KEY sorted set in Redis, scored by expiry (+inf for permanent
+bans), and every worker reloads that set at most every IP_BLOCKLIST_REFRESH
+seconds, so a ban made by one worker applies to all of them.
+"""
+
+import os
+import time
+import logging
+import ipaddress
+import threading
+
+logger = logging.getLogger(__name__)
+
+# File of ranges to block permanently, one IP or CIDR per line ('#' starts a comment)
+IP_BLOCKLIST_FILE = os.environ.get('IP_BLOCKLIST_FILE')
+# Seconds between reloads of bans shared through Redis
+IP_BLOCKLIST_REFRESH = float(os.environ.get('IP_BLOCKLIST_REFRESH', 5))
+IP_BLOCKLIST_KEY = "ipblock:bans"
+
+PERMANENT = float('inf')
+
+
+def parse_network(value):
+    """
+    Parse an IP address or CIDR range.
+
+    IPv4-mapped IPv6 ranges (::ffff:0:0/96 and below) are converted to IPv4
+    so they match the clients they describe.
+
+    Args:
+        value (str): e.g. '203.0.113.7', '198.51.100.0/24' or '2001:db8::/32'
+
+    Returns:
+        IPv4Network or IPv6Network
+
+    Raises:
+        ValueError: If the value is not an address or range
+    """
+    network = ipaddress.ip_network(value.strip(), strict=False)
+    if network.version == 6 and network.prefixlen >= 96 and network.network_address.ipv4_mapped:
+        network = ipaddress.ip_network(
+            f"{network.network_address.ipv4_mapped}/{network.prefixlen - 96}"
+        )
+    return network
+
+
+def _address(ip):
+    address = ipaddress.ip_address(ip)
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+class PrefixTrie:
+    """
+    Binary trie of networks of one address family, each with an expiry.
+
+    Nodes are [child for bit 0, child for bit 1, expires_at or None].
+    """
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.root = [None, None, None]
+        self.size = 0
+
+    def insert(self, network, expires_at=PERMANENT):
+        """Block a network until expires_at; a longer existing ban is kept."""
+        node = self.root
+        address = int(network.network_address)
+        for shift in range(self.bits - 1, self.bits - 1 - network.prefixlen, -1):
+            bit = (address >> shift) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            self.size += 1
+            node[2] = expires_at
+        else:
+            node[2] = max(node[2], expires_at)
+
+    def remove(self, network):
+        """Unblock exactly this network (not narrower or wider ones)."""
+        node = self.root
+        address = int(network.network_address)
+        for shift in range(self.bits - 1, self.bits - 1 - network.prefixlen, -1):
+            node = node[(address >> shift) & 1]
+            if node is None:
+                return False
+        if node[2] is None:
+            return False
+        node[2] = None
+        self.size -= 1
+        return True
+
+    def match(self, address, now):
+        """
+        Latest expiry among active bans covering an address.
+
+        Args:
+            address (int): Address as an integer
+            now (float): Current Unix time
+
+        Returns:
+            float: PERMANENT or the Unix time the ban ends, or None if not blocked
+        """
+        node = self.root
+        found = node[2] if node[2] is not None and node[2] > now else None
+        shift = self.bits - 1
+        while shift >= 0:
+            node = node[(address >> shift) & 1]
+            if node is None:
+                break
+            expires_at = node[2]
+            if expires_at is not None and expires_at > now:
+                if expires_at == PERMANENT:
+                    return PERMANENT
+                found = max(found or 0, expires_at)
+            shift -= 1
+        return found
+
+
+def _new_tries():
+    return {4: PrefixTrie(32), 6: PrefixTrie(128)}
+
+
+class IPBlocklist:
+    """
+    Blocked IPv4/IPv6 networks, permanent or temporary, shared across workers.
+    """
+
+    def __init__(self, client=None, refresh_interval=IP_BLOCKLIST_REFRESH):
+        """
+        Args:
+            client: Redis client; None keeps runtime bans in this process only
+            refresh_interval (float): Seconds between reloads of shared bans
+        """
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self._static = _new_tries()  # From files; never reloaded
+        self._shared = _new_tries()  # Runtime bans, rebuilt from Redis
+        self._unsynced = {}  # network -> expires_at of bans whose Redis write failed
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def load(self, lines):
+        """
+        Block every range in an iterable of lines permanently.
+
+        Args:
+            lines: Strings with one IP or CIDR each; blank lines and '#' comments are skipped
+
+        Returns:
+            int: Number of ranges loaded
+        """
+        loaded = 0
+        for number, line in enumerate(lines, 1):
+            value = line.split('#', 1)[0].strip()
+            if not value:
+                continue
+            try:
+                network = parse_network(value)
+            except ValueError:
+                logger.warning(f"Skipping invalid blocklist entry on line {number}: {value}")
+                continue
+            # Lookups running meanwhile just do not see the new range yet
+            self._static[network.version].insert(network)
+            loaded += 1
+        return loaded
+
+    def load_file(self, path):
+        """Block every range listed in a file; returns the number loaded."""
+        with open(path) as f:
+            loaded = self.load(f)
+        logger.info(f"Loaded {loaded} blocked IP ranges from {path}")
+        return loaded
+
+    def block(self, network, duration=None):
+        """
+        Block an address or range on every worker.
+
+        Args:
+            network (str): IP or CIDR
+            duration (float): Seconds to block for; None blocks permanently
+
+        Raises:
+            ValueError: If network is not an address or range
+        """
+        network = parse_network(network)
+        expires_at = PERMANENT if duration is None else time.time() + duration
+        with self._lock:
+            self._shared[network.version].insert(network, expires_at)
+        if self.client is None:
+            return
+        try:
+            pipe = self.client.pipeline()
+            # GT: a shorter ban never cuts an existing longer one short
+            pipe.zadd(IP_BLOCKLIST_KEY, {str(network): '+inf' if duration is None else expires_at}, gt=True)
+            pipe.zremrangebyscore(IP_BLOCKLIST_KEY, '-inf', time.time())
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Error sharing IP ban for {network}: {e}")
+            with self._lock:
+                self._unsynced[network] = max(self._unsynced.get(network, 0), expires_at)
+
+    def unblock(self, network):
+        """Lift a runtime ban on an address or range on every worker."""
+        network = parse_network(network)
+        with self._lock:
+            self._shared[network.version].remove(network)
+            self._unsynced.pop(network, None)
+        if self.client is not None:
+            try:
+                self.client.zrem(IP_BLOCKLIST_KEY, str(network))
+            except Exception as e:
+                logger.error(f"Error lifting IP ban for {network}: {e}")
+
+    def lookup(self, ip):
+        """
+        Check an address against all blocked ranges.
+
+        Args:
+            ip (str): Client IP address
+
+        Returns:
+            float: PERMANENT or the Unix time the ban ends, or None if not blocked
+        """
+        self._refresh()
+        try:
+            address = _address(ip)
+        except ValueError:
+            return None
+        now = time.time()
+        value = int(address)
+        found = self._static[address.version].match(value, now)
+        if found == PERMANENT:
+            return found
+        shared = self._shared[address.version].match(value, now)
+        if shared is None:
+            return found
+        return shared if found is None else max(found, shared)
+
+    def _refresh(self):
+        if self.client is None:
+            return
+        refreshed_at = self._refreshed_at
+        if refreshed_at is not None and time.monotonic() - refreshed_at < self.refresh_interval:
+            return
+        # One thread reloads; the others keep using the current tries
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._refreshed_at = time.monotonic()
+            now = time.time()
+            members = self.client.zrangebyscore(IP_BLOCKLIST_KEY, now, '+inf', withscores=True)
+            tries = _new_tries()
+            for member, expires_at in members:
+                network = parse_network(member.decode('utf-8') if isinstance(member, bytes) else member)
+                tries[network.version].insert(network, expires_at)
+            for network, expires_at in list(self._unsynced.items()):
+                if expires_at > now:
+                    tries[network.version].insert(network, expires_at)
+                else:
+                    del self._unsynced[network]
+            self._shared = tries
+        except Exception as e:
+            logger.warning(f"Error loading shared IP bans: {e}")
+        finally:
+            self._lock.release()
+
+    # Names used by check_ip_blacklist and earlier callers
+    def is_blacklisted(self, ip):
+        """Check if an IP is permanently blacklisted."""
+        return self.lookup(ip) == PERMANENT
+
+    def is_temp_blacklisted(self, ip):
+        """Check if an IP is temporarily blacklisted."""
+        expires_at = self.lookup(ip)
+        return expires_at is not None and expires_at != PERMANENT
+
+    def blacklist(self, ip):
+        """Permanently blacklist an IP or range."""
+        self.block(ip)
+
+    def temp_blacklist(self, ip, duration):
+        """Temporarily blacklist an IP or range for a specific duration (in seconds)."""
+        self.block(ip, duration)
+
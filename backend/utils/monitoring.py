@@ -11,7 +11,7 @@ import logging
 import json
 from functools import wraps
 from flask import request, g
-from prometheus_client import Counter, Histogram, Gauge, push_to_gateway
+from prometheus_client import Counter, Histogram, Gauge, push_to_gateway, REGISTRY
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -73,6 +73,144 @@ rental_contract_errors_total = Counter(
     ['error_type']
 )
 
+class DBPoolCollector:
+    """
+    Prometheus collector exposing the MySQL connection pool of this process.
+
+    Values are read from the pool at scrape time, so every gunicorn worker
+    reports its own pool (distinguished by the `pid` label).
+    """
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+        from .db import get_pool_stats
+
+        stats = get_pool_stats()
+        pid = str(stats['pid'])
+
+        connections = GaugeMetricFamily(
+            'db_pool_connections',
+            'Database pool connections by state',
+            labels=['pid', 'state']
+        )
+        connections.add_metric([pid, 'in_use'], stats['in_use'])
+        connections.add_metric([pid, 'idle'], stats['idle'])
+        yield connections
+
+        limit = GaugeMetricFamily(
+            'db_pool_max_connections',
+            'Maximum pooled connections (size + overflow)',
+            labels=['pid']
+        )
+        limit.add_metric([pid], stats['size'] + stats['max_overflow'])
+        yield limit
+
+        for name, doc, key in (
+            ('db_pool_checkouts', 'Total connection checkouts', 'checkouts'),
+            ('db_pool_waits', 'Checkouts that had to wait for a free connection', 'waits'),
+            ('db_pool_wait_seconds', 'Total time spent waiting for a connection', 'wait_time_total'),
+            ('db_pool_timeouts', 'Checkouts that timed out', 'timeouts'),
+            ('db_pool_connections_created', 'Connections opened by the pool', 'connections_created'),
+            ('db_pool_connections_recycled', 'Connections replaced after max lifetime', 'connections_recycled'),
+            ('db_pool_failed_pings', 'Connections discarded by the borrow health check', 'failed_pings'),
+        ):
+            counter = CounterMetricFamily(name, doc, labels=['pid'])
+            counter.add_metric([pid], stats[key])
+            yield counter
+
+        max_wait = GaugeMetricFamily(
+            'db_pool_wait_seconds_max',
+            'Longest wait for a connection since start',
+            labels=['pid']
+        )
+        max_wait.add_metric([pid], stats['wait_time_max'])
+        yield max_wait
+
+class CacheCollector:
+    """
+    Prometheus collector exposing per-tier hit statistics of backend.utils.cache.
+
+    L1 is the in-process LRU of this worker, L2 is Redis.
+    """
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+        from .cache import get_cache_stats
+
+        stats = get_cache_stats()
+        pid = str(os.getpid())
+
+        requests_total = CounterMetricFamily(
+            'cache_requests',
+            'Cache lookups by tier and result',
+            labels=['pid', 'tier', 'result']
+        )
+        for tier in ('l1', 'l2'):
+            requests_total.add_metric([pid, tier, 'hit'], stats[f'{tier}_hits'])
+            requests_total.add_metric([pid, tier, 'miss'], stats[f'{tier}_misses'])
+        yield requests_total
+
+        hit_ratio = GaugeMetricFamily(
+            'cache_hit_ratio',
+            'Cache hit ratio by tier (L2 relative to L1 misses)',
+            labels=['pid', 'tier']
+        )
+        hit_ratio.add_metric([pid, 'l1'], stats['l1_hit_ratio'])
+        hit_ratio.add_metric([pid, 'l2'], stats['l2_hit_ratio'])
+        yield hit_ratio
+
+        l1_size = GaugeMetricFamily(
+            'cache_l1_size',
+            'In-process cache size',
+            labels=['pid', 'unit']
+        )
+        l1_size.add_metric([pid, 'entries'], stats['l1_entries'])
+        l1_size.add_metric([pid, 'bytes'], stats['l1_bytes'])
+        yield l1_size
+
+class EmailDeliveryCollector:
+    """
+    Prometheus collector exposing the email delivery queue of this process.
+    """
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+        from .email import get_email_delivery_stats
+
+        stats = get_email_delivery_stats()
+        pid = str(stats['pid'])
+
+        for name, doc, key in (
+            ('email_queue_depth', 'Emails waiting for a delivery worker', 'queue_size'),
+            ('email_queue_capacity', 'Maximum queued emails before producers block', 'queue_capacity'),
+            ('email_smtp_sessions_open', 'Open SMTP sessions held by delivery workers', 'open_connections'),
+        ):
+            gauge = GaugeMetricFamily(name, doc, labels=['pid'])
+            gauge.add_metric([pid], stats[key])
+            yield gauge
+
+        jobs = CounterMetricFamily(
+            'email_deliveries',
+            'Email delivery jobs by result',
+            labels=['pid', 'result']
+        )
+        jobs.add_metric([pid, 'sent'], stats['completed'])
+        jobs.add_metric([pid, 'failed'], stats['failed'])
+        jobs.add_metric([pid, 'rejected'], stats['rejected'])
+        yield jobs
+
+        connects = CounterMetricFamily(
+            'email_smtp_connects',
+            'SMTP sessions opened (connect + STARTTLS + login)',
+            labels=['pid']
+        )
+        connects.add_metric([pid], stats['connects'])
+        yield connects
+
+REGISTRY.register(DBPoolCollector())
+REGISTRY.register(CacheCollector())
+REGISTRY.register(EmailDeliveryCollector())
+
 def http_metrics_middleware():
     """
     Flask middleware to record HTTP request metrics
@@ -314,6 +452,20 @@ def update_active_users(role, count):
     """
     active_users_gauge.labels(role=role).set(count)
 
+def log_db_pool_stats():
+    """
+    Log a structured snapshot of this worker's database connection pool
+    """
+    from .db import get_pool_stats
+
+    stats = get_pool_stats()
+    logger.info(
+        f"DB pool: {stats['in_use']} in use, {stats['idle']} idle, "
+        f"avg wait {stats['wait_time_avg']*1000:.2f}ms",
+        extra={**stats, 'type': 'db_pool', 'timestamp': time.time()}
+    )
+    return stats
+
 def push_metrics():
     """
     Push metrics to Prometheus Pushgateway
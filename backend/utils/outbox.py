@@ -0,0 +1,308 @@
+"""
+Transactional outbox for GigGatek notifications.
+
+Emails and push notifications are not sent while handling a request. They
+are written to the `notification_outbox` table with enqueue(), using the
+cursor of the transaction that makes the order/rental change, so a
+notification exists if and only if the change was committed. A separate
+dispatcher process (backend/tools/outbox_dispatcher.py) claims due rows in
+batches, delivers them through the handler registered for their channel and
+retries failures with exponential backoff.
+
+Rows with the same dedup key are enqueued only once, so re-running a job
+(e.g. the daily payment reminders) does not notify anyone twice.
+"""
+
+import os
+import json
+import time
+import random
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .db import db_connection
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Dispatcher configuration
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 1.0))  # Seconds between polls when idle
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 300))  # Claimed rows return to the queue after this
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_BACKOFF_BASE = float(os.environ.get('OUTBOX_BACKOFF_BASE', 30))  # Doubled after every failed attempt
+OUTBOX_BACKOFF_MAX = float(os.environ.get('OUTBOX_BACKOFF_MAX', 3600))
+
+CHANNEL_EMAIL = 'email'
+CHANNEL_PUSH = 'push'
+
+# Concurrent deliveries per channel
+OUTBOX_CONCURRENCY = {
+    CHANNEL_EMAIL: int(os.environ.get('OUTBOX_EMAIL_CONCURRENCY', 4)),
+    CHANNEL_PUSH: int(os.environ.get('OUTBOX_PUSH_CONCURRENCY', 16))
+}
+
+# channel or (channel, kind) -> handler(entry); populated by register_handler
+_handlers = {}
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a handler when retrying cannot succeed; the row is marked dead."""
+
+
+def register_handler(channel, kind=None):
+    """
+    Register the delivery function for a channel.
+
+    The handler is called with the claimed row as a dict (`id`, `kind`,
+    `payload`, `attempts`). Returning means delivered; raising schedules a
+    retry, or marks the row dead for PermanentDeliveryError.
+
+    A handler registered with `kind` only receives rows of that kind and
+    takes precedence over the channel's handler.
+    """
+    def decorator(func):
+        _handlers[(channel, kind) if kind else channel] = func
+        return func
+    return decorator
+
+
+def get_handler(channel, kind):
+    """Handler for a row of the given channel and kind, or None."""
+    return _handlers.get((channel, kind)) or _handlers.get(channel)
+
+
+def enqueue(cursor, channel, kind, payload, dedup_key=None, delay=0):
+    """
+    Add a notification to the outbox as part of the caller's transaction.
+
+    The caller commits (or rolls back) together with its own changes.
+
+    Args:
+        cursor: Cursor of the transaction the notification belongs to
+        channel (str): CHANNEL_EMAIL or CHANNEL_PUSH
+        kind (str): Notification type, for logging and metrics
+        payload (dict): Data the channel handler needs to deliver it
+        dedup_key (str): Optional key; a second enqueue with the same key is ignored
+        delay (int): Seconds before the notification becomes due
+
+    Returns:
+        bool: True if a row was added, False if the dedup key already existed
+    """
+    cursor.execute("""
+        INSERT INTO notification_outbox (channel, kind, dedup_key, payload, available_at)
+        VALUES (%s, %s, %s, %s, DATE_ADD(NOW(6), INTERVAL %s SECOND))
+        ON DUPLICATE KEY UPDATE id = id
+    """, (channel, kind, dedup_key, dumps(payload).decode('utf-8'), int(delay)))
+    return cursor.rowcount == 1
+
+
+def enqueue_many(cursor, channel, kind, entries):
+    """
+    Add many notifications of one kind to the outbox in a single statement.
+
+    Args:
+        cursor: Cursor of the transaction the notifications belong to
+        channel (str): CHANNEL_EMAIL or CHANNEL_PUSH
+        kind (str): Notification type
+        entries (list): (payload, dedup_key) pairs
+
+    Returns:
+        int: Number of rows added (entries whose dedup key existed are skipped)
+    """
+    if not entries:
+        return 0
+    cursor.executemany("""
+        INSERT INTO notification_outbox (channel, kind, dedup_key, payload)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = id
+    """, [
+        (channel, kind, dedup_key, dumps(payload).decode('utf-8'))
+        for payload, dedup_key in entries
+    ])
+    return cursor.rowcount
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, with jitter so failed batches spread out."""
+    delay = min(OUTBOX_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), OUTBOX_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class OutboxDispatcher:
+    """
+    Drains the outbox: one polling loop per channel, each delivering its
+    batches on a thread pool sized by the channel's concurrency limit.
+
+    Several dispatcher processes can run side by side; rows are claimed with
+    SELECT ... FOR UPDATE SKIP LOCKED and leased for OUTBOX_LEASE_SECONDS, after
+    which rows of a crashed dispatcher are picked up again.
+    """
+
+    def __init__(self, channels=None, batch_size=OUTBOX_BATCH_SIZE, concurrency=None,
+                 poll_interval=OUTBOX_POLL_INTERVAL, worker_id=None):
+        self.channels = list(channels or OUTBOX_CONCURRENCY)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+        concurrency = dict(OUTBOX_CONCURRENCY, **(concurrency or {}))
+        self._executors = {
+            channel: ThreadPoolExecutor(max_workers=concurrency.get(channel, 4),
+                                        thread_name_prefix=f"outbox-{channel}")
+            for channel in self.channels
+        }
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the loops to exit after their current batch."""
+        self._stop.set()
+
+    def run(self):
+        """Run until stop() is called."""
+        threads = [
+            threading.Thread(target=self._loop, args=(channel,), name=f"outbox-{channel}-loop")
+            for channel in self.channels
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.close()
+
+    def close(self):
+        """Wait for in-flight deliveries and release the worker threads."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+
+    def _loop(self, channel):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once(channel)
+            except Exception as e:
+                logger.error(f"Outbox dispatcher error on channel {channel}: {e}")
+                processed = 0
+            # Keep draining while there is a backlog
+            if processed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def run_once(self, channel):
+        """
+        Claim, deliver and record one batch for a channel.
+
+        Returns:
+            int: Number of rows processed
+        """
+        entries = self._claim(channel)
+        if not entries:
+            return 0
+
+        start = time.monotonic()
+        sent, failed = [], []
+        futures = {}
+        for entry in entries:
+            handler = get_handler(channel, entry['kind'])
+            if handler is None:
+                failed.append((entry, PermanentDeliveryError(
+                    f"No handler registered for {channel} notifications of kind {entry['kind']}"
+                )))
+            else:
+                futures[self._executors[channel].submit(handler, entry)] = entry
+        wait(futures)
+
+        for future, entry in futures.items():
+            error = future.exception()
+            if error is None:
+                sent.append(entry)
+            else:
+                failed.append((entry, error))
+
+        self._record(sent, failed)
+        logger.info(f"Outbox {channel}: {len(sent)} delivered, {len(failed)} failed "
+                    f"in {time.monotonic() - start:.2f}s")
+        return len(entries)
+
+    def _claim(self, channel):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                # Rows whose lease ran out belong to a dispatcher that died mid-batch
+                cursor.execute("""
+                    UPDATE notification_outbox
+                    SET status = 'pending', locked_by = NULL, locked_until = NULL
+                    WHERE status = 'processing' AND locked_until < NOW(6) AND channel = %s
+                """, (channel,))
+
+                cursor.execute("""
+                    SELECT id, kind, payload, attempts
+                    FROM notification_outbox
+                    WHERE status = 'pending' AND channel = %s AND available_at <= NOW(6)
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """, (channel, self.batch_size))
+                entries = cursor.fetchall()
+
+                leased_at = time.monotonic()
+                if entries:
+                    placeholders = ', '.join(['%s'] * len(entries))
+                    cursor.execute(f"""
+                        UPDATE notification_outbox
+                        SET status = 'processing', attempts = attempts + 1, locked_by = %s,
+                            locked_until = DATE_ADD(NOW(6), INTERVAL %s SECOND)
+                        WHERE id IN ({placeholders})
+                    """, [self.worker_id, OUTBOX_LEASE_SECONDS] + [entry['id'] for entry in entries])
+                conn.commit()
+            finally:
+                cursor.close()
+
+        for entry in entries:
+            entry['attempts'] += 1
+            # Handlers that run long check these against their own lease
+            entry['locked_by'] = self.worker_id
+            entry['lease_deadline'] = leased_at + OUTBOX_LEASE_SECONDS
+            if isinstance(entry['payload'], (str, bytes, bytearray)):
+                entry['payload'] = json.loads(entry['payload'])
+        return entries
+
+    def _record(self, sent, failed):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if sent:
+                    placeholders = ', '.join(['%s'] * len(sent))
+                    cursor.execute(f"""
+                        UPDATE notification_outbox
+                        SET status = 'sent', sent_at = NOW(6), locked_by = NULL,
+                            locked_until = NULL, last_error = NULL
+                        WHERE id IN ({placeholders}) AND locked_by = %s
+                    """, [entry['id'] for entry in sent] + [self.worker_id])
+
+                retries, dead = [], []
+                for entry, error in failed:
+                    message = f"{type(error).__name__}: {error}"[:2000]
+                    if isinstance(error, PermanentDeliveryError) or entry['attempts'] >= OUTBOX_MAX_ATTEMPTS:
+                        dead.append((message, entry['id'], self.worker_id))
+                        logger.error(f"Outbox entry {entry['id']} ({entry['kind']}) gave up: {message}")
+                    else:
+                        retries.append((message, int(retry_delay(entry['attempts'])), entry['id'], self.worker_id))
+
+                if retries:
+                    cursor.executemany("""
+                        UPDATE notification_outbox
+                        SET status = 'pending', last_error = %s,
+                            available_at = DATE_ADD(NOW(6), INTERVAL %s SECOND),
+                            locked_by = NULL, locked_until = NULL
+                        WHERE id = %s AND locked_by = %s
+                    """, retries)
+                if dead:
+                    cursor.executemany("""
+                        UPDATE notification_outbox
+                        SET status = 'dead', last_error = %s, locked_by = NULL, locked_until = NULL
+                        WHERE id = %s AND locked_by = %s
+                    """, dead)
+                conn.commit()
+            finally:
+                cursor.close()
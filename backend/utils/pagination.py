@@ -0,0 +1,187 @@
+"""
+Keyset (cursor) pagination helpers for GigGatek list endpoints.
+
+OFFSET pagination makes MySQL read and discard every row before the requested
+page, so deep pages get linearly slower. Keyset pagination instead remembers
+the sort key of the last row returned and asks for rows strictly after it,
+which an index on the sort columns answers in constant time per page.
+
+Sort orders are described as a list of (column, direction) pairs whose last
+entry is a unique column (the primary key), so the position is unambiguous.
+Sort columns are expected to be NOT NULL in practice.
+
+Cursors are opaque to clients: URL-safe base64 of a small JSON document
+holding the sort name and the last row's key values.
+"""
+
+import os
+import json
+import base64
+import hashlib
+from decimal import Decimal
+from datetime import datetime, date
+
+from .cache import cache_fetch
+
+# Totals are expensive on large tables and rarely need to be exact, so
+# they are cached briefly per filter set
+PAGINATION_COUNT_TTL = int(os.environ.get('PAGINATION_COUNT_TTL', 60))
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor is malformed or belongs to another sort order."""
+
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return {'D': str(value)}
+    if isinstance(value, datetime):
+        return {'T': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'D' in value:
+            return Decimal(value['D'])
+        if 'T' in value:
+            return datetime.fromisoformat(value['T'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise InvalidCursorError("Unknown cursor value type")
+    return value
+
+
+def encode_cursor(values, sort=None):
+    """
+    Encode the sort key of the last row of a page as an opaque cursor.
+
+    Args:
+        values (list): Sort key values, in sort column order
+        sort (str): Name of the sort order the cursor belongs to
+
+    Returns:
+        str: URL-safe cursor token
+    """
+    payload = {'s': sort, 'k': [_encode_value(value) for value in values]}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort=None, size=None):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        token (str): Cursor token from the client
+        sort (str): Sort order the request uses; must match the cursor's
+        size (int): Expected number of key values
+
+    Returns:
+        list: Sort key values
+
+    Raises:
+        InvalidCursorError: If the token is malformed or does not match the sort
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(value) for value in payload['k']]
+    except InvalidCursorError:
+        raise
+    except Exception:
+        raise InvalidCursorError("Malformed pagination cursor")
+
+    if payload.get('s') != sort:
+        raise InvalidCursorError("Pagination cursor does not match the requested sort order")
+    if size is not None and len(values) != size:
+        raise InvalidCursorError("Malformed pagination cursor")
+    return values
+
+
+def order_by_sql(keys):
+    """Render sort keys as an ORDER BY expression (without the keyword)."""
+    return ", ".join(f"{column} {direction}" for column, direction in keys)
+
+
+def keyset_condition(keys, values):
+    """
+    Build the predicate selecting rows that sort after the given key values.
+
+    Mixed directions are supported by expanding the comparison, e.g. for
+    `is_featured DESC, product_id ASC`:
+        (is_featured < %s) OR (is_featured = %s AND product_id > %s)
+
+    Args:
+        keys (list): (column, direction) pairs
+        values (list): Key values of the last row already returned
+
+    Returns:
+        tuple: (sql, params)
+    """
+    branches = []
+    params = []
+    for i, (column, direction) in enumerate(keys):
+        parts = []
+        for prev_column, _ in keys[:i]:
+            parts.append(f"{prev_column} = %s")
+        op = '<' if direction.upper() == 'DESC' else '>'
+        parts.append(f"{column} {op} %s")
+        branches.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:i + 1])
+    return "(" + " OR ".join(branches) + ")", params
+
+
+def add_condition(where_sql, condition):
+    """Append a predicate to a WHERE clause that may be empty."""
+    return f"{where_sql} AND {condition}" if where_sql else f"WHERE {condition}"
+
+
+def key_field(column):
+    """Row field holding a sort column's value (`r.created_at` -> `created_at`)."""
+    return column.split('.')[-1]
+
+
+def paginate_rows(rows, keys, limit, sort=None):
+    """
+    Trim a keyset page and compute the cursor for the next one.
+
+    The page query should fetch `limit + 1` rows; the extra row only tells
+    whether another page exists.
+
+    Args:
+        rows (list): Rows fetched with LIMIT limit + 1
+        keys (list): (column, direction) pairs the rows are sorted by
+        limit (int): Page size
+        sort (str): Sort order name embedded in the cursor
+
+    Returns:
+        tuple: (page rows, next cursor or None)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([last[key_field(column)] for column, _ in keys], sort)
+
+
+def cached_count(namespace, where_sql, params, compute, tags=None):
+    """
+    Return a row count cached for PAGINATION_COUNT_TTL seconds per filter set.
+
+    Args:
+        namespace (str): Cache key prefix, e.g. "count:products"
+        where_sql (str): WHERE clause the count is for
+        params (list): Parameters of the WHERE clause
+        compute (callable): Runs the COUNT query and returns an int
+        tags (list): Cache tags that invalidate the count
+
+    Returns:
+        int: Row count
+    """
+    signature = hashlib.md5(
+        json.dumps([where_sql, params], default=str).encode('utf-8')
+    ).hexdigest()
+    return cache_fetch(f"{namespace}:{signature}", compute, PAGINATION_COUNT_TTL, tags=tags)
@@ -0,0 +1,190 @@
+"""
+Password hashing for GigGatek backend.
+
+bcrypt is deliberately slow (about a quarter of a second at cost 12), so it
+does not run on the request thread: hashes and checks are handed to a
+process pool of PASSWORD_HASH_WORKERS processes per web worker, which uses
+every core without holding up catalog requests served by the same worker.
+At most PASSWORD_HASH_MAX_PENDING hashes may be queued or running; beyond
+that PasswordHasherBusy is raised at once so the route can answer 503
+instead of piling up requests during a login burst.
+
+The cost factor is PASSWORD_HASH_ROUNDS. Stored hashes with a different
+cost are upgraded on the next successful login (see needs_rehash).
+"""
+
+import os
+import logging
+import threading
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor for new hashes (2^rounds iterations)
+PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', 12))
+# Hashing processes per web worker; 0 hashes on the request thread
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+# Hashes queued or running per web worker before requests are turned away
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', max(PASSWORD_HASH_WORKERS, 1) * 4))
+# Seconds a request waits for its hash before giving up
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
+# Seconds clients are asked to wait after a 503
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 2))
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing queue is full or a hash timed out."""
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def _to_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else bytes(value)
+
+
+def hash_rounds(hashed):
+    """
+    Cost factor of a bcrypt hash.
+
+    Args:
+        hashed (str or bytes): Hash such as $2b$12$...
+
+    Returns:
+        int: Cost factor, or None if the hash is not a bcrypt hash
+    """
+    parts = _to_bytes(hashed).split(b'$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """
+    Bounded bcrypt executor.
+
+    The process pool is created on first use in each process, so it is
+    never inherited across a fork (e.g. gunicorn --preload).
+    """
+
+    def __init__(self, rounds=PASSWORD_HASH_ROUNDS, workers=PASSWORD_HASH_WORKERS,
+                 max_pending=PASSWORD_HASH_MAX_PENDING, timeout=PASSWORD_HASH_TIMEOUT):
+        """
+        Args:
+            rounds (int): bcrypt cost factor for new hashes
+            workers (int): Hashing processes; 0 hashes on the calling thread
+            max_pending (int): Hashes queued or running before PasswordHasherBusy
+            timeout (float): Seconds to wait for a hash
+        """
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy(f"{self.max_pending} password hashes pending")
+
+        if self.workers <= 0:
+            try:
+                return func(*args)
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot stays taken until the hash finishes, even if the caller gave up
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            raise PasswordHasherBusy(f"Password hash took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            logger.error("Password hashing pool died, restarting it")
+            self.close(wait=False)
+            raise
+
+    def hash(self, password):
+        """
+        Hash a password with the configured cost factor.
+
+        Args:
+            password (str): Plain text password
+
+        Returns:
+            str: bcrypt hash
+
+        Raises:
+            PasswordHasherBusy: If the hashing queue is full or the hash timed out
+        """
+        return self._run(_hashpw, _to_bytes(password), self.rounds).decode('utf-8')
+
+    def verify(self, password, hashed):
+        """
+        Check a password against a stored hash.
+
+        Args:
+            password (str): Plain text password
+            hashed (str or bytes): Stored bcrypt hash
+
+        Returns:
+            bool: True if the password matches
+
+        Raises:
+            PasswordHasherBusy: If the hashing queue is full or the check timed out
+        """
+        return self._run(_checkpw, _to_bytes(password), _to_bytes(hashed))
+
+    def needs_rehash(self, hashed):
+        """True if a stored hash was made with a different cost factor."""
+        return hash_rounds(hashed) != self.rounds
+
+    def close(self, wait=True):
+        """Shut down the hashing processes; a later call starts new ones."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+password_hasher = PasswordHasher()
+
+
+def hash_password(password):
+    """Hash a password on the shared hasher (see PasswordHasher.hash)."""
+    return password_hasher.hash(password)
+
+
+def verify_password(password, hashed):
+    """Check a password on the shared hasher (see PasswordHasher.verify)."""
+    return password_hasher.verify(password, hashed)
+
+
+def needs_rehash(hashed):
+    """True if a stored hash should be upgraded to the configured cost factor."""
+    return password_hasher.needs_rehash(hashed)
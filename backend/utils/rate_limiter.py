@@ -0,0 +1,261 @@
+"""
+Rate limiting engine for GigGatek backend.
+
+Each check is a single server-side Lua script, so counting, expiry and the
+remaining/reset figures come back in one round-trip and are atomic: there is
+no window in which a key exists without a TTL. The scripts take the time from
+Redis (TIME), so app servers with skewed clocks share one timeline.
+
+Two algorithms are available per policy:
+
+- sliding_window: a log of request timestamps in a sorted set; allows
+  `limit` requests in any `period` seconds, without the burst at window
+  boundaries a fixed counter allows.
+- token_bucket: `burst` tokens (default `limit`) refilled at limit/period
+  per second; allows short bursts while enforcing the average rate.
+
+Without Redis (or if it fails) the same algorithms run in process memory,
+which only limits per worker.
+"""
+
+import os
+import math
+import time
+import uuid
+import logging
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+SLIDING_WINDOW = 'sliding_window'
+TOKEN_BUCKET = 'token_bucket'
+ALGORITHMS = (SLIDING_WINDOW, TOKEN_BUCKET)
+
+RATE_LIMIT_KEY_PREFIX = os.environ.get('RATE_LIMIT_KEY_PREFIX', 'ratelimit')
+
+# KEYS[1]: sorted set of request times (microseconds)
+# ARGV: limit, period (ms), unique member suffix
+# Returns: allowed, remaining, ms until the window has room for all, ms until the next request fits
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period_ms = tonumber(ARGV[2])
+local window = period_ms * 1000
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000000 + tonumber(t[2])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, now .. ':' .. ARGV[3])
+    count = count + 1
+    allowed = 1
+end
+redis.call('PEXPIRE', KEYS[1], period_ms)
+
+local reset = 0
+local retry = 0
+local newest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+if newest[2] then
+    reset = math.ceil((tonumber(newest[2]) + window - now) / 1000)
+end
+if allowed == 0 then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    retry = math.ceil((tonumber(oldest[2]) + window - now) / 1000)
+end
+return {allowed, limit - count, reset, retry}
+"""
+
+# KEYS[1]: hash with the token count and the time it was last updated (ms)
+# ARGV: capacity, refill rate (tokens per ms), cost
+# Returns: allowed, whole tokens left, ms until the bucket is full, ms until `cost` tokens are available
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = math.ceil((cost - tokens) / rate)
+end
+
+local reset = math.ceil((capacity - tokens) / rate)
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.max(reset, 1))
+return {allowed, math.floor(tokens), reset, retry}
+"""
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'reset', 'retry_after'])
+RateLimitResult.__doc__ = """
+Outcome of a rate limit check.
+
+`reset` is the Unix time at which the limit is fully replenished and
+`retry_after` the seconds until a rejected request would be allowed (0 if
+it was allowed).
+"""
+
+
+class RateLimitPolicy:
+    """
+    How often a route may be called per client.
+    """
+
+    def __init__(self, limit, period, algorithm=SLIDING_WINDOW, burst=None):
+        """
+        Args:
+            limit (int): Requests allowed per period
+            period (int): Period in seconds
+            algorithm (str): SLIDING_WINDOW or TOKEN_BUCKET
+            burst (int): Token bucket capacity; defaults to limit
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Rate limit algorithm must be one of: {', '.join(ALGORITHMS)}")
+        if limit <= 0 or period <= 0:
+            raise ValueError('Rate limit and period must be positive')
+        self.limit = int(limit)
+        self.period = period
+        self.algorithm = algorithm
+        self.burst = int(burst or limit)
+
+    @property
+    def capacity(self):
+        """Most requests that can be made at once."""
+        return self.burst if self.algorithm == TOKEN_BUCKET else self.limit
+
+    def __repr__(self):
+        return f"RateLimitPolicy({self.limit}, {self.period}, algorithm={self.algorithm!r}, burst={self.burst})"
+
+
+class LocalRateLimiter:
+    """
+    In-process implementation of both algorithms, used without Redis.
+
+    State lives in a store with an atomic update(key, func) (see
+    security.MemoryStore), so a check is one locked read-modify-write.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def check(self, key, policy, cost=1):
+        if policy.algorithm == TOKEN_BUCKET:
+            return self.store.update(f"tb:{key}", lambda state: self._token_bucket(state, policy, cost))
+        return self.store.update(f"sw:{key}", lambda state: self._sliding_window(state, policy))
+
+    @staticmethod
+    def _sliding_window(log, policy):
+        now = time.time()
+        log = log if log is not None else deque()
+        while log and log[0] <= now - policy.period:
+            log.popleft()
+
+        allowed = len(log) < policy.limit
+        if allowed:
+            log.append(now)
+
+        reset = log[-1] + policy.period - now if log else 0
+        retry = 0 if allowed else log[0] + policy.period - now
+        return log, policy.period, (allowed, policy.limit - len(log), reset, retry)
+
+    @staticmethod
+    def _token_bucket(state, policy, cost):
+        now = time.time()
+        rate = policy.limit / policy.period
+        tokens, updated_at = state if state is not None else (policy.burst, now)
+        tokens = min(policy.burst, tokens + (now - updated_at) * rate)
+
+        allowed = tokens >= cost
+        retry = 0
+        if allowed:
+            tokens -= cost
+        else:
+            retry = (cost - tokens) / rate
+        # A full bucket is the same as no bucket, so it can expire then
+        reset = (policy.burst - tokens) / rate
+        return (tokens, now), max(reset, 0.001), (allowed, int(tokens), reset, retry)
+
+
+class RateLimiter:
+    """
+    Checks rate limit policies against Redis, one script call per check.
+    """
+
+    def __init__(self, client, store, prefix=RATE_LIMIT_KEY_PREFIX):
+        """
+        Args:
+            client: Redis client; None limits in process memory only
+            store: In-process store for the fallback (security.MemoryStore)
+            prefix (str): Prefix of the Redis keys
+        """
+        self.client = client
+        self.prefix = prefix
+        self.local = LocalRateLimiter(store)
+        self._scripts = None
+        if client is not None:
+            # register_script uses EVALSHA and loads the script on NOSCRIPT
+            self._scripts = {
+                SLIDING_WINDOW: client.register_script(SLIDING_WINDOW_SCRIPT),
+                TOKEN_BUCKET: client.register_script(TOKEN_BUCKET_SCRIPT)
+            }
+
+    def redis_key(self, key, policy):
+        # Algorithms keep different data types, so they never share a key
+        short = 'sw' if policy.algorithm == SLIDING_WINDOW else 'tb'
+        return f"{self.prefix}:{short}:{key}"
+
+    def check(self, key, policy, cost=1):
+        """
+        Count a request against a policy.
+
+        Args:
+            key (str): Client and route the limit applies to
+            policy (RateLimitPolicy): Limit to enforce
+            cost (int): Tokens the request takes (token bucket only)
+
+        Returns:
+            RateLimitResult: Whether the request is allowed, with remaining/reset
+        """
+        result = None
+        if self._scripts is not None:
+            try:
+                result = self._check_redis(key, policy, cost)
+            except Exception as e:
+                logger.error(f"Rate limit check failed, limiting in memory: {e}")
+        if result is None:
+            allowed, remaining, reset, retry = self.local.check(key, policy, cost)
+            result = (allowed, remaining, reset * 1000, retry * 1000)
+
+        allowed, remaining, reset_ms, retry_ms = result
+        now = time.time()
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=policy.capacity,
+            remaining=max(0, int(remaining)),
+            reset=int(math.ceil(now + reset_ms / 1000)),
+            retry_after=int(math.ceil(retry_ms / 1000))
+        )
+
+    def _check_redis(self, key, policy, cost):
+        redis_key = self.redis_key(key, policy)
+        if policy.algorithm == TOKEN_BUCKET:
+            rate = policy.limit / (policy.period * 1000)  # Tokens per ms
+            return self._scripts[TOKEN_BUCKET](keys=[redis_key], args=[policy.burst, repr(rate), cost])
+        return self._scripts[SLIDING_WINDOW](
+            keys=[redis_key], args=[policy.limit, int(policy.period * 1000), uuid.uuid4().hex[:12]]
+        )
+
@@ -1,78 +1,170 @@
 """
 Security utilities for GigGatek backend.
 Includes rate limiting, IP-based throttling, and security-related helpers.
+
+Rate limits are checked by RateLimiter (see rate_limiter.py) with one Lua
+script call to Redis per request, falling back to MemoryStore per process
+when Redis is unavailable.
 """
 
+import os
 import time
+import heapq
 import threading
 import ipaddress
+from collections import OrderedDict
 from functools import wraps
-from flask import request, jsonify, current_app
-import redis
+from flask import request, jsonify, make_response
 from datetime import datetime
 
-# Shared storage for rate limiting
-# In production, this would use Redis for distributed rate limiting
-class MemoryStore:
-    def __init__(self):
-        self.storage = {}
+from .cache import redis_client
+from .rate_limiter import RateLimiter, RateLimitPolicy, SLIDING_WINDOW, TOKEN_BUCKET
+from .ip_blocklist import IPBlocklist, IP_BLOCKLIST_FILE, PERMANENT
+
+# In-process store sizing: lock stripes and the most keys kept in total
+MEMORY_STORE_STRIPES = int(os.environ.get('MEMORY_STORE_STRIPES', 64))
+MEMORY_STORE_MAX_ENTRIES = int(os.environ.get('MEMORY_STORE_MAX_ENTRIES', 100000))
+
+
+class _StoreShard:
+    """
+    One stripe of MemoryStore: an LRU of (value, expires_at) plus a heap of
+    expiry times, both guarded by the stripe's own lock.
+
+    A key gets a heap item when it is added. Extending its expiry does not
+    touch the heap; when the old item comes due it is pushed again with the
+    current expiry, so expiring costs O(log n) per due item and nothing for
+    keys that are still live.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (value, expires_at)
+        self.expiries = []  # heap of (expires_at, key)
         self.lock = threading.Lock()
-        # Clean up expired entries periodically
-        self.cleanup_interval = 300  # 5 minutes
-        self.last_cleanup = time.time()
-    
+
+    def lookup(self, key, now):
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] <= now:
+            del self.entries[key]
+            return None
+        return entry
+
+    def store(self, key, value, expires_at, now):
+        entries = self.entries
+        if key in entries:
+            entries[key] = (value, expires_at)
+            entries.move_to_end(key)
+        else:
+            entries[key] = (value, expires_at)
+            heapq.heappush(self.expiries, (expires_at, key))
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        if self.expiries and self.expiries[0][0] <= now:
+            self.expire(now)
+
+    def expire(self, now):
+        """Drop keys that have expired by `now`."""
+        expiries = self.expiries
+        entries = self.entries
+        while expiries and expiries[0][0] <= now:
+            _, key = heapq.heappop(expiries)
+            entry = entries.get(key)
+            if entry is None:
+                continue
+            if entry[1] <= now:
+                del entries[key]
+            else:
+                heapq.heappush(expiries, (entry[1], key))
+        # Items of evicted or deleted keys stay until due; drop them once they dominate
+        if len(expiries) > 2 * len(entries) + 64:
+            self.expiries = [(entry[1], key) for key, entry in entries.items()]
+            heapq.heapify(self.expiries)
+
+
+# Shared storage for rate limiting when Redis is unavailable
+class MemoryStore:
+    """
+    Thread-safe key/value store with per-key expiry.
+
+    Keys are spread over `stripes` independently locked shards by hash, so
+    concurrent requests rarely wait on each other. Expired keys are removed
+    incrementally from a heap as they come due instead of by scanning all keys,
+    and each shard holds at most max_entries / stripes keys, evicting the
+    least recently used, so a spray of new keys (e.g. one per IP) cannot grow
+    memory without bound.
+    """
+
+    def __init__(self, stripes=MEMORY_STORE_STRIPES, max_entries=MEMORY_STORE_MAX_ENTRIES):
+        self.shards = [
+            _StoreShard(max(1, max_entries // stripes)) for _ in range(stripes)
+        ]
+
+    def _shard(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
     def get(self, key):
-        with self.lock:
-            self._cleanup_if_needed()
-            entry = self.storage.get(key)
-            if entry is None or entry[1] < time.time():
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.lookup(key, time.monotonic())
+            if entry is None:
                 return None
+            shard.entries.move_to_end(key)
             return entry[0]
     
     def set(self, key, value, expiry):
-        with self.lock:
-            self._cleanup_if_needed()
-            self.storage[key] = (value, time.time() + expiry)
+        shard = self._shard(key)
+        now = time.monotonic()
+        with shard.lock:
+            shard.store(key, value, now + expiry, now)
     
     def increment(self, key, expiry):
-        with self.lock:
-            self._cleanup_if_needed()
-            entry = self.storage.get(key)
-            if entry is None or entry[1] < time.time():
-                self.storage[key] = (1, time.time() + expiry)
-                return 1
-            new_value = entry[0] + 1
-            self.storage[key] = (new_value, time.time() + expiry)
-            return new_value
+        def bump(value):
+            value = (value or 0) + 1
+            return value, expiry, value
+        return self.update(key, bump)
     
-    def _cleanup_if_needed(self):
-        now = time.time()
-        if now - self.last_cleanup > self.cleanup_interval:
-            self._cleanup()
-            self.last_cleanup = now
+    def update(self, key, func):
+        """
+        Atomically replace a key's value.
+        
+        Args:
+            key: Key to update
+            func: Called with the current value (None if missing or expired);
+                returns (new_value, expiry_seconds, result)
+        
+        Returns:
+            The result returned by func
+        """
+        shard = self._shard(key)
+        with shard.lock:
+            now = time.monotonic()
+            entry = shard.lookup(key, now)
+            new_value, expiry, result = func(None if entry is None else entry[0])
+            shard.store(key, new_value, now + expiry, now)
+            return result
     
-    def _cleanup(self):
-        now = time.time()
-        keys_to_delete = [
-            key for key, entry in self.storage.items() if entry[1] < now
-        ]
-        for key in keys_to_delete:
-            del self.storage[key]
+    def delete(self, key):
+        shard = self._shard(key)
+        with shard.lock:
+            shard.entries.pop(key, None)
+    
+    def clear(self):
+        for shard in self.shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.expiries = []
+    
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self.shards)
 
 
 # Create a global memory store for rate limiting
 memory_store = MemoryStore()
 
-# Try to use Redis if available, otherwise fall back to in-memory store
-redis_client = None
-try:
-    redis_host = current_app.config.get('REDIS_HOST', 'localhost')
-    redis_port = current_app.config.get('REDIS_PORT', 6379)
-    redis_client = redis.Redis(host=redis_host, port=redis_port, db=0)
-    # Test connection
-    redis_client.ping()
-except (redis.ConnectionError, NameError):
-    redis_client = None
+# Distributed rate limiting through the shared Redis connection (None when
+# Redis is disabled), otherwise per process through the memory store
+rate_limiter = RateLimiter(redis_client, memory_store)
 
 
 def get_client_ip():
@@ -92,7 +184,7 @@ def get_client_ip():
         return '127.0.0.1'
 
 
-def is_rate_limited(key, limit, period):
+def is_rate_limited(key, limit, period, algorithm=SLIDING_WINDOW):
     """
     Check if a key is rate limited.
     
@@ -100,28 +192,31 @@ def is_rate_limited(key, limit, period):
         key: The rate limiting key
         limit: Number of requests allowed
         period: Time period in seconds
+        algorithm: SLIDING_WINDOW or TOKEN_BUCKET
         
     Returns:
         Tuple of (is_limited, current_count, reset_time)
     """
-    if redis_client:
-        # Use Redis for distributed rate limiting
-        count_key = f"ratelimit:{key}"
-        current_count = redis_client.incr(count_key)
-        # Set expiry on first request
-        if current_count == 1:
-            redis_client.expire(count_key, period)
-        ttl = redis_client.ttl(count_key)
-        reset_time = int(time.time() + ttl)
-        return current_count > limit, current_count, reset_time
-    else:
-        # Use memory store for single-server rate limiting
-        current_count = memory_store.increment(key, period)
-        reset_time = int(time.time() + period)
-        return current_count > limit, current_count, reset_time
+    result = rate_limiter.check(key, RateLimitPolicy(limit, period, algorithm))
+    return not result.allowed, result.limit - result.remaining, result.reset
+
 
+def _set_rate_limit_headers(response, result):
+    response.headers['X-RateLimit-Limit'] = str(result.limit)
+    response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+    response.headers['X-RateLimit-Reset'] = str(result.reset)
+    if not result.allowed:
+        response.headers['Retry-After'] = str(max(1, result.retry_after))
+    return response
 
-def rate_limit(limit, period, key_func=None):
+
+def _route_policy(limit, period, algorithm, burst, policy):
+    if policy is None:
+        policy = RateLimitPolicy(limit, period, algorithm=algorithm, burst=burst)
+    return policy
+
+
+def rate_limit(limit=None, period=None, key_func=None, algorithm=SLIDING_WINDOW, burst=None, policy=None):
     """
     Rate limiting decorator.
     
@@ -129,7 +224,13 @@ def rate_limit(limit, period, key_func=None):
         limit: Number of requests allowed in the period
         period: Time period in seconds
         key_func: Function to generate the rate limit key (default: by IP)
+        algorithm: SLIDING_WINDOW (at most `limit` in any `period`) or
+            TOKEN_BUCKET (bursts of up to `burst`, `limit` per `period` on average)
+        burst: Token bucket capacity (default: limit)
+        policy: RateLimitPolicy to use instead of limit/period/algorithm/burst
     """
+    policy = _route_policy(limit, period, algorithm, burst, policy)
+    
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
@@ -141,37 +242,35 @@ def rate_limit(limit, period, key_func=None):
                 key = get_client_ip()
 
             # Check rate limit
-            is_limited, current, reset = is_rate_limited(f.__name__ + ":" + key, limit, period)
+            result = rate_limiter.check(f.__name__ + ":" + key, policy)
             
-            # Set rate limit headers
-            response = None
-            if is_limited:
+            if not result.allowed:
                 response = jsonify({
                     'error': 'Rate limit exceeded',
-                    'limit': limit,
+                    'limit': result.limit,
                     'remaining': 0,
-                    'reset': reset
+                    'reset': result.reset
                 })
                 response.status_code = 429
             else:
                 # Execute the route function
-                response = f(*args, **kwargs)
-            
-            # Add rate limit headers
-            response.headers['X-RateLimit-Limit'] = str(limit)
-            response.headers['X-RateLimit-Remaining'] = str(max(0, limit - current))
-            response.headers['X-RateLimit-Reset'] = str(reset)
+                response = make_response(f(*args, **kwargs))
             
-            return response
+            return _set_rate_limit_headers(response, result)
+        wrapped.rate_limit_policy = policy
         return wrapped
     return decorator
 
 
-def auth_rate_limit(limit, period):
+def auth_rate_limit(limit=None, period=None, algorithm=SLIDING_WINDOW, burst=None, policy=None):
     """
     Special rate limiter for authentication endpoints.
     Implements stricter rules for failed auth attempts.
+    
+    Takes the same policy arguments as rate_limit; the key is always the client IP.
     """
+    policy = _route_policy(limit, period, algorithm, burst, policy)
+    
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
@@ -179,9 +278,9 @@ def auth_rate_limit(limit, period):
             
             # Check rate limit for this IP
             key = f"auth:{f.__name__}:{ip}"
-            is_limited, current, reset = is_rate_limited(key, limit, period)
+            result = rate_limiter.check(key, policy)
             
-            if is_limited:
+            if not result.allowed:
                 # Log suspicious activity
                 now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 log_message = f"[{now}] Authentication rate limit exceeded for IP: {ip}"
@@ -190,56 +289,25 @@ def auth_rate_limit(limit, period):
                 # Return 429 with retry-after header
                 response = jsonify({
                     'error': 'Too many authentication attempts',
-                    'retry_after': reset - int(time.time())
+                    'retry_after': max(1, result.retry_after)
                 })
                 response.status_code = 429
-                response.headers['Retry-After'] = str(reset - int(time.time()))
-                return response
+                return _set_rate_limit_headers(response, result)
                 
             # Execute the route function
-            response = f(*args, **kwargs)
-            
-            # Add rate limit headers
-            response.headers['X-RateLimit-Limit'] = str(limit)
-            response.headers['X-RateLimit-Remaining'] = str(max(0, limit - current))
-            response.headers['X-RateLimit-Reset'] = str(reset)
+            response = make_response(f(*args, **kwargs))
             
-            return response
+            return _set_rate_limit_headers(response, result)
+        wrapped.rate_limit_policy = policy
         return wrapped
     return decorator
 
 
-# IP Blacklisting
-class IPBlacklist:
-    def __init__(self):
-        self.blacklisted_ips = set()
-        self.temp_blacklist = {}  # IP -> expiry time
-    
-    def is_blacklisted(self, ip):
-        """Check if an IP is permanently blacklisted."""
-        return ip in self.blacklisted_ips
-    
-    def is_temp_blacklisted(self, ip):
-        """Check if an IP is temporarily blacklisted."""
-        if ip in self.temp_blacklist:
-            if self.temp_blacklist[ip] > time.time():
-                return True
-            else:
-                # Expired, remove from blacklist
-                del self.temp_blacklist[ip]
-        return False
-    
-    def blacklist(self, ip):
-        """Permanently blacklist an IP."""
-        self.blacklisted_ips.add(ip)
-    
-    def temp_blacklist(self, ip, duration):
-        """Temporarily blacklist an IP for a specific duration (in seconds)."""
-        self.temp_blacklist[ip] = time.time() + duration
-
-
-# Create a global IP blacklist
-ip_blacklist = IPBlacklist()
+# IP Blacklisting: CIDR ranges from IP_BLOCKLIST_FILE plus bans shared
+# across workers through Redis (see ip_blocklist.py)
+ip_blacklist = IPBlocklist(redis_client)
+if IP_BLOCKLIST_FILE:
+    ip_blacklist.load_file(IP_BLOCKLIST_FILE)
 
 
 def check_ip_blacklist(f):
@@ -248,12 +316,15 @@ def check_ip_blacklist(f):
     def wrapped(*args, **kwargs):
         ip = get_client_ip()
         
-        if ip_blacklist.is_blacklisted(ip):
+        # One trie walk answers both: permanent or temporary ban
+        blocked_until = ip_blacklist.lookup(ip)
+        
+        if blocked_until == PERMANENT:
             response = jsonify({'error': 'Access denied'})
             response.status_code = 403
             return response
         
-        if ip_blacklist.is_temp_blacklisted(ip):
+        if blocked_until is not None:
             response = jsonify({'error': 'Access temporarily restricted'})
             response.status_code = 403
             return response
@@ -0,0 +1,205 @@
+"""
+JSON serialization for GigGatek API responses and cache payloads.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise; both produce the same JSON. Values MySQL hands back that JSON does
+not cover natively are encoded the way Flask's default provider does, so
+responses look the same whichever backend is active:
+
+- Decimal -> string ("199.99")
+- date / datetime -> HTTP date string
+- dataclasses -> objects, UUID -> string, objects with __html__ -> markup
+
+Cache entries are prefixed with a format version byte so the payload encoding
+can change later without misreading entries written by older code.
+"""
+
+import os
+import json
+import uuid
+import logging
+import dataclasses
+from functools import lru_cache
+from decimal import Decimal
+from datetime import date, datetime, timezone
+
+from flask.json.provider import DefaultJSONProvider
+
+# Try to import orjson
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 'auto' picks orjson when available; 'json' forces the standard library
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto').lower()
+
+# Cache payload format versions (first byte of every entry)
+CACHE_FORMAT_V1 = b'\x01'  # JSON text
+CACHE_FORMAT_VERSION = CACHE_FORMAT_V1
+
+
+_WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = (None, 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+@lru_cache(maxsize=4096)
+def _http_date(value):
+    """
+    Same output as werkzeug.http.http_date, without the email.utils round trip.
+
+    Memoized: list payloads repeat the same dates (created_at, due dates) a lot.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        hour, minute, second = value.hour, value.minute, value.second
+    else:
+        hour = minute = second = 0
+    return (f"{_WEEKDAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month]} "
+            f"{value.year:04d} {hour:02d}:{minute:02d}:{second:02d} GMT")
+
+
+def _default(obj):
+    """Encode types JSON has no native representation for (mirrors Flask)."""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, date):
+        return _http_date(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class StdlibBackend:
+    """Standard library json backend."""
+
+    name = 'json'
+
+    def dumps(self, obj, sort_keys=False, indent=False):
+        if indent:
+            text = json.dumps(obj, default=_default, sort_keys=sort_keys, indent=2, ensure_ascii=False)
+        else:
+            text = json.dumps(obj, default=_default, sort_keys=sort_keys,
+                              separators=(',', ':'), ensure_ascii=False)
+        return text.encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonBackend:
+    """orjson backend; dates are passed through to _default to keep Flask's format."""
+
+    name = 'orjson'
+
+    def __init__(self):
+        self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, sort_keys=False, indent=False):
+        options = self._options
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=options)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+def _select_backend(name):
+    if name in ('auto', 'orjson') and ORJSON_AVAILABLE:
+        return OrjsonBackend()
+    if name == 'orjson':
+        logger.warning("JSON_BACKEND=orjson but orjson is not installed, using the json module")
+    return StdlibBackend()
+
+
+backend = _select_backend(JSON_BACKEND)
+
+
+def dumps(obj, sort_keys=False, indent=False):
+    """
+    Serialize an object to JSON.
+
+    Args:
+        obj: Value to serialize
+        sort_keys (bool): Sort object keys
+        indent (bool): Pretty-print with two-space indentation
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    return backend.dumps(obj, sort_keys=sort_keys, indent=indent)
+
+
+def loads(data):
+    """Deserialize JSON from bytes or str."""
+    return backend.loads(data)
+
+
+def dump_cache_value(value):
+    """
+    Serialize a value for storage in the cache.
+
+    Returns:
+        bytes: Format version byte followed by the encoded payload
+    """
+    return CACHE_FORMAT_VERSION + backend.dumps(value)
+
+
+def load_cache_value(data):
+    """
+    Deserialize a cache entry written by dump_cache_value.
+
+    Entries without a version byte were written as plain JSON text by older
+    code and are still readable.
+
+    Args:
+        data (bytes): Raw cache entry
+
+    Returns:
+        The cached value
+
+    Raises:
+        ValueError: If the entry uses an unknown format version
+    """
+    version = data[:1]
+    if version == CACHE_FORMAT_V1:
+        return backend.loads(data[1:])
+    if version < b' ' and version not in (b'\t', b'\n', b'\r'):
+        raise ValueError(f"Unknown cache format version {version!r}")
+    # Legacy entry: bare JSON text
+    return backend.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by this module's serializer.
+
+    Keys are not sorted (Flask's default sorts them on every response), which
+    does not change the meaning of any payload.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys),
+                     indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = dumps(obj, sort_keys=self.sort_keys, indent=indent)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from ..utils.db import get_db_connection
-from ..auth.routes import token_required
+from ..utils.auth import token_required
 
 wishlist_bp = Blueprint('wishlist', __name__)
 
@@ -20,7 +20,7 @@ def get_wishlist():
                 w.wishlist_item_id, w.user_id, w.product_id, w.added_at,
                 p.name, p.description, p.category, p.condition_rating,
                 p.purchase_price, p.rental_price_3m, p.rental_price_6m, p.rental_price_12m,
-                p.image_urls
+                p.image_urls, p.primary_image
             FROM wishlist_items w
             JOIN products p ON w.product_id = p.product_id
             WHERE w.user_id = %s
@@ -29,20 +29,6 @@ def get_wishlist():
         
         wishlist_items = cursor.fetchall()
         
-        # Process image URLs
-        for item in wishlist_items:
-            if item.get('image_urls'):
-                try:
-                    import json
-                    # Assuming image_urls is stored as a JSON array string
-                    image_list = json.loads(item['image_urls'])
-                    # Use the first image as the primary image for the list view
-                    item['primary_image'] = image_list[0] if image_list else None
-                except json.JSONDecodeError:
-                    item['primary_image'] = None # Handle potential malformed JSON
-            else:
-                item['primary_image'] = None
-        
         cursor.close()
         conn.close()
         
@@ -42,8 +42,9 @@ class ProductFilters {
         // Setup event listeners
         this.setupEventListeners();
         
-        // Load products
+        // Load products and filter counts
         this.loadProducts();
+        this.loadFacets();
     }
     
     /**
@@ -252,6 +253,71 @@ class ProductFilters {
     applyFilters() {
         this.currentPage = 1; // Reset to first page when filters change
         this.loadProducts();
+        this.loadFacets();
+    }
+    
+    /**
+     * Add the current filter selection to query parameters
+     */
+    appendFilterParams(params) {
+        this.filters.category.forEach(category => params.append('category', category));
+        this.filters.brand.forEach(brand => params.append('brand', brand));
+        this.filters.condition.forEach(condition => params.append('condition', condition));
+        params.append('price_min', this.filters.priceRange.min);
+        params.append('price_max', this.filters.priceRange.max);
+    }
+    
+    /**
+     * Load facet counts for the current filters (one request for all filter groups)
+     */
+    async loadFacets() {
+        try {
+            const params = new URLSearchParams();
+            this.appendFilterParams(params);
+            
+            const apiUrl = window.GigGatekConfig ? 
+                window.GigGatekConfig.getApiEndpoint(`/products/facets?${params.toString()}`) : 
+                `/api/products/facets?${params.toString()}`;
+                
+            const response = await fetch(apiUrl);
+            
+            if (!response.ok) {
+                throw new Error(`Failed to load facets: ${response.status}`);
+            }
+            
+            this.updateFacetCounts(await response.json());
+        } catch (error) {
+            // Counts are optional; the filters keep working without them
+            console.error('Error loading facets:', error);
+        }
+    }
+    
+    /**
+     * Show facet counts next to the filter checkboxes
+     */
+    updateFacetCounts(facets) {
+        ['category', 'brand', 'condition'].forEach(name => {
+            const counts = facets[name] || {};
+            const lowerCounts = {};
+            Object.keys(counts).forEach(value => {
+                lowerCounts[value.toLowerCase()] = counts[value];
+            });
+            
+            document.querySelectorAll(`input[name="${name}"]`).forEach(checkbox => {
+                const label = checkbox.closest('label');
+                if (!label) {
+                    return;
+                }
+                
+                let countElement = label.querySelector('.filter-count');
+                if (!countElement) {
+                    countElement = document.createElement('span');
+                    countElement.className = 'filter-count';
+                    label.appendChild(countElement);
+                }
+                countElement.textContent = ` (${lowerCounts[checkbox.value.toLowerCase()] || 0})`;
+            });
+        });
     }
     
     /**
@@ -272,30 +338,8 @@ class ProductFilters {
                 sort: this.sortBy
             });
             
-            // Add category filters
-            if (this.filters.category.length > 0) {
-                this.filters.category.forEach(category => {
-                    params.append('category', category);
-                });
-            }
-            
-            // Add brand filters
-            if (this.filters.brand.length > 0) {
-                this.filters.brand.forEach(brand => {
-                    params.append('brand', brand);
-                });
-            }
-            
-            // Add condition filters
-            if (this.filters.condition.length > 0) {
-                this.filters.condition.forEach(condition => {
-                    params.append('condition', condition);
-                });
-            }
-            
-            // Add price range
-            params.append('price_min', this.filters.priceRange.min);
-            params.append('price_max', this.filters.priceRange.max);
+            // Add filters
+            this.appendFilterParams(params);
             
             // Fetch products from API
             const apiUrl = window.GigGatekConfig ? 
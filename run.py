@@ -8,10 +8,8 @@ import sys
 import flask
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
 import sqlite3
 import json
-from datetime import timedelta
 
 # Initialize Flask app
 app = Flask(__name__, template_folder='backend/templates')
@@ -29,12 +27,6 @@ CORS(app,
      supports_credentials=True,
      max_age=cors_max_age)
 
-# Configure JWT
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'giggatek-dev-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
-jwt = JWTManager(app)
-
 # Database Configuration
 def get_db_connection():
     """